@@ -0,0 +1,114 @@
+# benchmarks/bench_memoria.py
+"""
+Pico de memória ao montar uma carga com 2.000 pedidos (com expedidor,
+recebedor e itens de cada pedido, como numa query completa), com e sem
+MODELOS_COMPACTOS. Cada modo roda num subprocesso próprio, para que o
+pico de RSS de um não contamine o outro.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.bench_memoria
+"""
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import tracemalloc
+
+NUM_PEDIDOS = 2000
+NUM_DESTINATARIOS = 20
+NUM_PRODUTOS = 50
+ITENS_POR_PEDIDO = 5
+
+def _participante(i: int) -> dict:
+    return {
+        'CPFCNPJ': f'{i:014d}', 'NomeFantasia': f'Fantasia {i}', 'RazaoSocial': f'Razao {i}', 'RGIE': '123',
+        'Endereco': {
+            'Bairro': 'Centro', 'CEP': '01000000', 'Logradouro': 'Rua A', 'Numero': str(i),
+            'Cidade': {'Descricao': 'São Paulo', 'SiglaUF': 'SP', 'IBGE': '3550308'},
+        },
+    }
+
+def _produto(j: int) -> dict:
+    return {'CodigoProduto': f'P{j}', 'DescricaoProduto': f'Produto {j}', 'CodigoGrupoProduto': f'G{j % 5}',
+            'DescricaoGrupoProduto': f'Grupo {j % 5}', 'CodigoNCM': f'{j:08d}', 'MetroCubito': 1.0,
+            'PesoUnitario': 2.0, 'Quantidade': 3.0, 'ValorUnitario': 4.0}
+
+def gerar_carga(num_pedidos: int = NUM_PEDIDOS) -> list:
+    """
+    CargaIntegracao sintética como vem do decodificador: um único
+    Remetente, poucos Destinatarios e produtos repetidos entre pedidos,
+    mas cada linha com seus próprios dicts (nada compartilhado no SOAP).
+    """
+    carga = []
+    for i in range(num_pedidos):
+        carga.append({
+            'NumeroCarga': '123', 'ProtocoloCarga': 1000, 'ProtocoloPedido': 5000 + i,
+            'NumeroPedidoEmbarcador': f'PED-{i}', 'CodigoIntegracaoRota': 'R1', 'Observacao': None,
+            'OrdemEntrega': i, 'PesoBruto': 10.5, 'Vendedor': 'V', 'TipoPedido': 'Normal',
+            'DataInicioCarregamento': '2024-01-01', 'DataPrevisaoEntrega': '2024-01-02',
+            'Filial': {'CodigoIntegracao': 'F1'}, 'TipoOperacao': {'CodigoIntegracao': 'OP'},
+            'TipoCargaEmbarcador': {'CodigoIntegracao': 'TC'}, 'ModeloVeicular': {'CodigoIntegracao': 'MV'},
+            'Veiculo': {'Placa': 'ABC1234', 'TipoVeiculo': 'Truck'},
+            'TransportadoraEmitente': {'CNPJ': '00000000000100'},
+            'Motoristas': {'Motorista': [{'CPF': '00000000000', 'Nome': 'Fulano'}]},
+            'Remetente': _participante(0), 'Destinatario': _participante(1 + i % NUM_DESTINATARIOS),
+            'Produtos': {'Produto': [_produto((i + j) % NUM_PRODUTOS) for j in range(ITENS_POR_PEDIDO)]},
+        })
+    return carga
+
+def medir() -> dict:
+    """
+    Monta a carga como os resolvers fariam numa requisição e mantém o
+    resultado vivo até o fim da medição.
+    """
+    from src import config
+    from src.transformation import transformar_carga_integracao, transformar_participante, transformar_itens_pedido
+
+    carga = gerar_carga()
+    internados = {} if config.MODELOS_COMPACTOS else None
+    gc.collect()
+    coletas_antes = [estatistica['collections'] for estatistica in gc.get_stats()]
+
+    tracemalloc.start()
+    carregamento = transformar_carga_integracao(carga)
+    pedidos = [
+        (
+            transformar_participante(p, 'Remetente', None, internados),
+            transformar_participante(p, 'Destinatario', None, internados),
+            transformar_itens_pedido(p, None, internados),
+        )
+        for p in carga
+    ]
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    coletas = [estatistica['collections'] - antes for estatistica, antes in zip(gc.get_stats(), coletas_antes)]
+    assert len(carregamento.pedidos) == len(pedidos) == NUM_PEDIDOS
+    return {
+        'pico_kb': pico / 1024,
+        'rss_max_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'coletas_gc': coletas,
+    }
+
+def main():
+    resultados = {}
+    for nome, valor in (("padrão", "0"), ("compacto", "1")):
+        saida = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_memoria", "--medir"],
+            env=dict(os.environ, MODELOS_COMPACTOS=valor), capture_output=True, text=True, check=True
+        ).stdout
+        resultados[nome] = json.loads(saida.strip().splitlines()[-1])
+        r = resultados[nome]
+        print(f"{nome:<10} pico alocado {r['pico_kb']:9.0f} KiB | RSS máx {r['rss_max_kb']:7d} KiB "
+              f"| coletas GC (ger. 0/1/2) {r['coletas_gc']}")
+
+    reducao = 1 - resultados["compacto"]["pico_kb"] / resultados["padrão"]["pico_kb"]
+    print(f"Redução do pico alocado: {reducao:.0%} ({NUM_PEDIDOS} pedidos)")
+
+if __name__ == "__main__":
+    if "--medir" in sys.argv:
+        print(json.dumps(medir()))
+    else:
+        main()
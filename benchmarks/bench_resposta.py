@@ -0,0 +1,85 @@
+# benchmarks/bench_resposta.py
+"""
+Serialização e compressão das respostas GraphQL em dois payloads
+representativos: buscarCarga com 1.000 pedidos (expedidor, recebedor e
+itens) e 50 NotaFiscalDetalhe com o XML da NF-e. Compara o json.dumps
+padrão do Strawberry com src/response_encoding.py (orjson, se instalado)
+e os bytes enviados sem compressão, com gzip e com brotli.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.bench_resposta
+"""
+import json
+import timeit
+
+from src.response_encoding import brotli, codificador_json, codificar_json, comprimir
+
+REPETICOES = 20
+
+def _participante(i: int) -> dict:
+    return {
+        'razaoSocial': f'Razão Social {i} Ltda', 'cnpj': f'{i:014d}', 'cidade': 'São Paulo', 'estado': 'SP',
+        'logradouro': 'Avenida Paulista', 'numero': str(i), 'bairro': 'Bela Vista', 'cep': '01310100',
+    }
+
+def resposta_carga(num_pedidos: int = 1000) -> dict:
+    pedidos = []
+    for i in range(num_pedidos):
+        pedidos.append({
+            'numeroPedidoEmbarcador': f'PED-{i}', 'protocoloPedido': 5000 + i, 'pesoBruto': 10.5 + i,
+            'dataPrevisaoEntrega': '2024-01-02T00:00:00', 'ordemEntrega': i,
+            'expedidor': _participante(0), 'recebedor': _participante(1 + i % 20),
+            'itensPedido': [
+                {'codigoProduto': f'P{j}', 'descricaoProduto': f'Produto {j} – embalagem', 'quantidade': 3.0,
+                 'valorUnitario': 4.25, 'pesoUnitario': 2.0}
+                for j in range(5)
+            ],
+        })
+    return {'data': {'buscarCarga': {'numeroCarga': '123', 'protocoloCarga': '1000', 'pedidos': pedidos}}}
+
+def _xml_nfe(i: int) -> str:
+    itens = ''.join(
+        f'<det nItem="{j}"><prod><cProd>P{j}</cProd><xProd>Produto {j} – embalagem</xProd><NCM>00000000</NCM>'
+        f'<qCom>3.0000</qCom><vUnCom>4.2500</vUnCom><vProd>12.75</vProd></prod></det>'
+        for j in range(1, 31)
+    )
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?><nfeProc xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00">'
+        f'<NFe><infNFe Id="NFe{i:044d}"><emit><CNPJ>00000000000100</CNPJ><xNome>Emitente S.A.</xNome></emit>'
+        f'<dest><CNPJ>{i:014d}</CNPJ><xNome>Destinatário {i}</xNome></dest>{itens}'
+        f'<total><ICMSTot><vNF>382.50</vNF></ICMSTot></total></infNFe></NFe>'
+        f'<protNFe><infProt><chNFe>{i:044d}</chNFe><nProt>1{i:014d}</nProt></infProt></protNFe></nfeProc>'
+    )
+
+def resposta_notas_fiscais(num_notas: int = 50) -> dict:
+    notas = [
+        {'chave': f'{i:044d}', 'numero': str(i), 'serie': '1', 'valorTotal': 382.5, 'xml': _xml_nfe(i)}
+        for i in range(num_notas)
+    ]
+    return {'data': {'buscarNotaFiscalPorChaves': [{'chave': n['chave'], 'nota': n, 'erro': None} for n in notas]}}
+
+def _medir(funcao) -> float:
+    return min(timeit.repeat(funcao, number=1, repeat=REPETICOES))
+
+def main():
+    print(f"Codificador: {codificador_json()} | brotli: {'sim' if brotli is not None else 'não instalado'}")
+    for nome, dados in (("carga 1.000 pedidos", resposta_carga()), ("50 NF-e com XML", resposta_notas_fiscais())):
+        # Sanidade: mesmo JSON
+        assert json.loads(codificar_json(dados)) == dados
+
+        padrao = _medir(lambda: json.dumps(dados))
+        rapido = _medir(lambda: codificar_json(dados))
+        corpo = codificar_json(dados)
+        print(f"\n{nome}")
+        print(f"  json.dumps (Strawberry) {padrao * 1000:8.2f} ms  {len(json.dumps(dados).encode()):>9} bytes")
+        print(f"  {codificador_json():<23} {rapido * 1000:8.2f} ms  {len(corpo):>9} bytes  ({padrao / rapido:.1f}x)")
+        for codificacao in ('gzip', 'br'):
+            if codificacao == 'br' and brotli is None:
+                continue
+            tempo = _medir(lambda: comprimir(corpo, codificacao))
+            comprimido = comprimir(corpo, codificacao)
+            print(f"  + {codificacao:<21} {tempo * 1000:8.2f} ms  {len(comprimido):>9} bytes  "
+                  f"({len(comprimido) / len(corpo):.0%} do original)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# benchmarks/bench_transformation.py
+"""
+Micro-benchmark da transformação de uma carga com 1.000 pedidos:
+percurso campo a campo com safe_get (implementação anterior) versus
+os mapeamentos compilados de src/field_mapping.py.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.bench_transformation
+"""
+import timeit
+
+from src.models import Carregamento, Pedido, Participante, ItemPedido
+from src.transformation import (
+    safe_get, transformar_carga_integracao, transformar_participante, transformar_itens_pedido
+)
+
+NUM_PEDIDOS = 1000
+REPETICOES = 20
+
+def _participante(i: int) -> dict:
+    return {
+        'CPFCNPJ': f'{i:014d}', 'NomeFantasia': f'Fantasia {i}', 'RazaoSocial': f'Razao {i}', 'RGIE': '123',
+        'Endereco': {
+            'Bairro': 'Centro', 'CEP': '01000000', 'Logradouro': 'Rua A', 'Numero': str(i),
+            'Cidade': {'Descricao': 'São Paulo', 'SiglaUF': 'SP', 'IBGE': '3550308'},
+        },
+    }
+
+def gerar_carga(num_pedidos: int = NUM_PEDIDOS) -> list:
+    """ Lista CargaIntegracao sintética no formato do serialize_object do zeep. """
+    carga = []
+    for i in range(num_pedidos):
+        carga.append({
+            'NumeroCarga': '123', 'ProtocoloCarga': 1000, 'ProtocoloPedido': 5000 + i,
+            'NumeroPedidoEmbarcador': f'PED-{i}', 'CodigoIntegracaoRota': 'R1', 'Observacao': None,
+            'OrdemEntrega': i, 'PesoBruto': 10.5, 'Vendedor': 'V', 'TipoPedido': 'Normal',
+            'DataInicioCarregamento': '2024-01-01', 'DataPrevisaoEntrega': '2024-01-02',
+            'Filial': {'CodigoIntegracao': 'F1'}, 'TipoOperacao': {'CodigoIntegracao': 'OP'},
+            'TipoCargaEmbarcador': {'CodigoIntegracao': 'TC'}, 'ModeloVeicular': {'CodigoIntegracao': 'MV'},
+            'Veiculo': {'Placa': 'ABC1234', 'TipoVeiculo': 'Truck'},
+            'TransportadoraEmitente': {'CNPJ': '00000000000100'},
+            'Motoristas': {'Motorista': [{'CPF': '00000000000', 'Nome': 'Fulano'}]},
+            'Remetente': _participante(i), 'Destinatario': _participante(i + 1),
+            'Produtos': {'Produto': [
+                {'CodigoProduto': f'P{j}', 'DescricaoProduto': 'Produto', 'CodigoGrupoProduto': 'G',
+                 'DescricaoGrupoProduto': 'Grupo', 'CodigoNCM': '0000', 'MetroCubito': 1.0,
+                 'PesoUnitario': 2.0, 'Quantidade': 3.0, 'ValorUnitario': 4.0}
+                for j in range(3)
+            ]},
+        })
+    return carga
+
+# --- Implementação anterior (percurso campo a campo com safe_get) ---
+
+def _participante_legado(p: dict, chave: str) -> Participante:
+    return Participante(
+        bairro=safe_get(p, chave, 'Endereco', 'Bairro'),
+        cep=safe_get(p, chave, 'Endereco', 'CEP'),
+        cidade=safe_get(p, chave, 'Endereco', 'Cidade', 'Descricao'),
+        cnpj=safe_get(p, chave, 'CPFCNPJ'),
+        descricao=safe_get(p, chave, 'NomeFantasia'),
+        endereco=safe_get(p, chave, 'Endereco', 'Logradouro'),
+        estado=safe_get(p, chave, 'Endereco', 'Cidade', 'SiglaUF'),
+        ibge=safe_get(p, chave, 'Endereco', 'Cidade', 'IBGE'),
+        ie=safe_get(p, chave, 'RGIE'),
+        logradouro=safe_get(p, chave, 'Endereco', 'Logradouro'),
+        numero=safe_get(p, chave, 'Endereco', 'Numero'),
+        razaoSocial=safe_get(p, chave, 'RazaoSocial'),
+    )
+
+def _itens_legado(p: dict) -> list:
+    itens = []
+    for a in safe_get(p, 'Produtos', 'Produto') or []:
+        itens.append(ItemPedido(
+            codigoGrupoProduto=safe_get(a, 'CodigoGrupoProduto'),
+            codigoProduto=safe_get(a, 'CodigoProduto'),
+            codigoNcm=safe_get(a, 'CodigoNCM'),
+            descricaoGrupoProduto=safe_get(a, 'DescricaoGrupoProduto'),
+            descricaoProduto=safe_get(a, 'DescricaoProduto'),
+            metroCubico=safe_get(a, 'MetroCubito'),
+            pesoUnitario=safe_get(a, 'PesoUnitario'),
+            quantidade=safe_get(a, 'Quantidade'),
+            valorUnitario=safe_get(a, 'ValorUnitario'),
+        ))
+    return itens
+
+def transformar_legado(carga: list) -> tuple:
+    linha = carga[0]
+    carregamento = Carregamento(
+        numeroCarga=safe_get(linha, 'NumeroCarga'),
+        filial=safe_get(linha, 'Filial', 'CodigoIntegracao'),
+        protocoloCarga=safe_get(linha, 'ProtocoloCarga'),
+        cpfMotorista=safe_get(linha, 'Motoristas', 'Motorista', 0, 'CPF'),
+        nomeMotorista=safe_get(linha, 'Motoristas', 'Motorista', 0, 'Nome'),
+        modeloVeicular=safe_get(linha, 'ModeloVeicular', 'CodigoIntegracao'),
+        placaVeiculo=safe_get(linha, 'Veiculo', 'Placa'),
+        tipoOperacao=safe_get(linha, 'TipoOperacao', 'CodigoIntegracao'),
+        tipoVeiculo=str(safe_get(linha, 'Veiculo', 'TipoVeiculo') or ''),
+        transportador=safe_get(linha, 'TransportadoraEmitente', 'CNPJ'),
+        dados_soap=linha,
+    )
+    participantes = []
+    for p in carga:
+        carregamento.pedidos.append(Pedido(
+            codFilial=safe_get(p, 'Filial', 'CodigoIntegracao'),
+            numeroPedidoEmbarcador=safe_get(p, 'NumeroPedidoEmbarcador'),
+            protocoloPedido=safe_get(p, 'ProtocoloPedido'),
+            codigoRota=safe_get(p, 'CodigoIntegracaoRota'),
+            dataInicioCarregamento=str(safe_get(p, 'DataInicioCarregamento') or ''),
+            dataPrevisaoEntrega=str(safe_get(p, 'DataPrevisaoEntrega') or ''),
+            observacao=safe_get(p, 'Observacao'),
+            ordemEntrega=safe_get(p, 'OrdemEntrega'),
+            pesoBruto=safe_get(p, 'PesoBruto'),
+            tipoCarga=safe_get(p, 'TipoCargaEmbarcador', 'CodigoIntegracao'),
+            tipoOperacao=safe_get(p, 'TipoOperacao', 'CodigoIntegracao'),
+            tipoPedido=str(safe_get(p, 'TipoPedido') or ''),
+            vendedor=safe_get(p, 'Vendedor'),
+            dados_soap=p,
+        ))
+        participantes.append((_participante_legado(p, 'Remetente'), _participante_legado(p, 'Destinatario'), _itens_legado(p)))
+    return carregamento, participantes
+
+def transformar_compilado(carga: list) -> tuple:
+    carregamento = transformar_carga_integracao(carga)
+    participantes = []
+    for p in carga:
+        participantes.append((
+            transformar_participante(p, 'Remetente'),
+            transformar_participante(p, 'Destinatario'),
+            transformar_itens_pedido(p),
+        ))
+    return carregamento, participantes
+
+def main():
+    carga = gerar_carga()
+
+    # Sanidade: as duas implementações produzem o mesmo resultado
+    assert transformar_legado(carga) == transformar_compilado(carga)
+
+    tempos = {}
+    for nome, funcao in (("safe_get (legado)", transformar_legado), ("compilado", transformar_compilado)):
+        melhor = min(timeit.repeat(lambda: funcao(carga), number=1, repeat=REPETICOES))
+        tempos[nome] = melhor
+        print(f"{nome:<20} {melhor * 1000:8.2f} ms por carga de {NUM_PEDIDOS} pedidos")
+
+    ganho = tempos["safe_get (legado)"] / tempos["compilado"]
+    print(f"Aceleração: {ganho:.2f}x")
+
+if __name__ == "__main__":
+    main()
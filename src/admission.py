@@ -0,0 +1,166 @@
+# src/admission.py
+import asyncio
+import json
+import math
+from typing import Any, Optional
+from graphql import GraphQLError, GraphQLSchema, parse
+from . import config, metrics, http_pool
+from .query_cost import estimar_consulta
+from .scheduler import HEADER_PRIORIDADE, INTERATIVA, LOTE, NORMAL, get_escalonador
+
+# Controle de admissão do /graphql: sob sobrecarga, recusa cedo (503 +
+# Retry-After) as requisições de menor prioridade ou mais caras, para que
+# as aceitas mantenham a latência. A pressão do worker é o maior entre:
+# atraso do event loop, chamadas ao SGT em andamento e fila do escalonador,
+# cada um dividido pelo seu limite (1.0 = no limite).
+
+class MonitorCarga:
+    """
+    Mede periodicamente o atraso do event loop (quanto um sleep curto
+    demora além do pedido) e calcula a pressão atual do worker.
+    """
+
+    def __init__(self):
+        self.lag = 0.0
+        self._tarefa: Optional[asyncio.Task] = None
+
+    async def _medir(self) -> None:
+        loop = asyncio.get_running_loop()
+        intervalo = config.ADMISSAO_INTERVALO_LAG
+        while True:
+            inicio = loop.time()
+            await asyncio.sleep(intervalo)
+            atraso = max(0.0, loop.time() - inicio - intervalo)
+            # Sobe na hora, desce aos poucos: um pico isolado ainda pesa por algumas medições
+            self.lag = max(atraso, self.lag * 0.7)
+            metrics.definir('admissao.lag_ms', int(self.lag * 1000))
+
+    def iniciar(self) -> None:
+        if self._tarefa is None:
+            self._tarefa = asyncio.ensure_future(self._medir())
+
+    async def parar(self) -> None:
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+
+    def pressao(self) -> float:
+        """
+        Maior razão entre os indicadores e seus limites (>= 1.0: no limite).
+        """
+        return max(
+            self.lag * 1000 / config.ADMISSAO_LAG_MAX_MS,
+            http_pool.em_voo() / config.ADMISSAO_UPSTREAM_MAX,
+            get_escalonador().profundidade_fila() / config.ADMISSAO_FILA_MAX,
+        )
+
+monitor = MonitorCarga()
+
+def _chamadas_estimadas(schema: GraphQLSchema, corpo: bytes) -> int:
+    """
+    Chamadas ao SGT previstas para o corpo do POST /graphql, pela mesma
+    estimativa do limite de custo (ver query_cost): considera variáveis,
+    fragmentos, aliases e @skip/@include. Corpo que não é uma consulta
+    válida conta 0 (a própria execução o recusa).
+    """
+    try:
+        payload: Any = json.loads(corpo)
+    except ValueError:
+        return 0
+    total = 0
+    # Lotes de consultas (lista de payloads) somam as chamadas de todas
+    for item in payload if isinstance(payload, list) else [payload]:
+        if not isinstance(item, dict) or not isinstance(item.get('query'), str):
+            continue
+        variaveis = item.get('variables')
+        try:
+            por_campo = estimar_consulta(
+                schema, parse(item['query']), item.get('operationName'),
+                variaveis if isinstance(variaveis, dict) else None
+            )
+        except (GraphQLError, TypeError, ValueError):
+            continue
+        if por_campo:
+            total += sum(c['chamadasUpstream'] for c in por_campo.values())
+    return total
+
+def _prioridade(headers: dict, corpo: bytes, schema: GraphQLSchema) -> str:
+    prioridade = headers.get(HEADER_PRIORIDADE.encode('latin-1'), b'').decode('latin-1').strip().lower()
+    if prioridade not in config.ESCALONADOR_PESOS:
+        prioridade = config.ESCALONADOR_PRIORIDADE_PADRAO
+    # Consultas caras (muitas chamadas ao SGT previstas) descem uma classe
+    if _chamadas_estimadas(schema, corpo) >= config.ADMISSAO_CHAMADAS_CONSULTA_CARA:
+        prioridade = {INTERATIVA: NORMAL, NORMAL: LOTE}.get(prioridade, prioridade)
+    return prioridade
+
+class AdmissaoMiddleware:
+    """
+    Middleware ASGI que aplica o controle de admissão aos POST /graphql.
+    Cada classe de prioridade é recusada a partir de uma pressão
+    (ADMISSAO_LIMITE_POR_PRIORIDADE): lote primeiro, interativa por último.
+    'schema' é o schema GraphQL usado para estimar o custo das consultas.
+    """
+
+    def __init__(self, app, schema: GraphQLSchema):
+        self.app = app
+        self.schema = schema
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'POST' or not scope['path'].startswith('/graphql'):
+            await self.app(scope, receive, send)
+            return
+
+        pressao = monitor.pressao()
+        if pressao < min(config.ADMISSAO_LIMITE_POR_PRIORIDADE.values()):
+            await self.app(scope, receive, send)
+            return
+
+        # Sob pressão: lê o corpo para classificar a consulta e o repassa intacto
+        partes = []
+        while True:
+            mensagem = await receive()
+            if mensagem['type'] != 'http.request':
+                break
+            partes.append(mensagem.get('body', b''))
+            if not mensagem.get('more_body', False):
+                break
+        corpo = b''.join(partes)
+
+        prioridade = _prioridade(dict(scope.get('headers', [])), corpo, self.schema)
+        if pressao >= config.ADMISSAO_LIMITE_POR_PRIORIDADE.get(prioridade, 1.0):
+            metrics.incrementar(f'admissao.recusadas.{prioridade}')
+            await self._recusar(send, pressao)
+            return
+
+        metrics.incrementar('admissao.aceitas_sob_pressao')
+        entregue = False
+
+        async def _receive():
+            nonlocal entregue
+            if not entregue:
+                entregue = True
+                return {'type': 'http.request', 'body': corpo, 'more_body': False}
+            return await receive()
+
+        await self.app(scope, _receive, send)
+
+    async def _recusar(self, send, pressao: float) -> None:
+        corpo = json.dumps({
+            'errors': [{'message': 'Servidor sobrecarregado, tente novamente em instantes.'}]
+        }).encode('utf-8')
+        # Quanto maior a pressão, mais longa a espera sugerida
+        retry_after = max(1, math.ceil(config.ADMISSAO_RETRY_AFTER * pressao))
+        await send({
+            'type': 'http.response.start',
+            'status': 503,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(corpo)).encode('latin-1')),
+                (b'retry-after', str(retry_after).encode('latin-1')),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': corpo})
@@ -0,0 +1,166 @@
+# src/circuit_breaker.py
+import time
+from typing import Dict, Optional
+from . import config, metrics
+from .http_pool import chave_host, nome_metrica
+
+# Saúde do upstream por host do WSDL: circuit breaker (fechado -> aberto ->
+# meio-aberto) e timeout de cada operação derivado das latências observadas.
+# Quando um ambiente do SGT degrada, as chamadas falham rápido em vez de
+# esperar o timeout inteiro e ocupar o worker com requisições condenadas.
+
+FECHADO = 'fechado'
+MEIO_ABERTO = 'meio_aberto'
+ABERTO = 'aberto'
+
+# Valor do indicador circuit_breaker.<host>.estado em /metrics
+_CODIGOS_ESTADO = {FECHADO: 0, MEIO_ABERTO: 1, ABERTO: 2}
+
+class CircuitoAberto(Exception):
+    """
+    Chamada recusada sem ir ao SGT: o circuito do host está aberto
+    (ou meio-aberto, com a sonda de recuperação já em voo).
+    """
+
+class Disjuntor:
+    """
+    Circuit breaker de um host upstream. Abre após CIRCUIT_BREAKER_FALHAS
+    falhas consecutivas (erros de transporte, timeouts, HTTP 502/503/504);
+    aberto, recusa as chamadas por CIRCUIT_BREAKER_TEMPO_ABERTO segundos;
+    depois, meio-aberto, deixa passar até CIRCUIT_BREAKER_SONDAS chamadas
+    de sondagem: um sucesso fecha o circuito, uma falha o reabre.
+    """
+
+    def __init__(self, host: str):
+        self.host = host
+        # Nome do host nas métricas e nos logs (sem o esquema)
+        self.nome = nome_metrica(host)
+        self.estado = FECHADO
+        self.falhas_consecutivas = 0
+        self.aberto_em = 0.0
+        self.sondas_em_voo = 0
+        # Período meio-aberto atual: identifica as sondas dele em registrar()
+        self.ciclo_sondagem = 0
+        metrics.definir(f'circuit_breaker.{self.nome}.estado', _CODIGOS_ESTADO[FECHADO])
+
+    def _mudar_estado(self, estado: str) -> None:
+        print(f"[Circuito] {self.nome}: {self.estado} -> {estado}")
+        self.estado = estado
+        # Sondas ainda em voo de um período anterior não ocupam vaga no novo
+        self.sondas_em_voo = 0
+        if estado == MEIO_ABERTO:
+            self.ciclo_sondagem += 1
+        metrics.definir(f'circuit_breaker.{self.nome}.estado', _CODIGOS_ESTADO[estado])
+        if estado == ABERTO:
+            self.aberto_em = time.monotonic()
+            metrics.incrementar(f'circuit_breaker.{self.nome}.aberturas')
+
+    def aberto(self) -> bool:
+        """
+        Se o circuito está aberto e ainda não é hora de sondar o host.
+        """
+        return self.estado == ABERTO and time.monotonic() - self.aberto_em < config.CIRCUIT_BREAKER_TEMPO_ABERTO
+
+    def antes_da_chamada(self) -> Optional[int]:
+        """
+        Autoriza uma chamada ao host ou levanta CircuitoAberto.
+        Retorna o ciclo de sondagem se a chamada é uma sonda de recuperação
+        (None para as demais). Toda chamada autorizada deve terminar com
+        registrar(), recebendo esse retorno.
+        """
+        if self.estado == ABERTO:
+            if self.aberto():
+                metrics.incrementar(f'circuit_breaker.{self.nome}.rejeicoes')
+                raise CircuitoAberto(f"Circuito aberto para {self.nome}")
+            self._mudar_estado(MEIO_ABERTO)
+
+        if self.estado == MEIO_ABERTO:
+            if self.sondas_em_voo >= config.CIRCUIT_BREAKER_SONDAS:
+                metrics.incrementar(f'circuit_breaker.{self.nome}.rejeicoes')
+                raise CircuitoAberto(f"Circuito meio-aberto para {self.nome}, sonda em andamento")
+            self.sondas_em_voo += 1
+            metrics.incrementar(f'circuit_breaker.{self.nome}.sondas')
+            return self.ciclo_sondagem
+        return None
+
+    def registrar(self, sucesso: Optional[bool], sonda: Optional[int] = None) -> None:
+        """
+        Registra o desfecho de uma chamada autorizada: True (sucesso),
+        False (falha) ou None (cancelada: não conta para nenhum lado).
+        'sonda' é o retorno de antes_da_chamada(): só as sondas do período
+        meio-aberto atual devolvem a vaga de sondagem.
+        """
+        if sonda is not None and sonda == self.ciclo_sondagem and self.estado == MEIO_ABERTO:
+            self.sondas_em_voo -= 1
+
+        if sucesso is None:
+            return
+        if sucesso:
+            self.falhas_consecutivas = 0
+            if self.estado != FECHADO:
+                self._mudar_estado(FECHADO)
+            return
+
+        metrics.incrementar(f'circuit_breaker.{self.nome}.falhas')
+        self.falhas_consecutivas += 1
+        if self.estado == MEIO_ABERTO or (
+            self.estado == FECHADO and self.falhas_consecutivas >= config.CIRCUIT_BREAKER_FALHAS
+        ):
+            self._mudar_estado(ABERTO)
+
+_disjuntores: Dict[str, Disjuntor] = {}
+
+def obter_disjuntor(url: str) -> Disjuntor:
+    """
+    Retorna o circuit breaker do host da URL (do WSDL), criando-o no primeiro uso.
+    """
+    host = chave_host(url)
+    disjuntor = _disjuntores.get(host)
+    if disjuntor is None:
+        disjuntor = _disjuntores[host] = Disjuntor(host)
+    return disjuntor
+
+def circuito_aberto(url: str) -> bool:
+    """
+    Se as chamadas ao host da URL estão sendo recusadas agora.
+    """
+    if not config.CIRCUIT_BREAKER_HABILITADO:
+        return False
+    disjuntor = _disjuntores.get(chave_host(url))
+    return disjuntor is not None and disjuntor.aberto()
+
+def _serie_latencia(url: str, operacao: str) -> str:
+    return f'upstream.{nome_metrica(chave_host(url))}.{operacao}.latencia_ms'
+
+def registrar_latencia(url: str, operacao: str, segundos: float) -> None:
+    """
+    Registra a latência (ms) de uma chamada da operação ao host da URL.
+    """
+    metrics.registrar_amostra(_serie_latencia(url, operacao), segundos * 1000)
+
+def percentil_latencia(url: str, operacao: str, p: float) -> Optional[float]:
+    """
+    Percentil p (s) das latências recentes da operação no host da URL, ou
+    None enquanto houver menos de TIMEOUT_ADAPTATIVO_AMOSTRAS_MINIMAS amostras.
+    """
+    serie = _serie_latencia(url, operacao)
+    if metrics.quantidade_amostras(serie) < config.TIMEOUT_ADAPTATIVO_AMOSTRAS_MINIMAS:
+        return None
+    return metrics.percentil(serie, p) / 1000
+
+def timeout_operacao(url: str, operacao: str) -> float:
+    """
+    Timeout (s) da próxima chamada: o percentil TIMEOUT_ADAPTATIVO_PERCENTIL
+    das latências recentes da operação no host vezes o multiplicador,
+    entre TIMEOUT_ADAPTATIVO_MINIMO e SOAP_TIMEOUT_OPERACAO. Sem amostras
+    suficientes, vale o SOAP_TIMEOUT_OPERACAO.
+    """
+    if not config.TIMEOUT_ADAPTATIVO_HABILITADO:
+        return config.SOAP_TIMEOUT_OPERACAO
+    latencia = percentil_latencia(url, operacao, config.TIMEOUT_ADAPTATIVO_PERCENTIL)
+    if latencia is None:
+        return config.SOAP_TIMEOUT_OPERACAO
+    limite = latencia * config.TIMEOUT_ADAPTATIVO_MULTIPLICADOR
+    timeout = min(config.SOAP_TIMEOUT_OPERACAO, max(config.TIMEOUT_ADAPTATIVO_MINIMO, limite))
+    metrics.definir(f'upstream.{nome_metrica(chave_host(url))}.{operacao}.timeout_ms', int(timeout * 1000))
+    return timeout
@@ -0,0 +1,64 @@
+# src/coalescing.py
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+from . import metrics
+
+T = TypeVar('T')
+
+def hash_token(token: str) -> str:
+    """
+    Hash do token de autenticação, usado em chaves de cache/coalescência
+    para separar tenants sem guardar o token em claro.
+    """
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def chave_chamada(operacao: str, wsdl_url: str, token: str, *argumentos: Any) -> Tuple:
+    """
+    Monta a chave de uma chamada upstream: (WSDL, hash do token, operação, argumentos).
+    """
+    return (wsdl_url, hash_token(token), operacao) + tuple(argumentos)
+
+class SingleFlight:
+    """
+    Coalesce chamadas assíncronas idênticas e concorrentes.
+
+    A primeira chamada para uma chave dispara a execução; as demais que
+    chegarem enquanto ela estiver em voo aguardam o mesmo resultado (ou a
+    mesma exceção). A execução roda em uma Task própria, então o cancelamento
+    de um dos chamadores não cancela a chamada compartilhada.
+    """
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self._em_voo: Dict[Hashable, asyncio.Task] = {}
+
+    def em_voo(self) -> int:
+        """
+        Quantidade de chaves com execução em andamento.
+        """
+        return len(self._em_voo)
+
+    async def executar(self, chave: Hashable, fabrica: Callable[[], Awaitable[T]]) -> T:
+        """
+        Executa fabrica() uma única vez por chave entre chamadores concorrentes.
+        """
+        tarefa = self._em_voo.get(chave)
+        if tarefa is not None:
+            metrics.incrementar(f'{self.nome}.coalescidas')
+            return await asyncio.shield(tarefa)
+
+        metrics.incrementar(f'{self.nome}.execucoes')
+        tarefa = asyncio.ensure_future(fabrica())
+        self._em_voo[chave] = tarefa
+
+        def _finalizar(t: asyncio.Task) -> None:
+            if self._em_voo.get(chave) is t:
+                del self._em_voo[chave]
+            # Marca a exceção como consumida mesmo que todos os chamadores
+            # tenham sido cancelados (evita o aviso "never retrieved").
+            if not t.cancelled():
+                t.exception()
+
+        tarefa.add_done_callback(_finalizar)
+        return await asyncio.shield(tarefa)
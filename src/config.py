@@ -0,0 +1,245 @@
+# src/config.py
+import os
+import tempfile
+from dotenv import load_dotenv
+
+# Carrega variáveis de um arquivo .env (se existir) antes de ler as configurações
+load_dotenv()
+
+def _env_int(nome: str, padrao: int) -> int:
+    """
+    Lê uma variável de ambiente inteira, usando o padrão se ausente ou inválida.
+    """
+    valor = os.getenv(nome)
+    if valor is None or valor.strip() == "":
+        return padrao
+    try:
+        return int(valor)
+    except ValueError:
+        print(f"[Config] Valor inválido para {nome}: '{valor}'. Usando {padrao}.")
+        return padrao
+
+def _env_float(nome: str, padrao: float) -> float:
+    """
+    Lê uma variável de ambiente decimal, usando o padrão se ausente ou inválida.
+    """
+    valor = os.getenv(nome)
+    if valor is None or valor.strip() == "":
+        return padrao
+    try:
+        return float(valor)
+    except ValueError:
+        print(f"[Config] Valor inválido para {nome}: '{valor}'. Usando {padrao}.")
+        return padrao
+
+def _env_bool(nome: str, padrao: bool) -> bool:
+    """
+    Lê uma variável de ambiente booleana ('1', 'true', 'sim', 'yes', 'on').
+    """
+    valor = os.getenv(nome)
+    if valor is None or valor.strip() == "":
+        return padrao
+    return valor.strip().lower() in ("1", "true", "sim", "yes", "on")
+
+# --- Transporte HTTP (chamadas SOAP) ---
+# Um pool de conexões por host upstream, compartilhado por todos os WSDLs do host
+# Máximo de conexões simultâneas por host
+SOAP_MAX_CONEXOES = _env_int("SOAP_MAX_CONEXOES", 200)
+# Máximo de conexões ociosas mantidas em keep-alive por host
+SOAP_MAX_CONEXOES_KEEPALIVE = _env_int("SOAP_MAX_CONEXOES_KEEPALIVE", 50)
+# Por quanto tempo (segundos) uma conexão ociosa é mantida aberta
+HTTP_POOL_KEEPALIVE_EXPIRACAO = _env_float("HTTP_POOL_KEEPALIVE_EXPIRACAO", 30.0)
+# Timeout (segundos) para estabelecer uma conexão
+HTTP_POOL_TIMEOUT_CONEXAO = _env_float("HTTP_POOL_TIMEOUT_CONEXAO", 10.0)
+# HTTP/2 nas conexões assíncronas (requer o pacote 'h2', ver extra 'http2')
+HTTP_POOL_HTTP2 = _env_bool("HTTP_POOL_HTTP2", False)
+# Timeout (segundos) de leitura das operações SOAP
+SOAP_TIMEOUT_OPERACAO = _env_float("SOAP_TIMEOUT_OPERACAO", 60.0)
+# Timeout (segundos) para baixar WSDL/XSD
+SOAP_TIMEOUT_WSDL = _env_float("SOAP_TIMEOUT_WSDL", 300.0)
+# Decodifica as respostas direto do XML (lxml.iterparse) em vez do grafo de objetos do Zeep
+SOAP_DECODIFICADOR_RAPIDO = _env_bool("SOAP_DECODIFICADOR_RAPIDO", True)
+# Monta as requisições a partir de envelopes pré-compilados (bytes) por operação
+SOAP_ENVELOPE_PRECOMPILADO = _env_bool("SOAP_ENVELOPE_PRECOMPILADO", True)
+
+# --- Saúde do upstream (por host do WSDL) ---
+# Circuit breaker: falhas consecutivas para abrir, tempo aberto (s) e sondas simultâneas no meio-aberto
+CIRCUIT_BREAKER_HABILITADO = _env_bool("CIRCUIT_BREAKER_HABILITADO", True)
+CIRCUIT_BREAKER_FALHAS = _env_int("CIRCUIT_BREAKER_FALHAS", 5)
+CIRCUIT_BREAKER_TEMPO_ABERTO = _env_float("CIRCUIT_BREAKER_TEMPO_ABERTO", 30.0)
+CIRCUIT_BREAKER_SONDAS = _env_int("CIRCUIT_BREAKER_SONDAS", 1)
+# Timeout por operação = percentil das latências recentes x multiplicador
+# (limitado entre o mínimo e SOAP_TIMEOUT_OPERACAO)
+TIMEOUT_ADAPTATIVO_HABILITADO = _env_bool("TIMEOUT_ADAPTATIVO_HABILITADO", True)
+TIMEOUT_ADAPTATIVO_PERCENTIL = _env_float("TIMEOUT_ADAPTATIVO_PERCENTIL", 99.0)
+TIMEOUT_ADAPTATIVO_MULTIPLICADOR = _env_float("TIMEOUT_ADAPTATIVO_MULTIPLICADOR", 3.0)
+TIMEOUT_ADAPTATIVO_MINIMO = _env_float("TIMEOUT_ADAPTATIVO_MINIMO", 2.0)
+# Amostras necessárias antes de sair do SOAP_TIMEOUT_OPERACAO
+TIMEOUT_ADAPTATIVO_AMOSTRAS_MINIMAS = _env_int("TIMEOUT_ADAPTATIVO_AMOSTRAS_MINIMAS", 20)
+
+# --- Hedging (requisição duplicada nas consultas idempotentes lentas) ---
+HEDGE_HABILITADO = _env_bool("HEDGE_HABILITADO", False)
+# Dispara a duplicata quando a chamada passa deste percentil da latência da operação
+HEDGE_PERCENTIL = _env_float("HEDGE_PERCENTIL", 95.0)
+# Máximo de duplicatas, em % das chamadas ao SGT
+HEDGE_ORCAMENTO_PERCENTUAL = _env_float("HEDGE_ORCAMENTO_PERCENTUAL", 5.0)
+# Operações somente leitura que podem ser duplicadas
+HEDGE_OPERACOES = ("BuscarCarga", "BuscarNotaFiscal", "BuscarNotasFiscaisVinculadas")
+# Host alternativo para a duplicata (ex: "sgt.exemplo.com=sgt2.exemplo.com,outro.com:8443=outro2.com:8443")
+HEDGE_HOSTS_ALTERNATIVOS = dict(
+    par.strip().lower().split("=", 1)
+    for par in os.getenv("HEDGE_HOSTS_ALTERNATIVOS", "").split(",")
+    if "=" in par
+)
+
+# --- Escalonador das chamadas ao SGT (prioridades e limites por token/host) ---
+ESCALONADOR_HABILITADO = _env_bool("ESCALONADOR_HABILITADO", True)
+# Chamadas simultâneas por token (hash) e por host upstream
+ESCALONADOR_MAX_POR_TOKEN = _env_int("ESCALONADOR_MAX_POR_TOKEN", 16)
+ESCALONADOR_MAX_POR_HOST = _env_int("ESCALONADOR_MAX_POR_HOST", 64)
+# Chamadas aguardando na fila por token; acima disso, recusadas
+ESCALONADOR_FILA_MAX_POR_TOKEN = _env_int("ESCALONADOR_FILA_MAX_POR_TOKEN", 500)
+# Pesos das classes de prioridade (header X-Prioridade) no weighted fair queuing
+ESCALONADOR_PESOS = {
+    "interativa": _env_float("ESCALONADOR_PESO_INTERATIVA", 8.0),
+    "normal": _env_float("ESCALONADOR_PESO_NORMAL", 4.0),
+    "lote": _env_float("ESCALONADOR_PESO_LOTE", 1.0),
+}
+ESCALONADOR_PRIORIDADE_PADRAO = os.getenv("ESCALONADOR_PRIORIDADE_PADRAO", "normal")
+# Prioridade por operação SOAP quando a requisição não envia X-Prioridade
+# (ex: "BuscarNotasFiscaisVinculadas=lote,BuscarNotaFiscal=interativa")
+ESCALONADOR_PRIORIDADE_POR_OPERACAO = dict(
+    par.strip().split("=", 1)
+    for par in os.getenv("ESCALONADOR_PRIORIDADE_POR_OPERACAO", "").split(",")
+    if "=" in par
+)
+# Duração (s) assumida para uma chamada antes de haver medições (estimativa de espera na fila)
+ESCALONADOR_DURACAO_INICIAL = _env_float("ESCALONADOR_DURACAO_INICIAL", 1.0)
+
+# --- Controle de admissão (recusa cedo com 503 sob sobrecarga) ---
+ADMISSAO_HABILITADA = _env_bool("ADMISSAO_HABILITADA", True)
+# Limites de cada indicador; a pressão do worker é a maior razão indicador / limite
+ADMISSAO_LAG_MAX_MS = _env_float("ADMISSAO_LAG_MAX_MS", 100.0)
+ADMISSAO_UPSTREAM_MAX = _env_int("ADMISSAO_UPSTREAM_MAX", 128)
+ADMISSAO_FILA_MAX = _env_int("ADMISSAO_FILA_MAX", 256)
+# Pressão a partir da qual cada prioridade é recusada (consultas caras descem uma classe)
+ADMISSAO_LIMITE_POR_PRIORIDADE = {
+    "lote": _env_float("ADMISSAO_LIMITE_LOTE", 1.0),
+    "normal": _env_float("ADMISSAO_LIMITE_NORMAL", 1.5),
+    "interativa": _env_float("ADMISSAO_LIMITE_INTERATIVA", 2.5),
+}
+# Consulta cara: chamadas ao SGT previstas pela estimativa de custo (ver query_cost)
+ADMISSAO_CHAMADAS_CONSULTA_CARA = _env_int("ADMISSAO_CHAMADAS_CONSULTA_CARA", 5)
+# Retry-After (s) sugerido na pressão 1.0 (cresce proporcionalmente)
+ADMISSAO_RETRY_AFTER = _env_float("ADMISSAO_RETRY_AFTER", 2.0)
+# Intervalo (s) entre as medições do atraso do event loop
+ADMISSAO_INTERVALO_LAG = _env_float("ADMISSAO_INTERVALO_LAG", 0.1)
+
+# --- Roteamento por serviço (Cargas.svc, NFe.svc, CTe.svc) ---
+# URL base padrão dos serviços SGT (ex: https://sgt.exemplo.com/SGT.WebService),
+# da qual o WSDL de cada serviço é derivado: <base>/<Servico>.svc?wsdl.
+# Pode ser sobrescrita por requisição com o header X-SGT-Base-URL.
+SGT_BASE_URL = os.getenv("SGT_BASE_URL", "")
+# WSDL explícito por serviço (tem prioridade sobre a URL base)
+SGT_WSDL_POR_SERVICO = {
+    "Cargas": os.getenv("SGT_WSDL_CARGAS", ""),
+    "NFe": os.getenv("SGT_WSDL_NFE", ""),
+    "CTe": os.getenv("SGT_WSDL_CTE", ""),
+}
+
+# --- Cache em disco de WSDL/XSD (compartilhado entre workers) ---
+WSDL_CACHE_HABILITADO = _env_bool("WSDL_CACHE_HABILITADO", True)
+WSDL_CACHE_DIR = os.getenv(
+    "WSDL_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "multiembarcador-facade", "wsdl")
+)
+# Tempo de vida (segundos) dos documentos em cache. 0 = nunca expira.
+WSDL_CACHE_TTL = _env_int("WSDL_CACHE_TTL", 86400)
+
+# --- Cache de respostas SOAP (TTL + LRU + stale-while-revalidate) ---
+RESPONSE_CACHE_HABILITADO = _env_bool("RESPONSE_CACHE_HABILITADO", True)
+# TTL (segundos) por operação. 0 desabilita o cache da operação.
+RESPONSE_CACHE_TTL_POR_OPERACAO = {
+    "BuscarCarga": _env_float("RESPONSE_CACHE_TTL_BUSCAR_CARGA", 60.0),
+    "BuscarCargaPorCodigosIntegracao": _env_float("RESPONSE_CACHE_TTL_BUSCAR_CARGA_POR_CODIGOS", 60.0),
+    "BuscarNotasFiscaisVinculadas": _env_float("RESPONSE_CACHE_TTL_NOTAS_FISCAIS", 120.0),
+    # NF-e autorizada é imutável: pode usar um TTL longo
+    "BuscarNotaFiscal": _env_float("RESPONSE_CACHE_TTL_NOTA_FISCAL", 86400.0),
+}
+# Por quanto tempo (segundos) após o TTL uma entrada ainda é servida enquanto é revalidada
+RESPONSE_CACHE_JANELA_OBSOLETA = _env_float("RESPONSE_CACHE_JANELA_OBSOLETA", 300.0)
+# Limite de memória do cache (MB), com despejo LRU
+RESPONSE_CACHE_MAX_MB = _env_int("RESPONSE_CACHE_MAX_MB", 64)
+
+# --- Cache negativo ("não encontrado" / CodigoMensagem != 0) ---
+NEGATIVE_CACHE_HABILITADO = _env_bool("NEGATIVE_CACHE_HABILITADO", True)
+# TTL (segundos) das respostas negativas
+NEGATIVE_CACHE_TTL = _env_float("NEGATIVE_CACHE_TTL", 30.0)
+# Máximo de respostas negativas mantidas (despejo das mais antigas)
+NEGATIVE_CACHE_MAX_ITENS = _env_int("NEGATIVE_CACHE_MAX_ITENS", 10000)
+
+# --- DataLoaders (consultas em lote por requisição) ---
+# Máximo de chamadas upstream simultâneas por lote
+DATALOADER_MAX_CONCORRENCIA = _env_int("DATALOADER_MAX_CONCORRENCIA", 10)
+# Máximo de chaves por lote despachado
+DATALOADER_MAX_LOTE = _env_int("DATALOADER_MAX_LOTE", 100)
+
+# --- Consultas em massa (buscarCargas) ---
+# Máximo de chamadas BuscarCarga simultâneas por consulta
+BULK_MAX_CONCORRENCIA = _env_int("BULK_MAX_CONCORRENCIA", 8)
+# Máximo de protocolos aceitos por consulta
+BULK_MAX_ITENS = _env_int("BULK_MAX_ITENS", 500)
+
+# --- Paginação automática de NF-e (buscarNotasFiscaisVinculadas(todas: true)) ---
+# Máximo de páginas buscadas em paralelo
+NFE_PAGINACAO_MAX_PARALELO = _env_int("NFE_PAGINACAO_MAX_PARALELO", 4)
+# Máximo de páginas percorridas por consulta
+NFE_PAGINACAO_MAX_PAGINAS = _env_int("NFE_PAGINACAO_MAX_PAGINAS", 200)
+# Tamanho da página usado ao buscar todas as NF-e de uma carga para os
+# campos aninhados Carregamento.notasFiscais / Pedido.notasFiscais
+NFE_INDICE_TAMANHO_PAGINA = _env_int("NFE_INDICE_TAMANHO_PAGINA", 100)
+
+# --- Campos extraídos do XML da NF-e (NotaFiscalDetalhe.emitente, totais, ...) ---
+# Máximo de NF-e (por chave) com seções extraídas em cache
+NFE_XML_CACHE_MAX_ITENS = _env_int("NFE_XML_CACHE_MAX_ITENS", 2000)
+
+# --- Pool de processos para CPU pesada (respostas SOAP e XML de NF-e grandes) ---
+# Processos do pool (0 = desligado: tudo roda no processo do worker)
+OFFLOAD_PROCESSOS = _env_int("OFFLOAD_PROCESSOS", 0)
+# Tamanho mínimo (bytes) do payload para ir ao pool
+OFFLOAD_TAMANHO_MINIMO = _env_int("OFFLOAD_TAMANHO_MINIMO", 262144)
+
+# --- Modo compacto de memória (cargas com milhares de pedidos) ---
+# Modelos com __slots__ e Participantes/produtos idênticos compartilhados
+# (internados) dentro da mesma requisição
+MODELOS_COMPACTOS = _env_bool("MODELOS_COMPACTOS", False)
+
+# --- Codificação e compressão das respostas GraphQL ---
+# Serializa as respostas com orjson, se instalado (extra 'resposta')
+RESPOSTA_JSON_RAPIDO = _env_bool("RESPOSTA_JSON_RAPIDO", True)
+# Comprime (brotli, se instalado, ou gzip) respostas JSON conforme o Accept-Encoding
+RESPOSTA_COMPRESSAO_HABILITADA = _env_bool("RESPOSTA_COMPRESSAO_HABILITADA", True)
+# Tamanho mínimo (bytes) do corpo para comprimir
+RESPOSTA_COMPRESSAO_TAMANHO_MINIMO = _env_int("RESPOSTA_COMPRESSAO_TAMANHO_MINIMO", 1024)
+# Nível do gzip (1-9) e qualidade do brotli (0-11)
+RESPOSTA_COMPRESSAO_NIVEL_GZIP = _env_int("RESPOSTA_COMPRESSAO_NIVEL_GZIP", 6)
+RESPOSTA_COMPRESSAO_QUALIDADE_BROTLI = _env_int("RESPOSTA_COMPRESSAO_QUALIDADE_BROTLI", 5)
+
+# --- Custo estimado das consultas GraphQL (recusa antes de executar) ---
+# Custo máximo por consulta (0 = sem limite). Calibrado por um buscarCarga com
+# todos os campos, inclusive itensPedido, participantes e NF-e (~9.800 com as
+# estimativas abaixo): cabem ~6 dessas cargas, e dez aliases já são recusados.
+# Um buscarCargas enxuto de BULK_MAX_ITENS (500) protocolos custa ~53 mil.
+CUSTO_MAXIMO = _env_int("CUSTO_MAXIMO", 60000)
+# Custo de cada chamada prevista ao SGT
+CUSTO_POR_CHAMADA_UPSTREAM = _env_int("CUSTO_POR_CHAMADA_UPSTREAM", 100)
+# Tamanhos estimados das listas cujo tamanho não vem dos argumentos
+CUSTO_PEDIDOS_POR_CARGA = _env_int("CUSTO_PEDIDOS_POR_CARGA", 50)
+CUSTO_ITENS_POR_PEDIDO = _env_int("CUSTO_ITENS_POR_PEDIDO", 10)
+CUSTO_NFE_POR_CARGA = _env_int("CUSTO_NFE_POR_CARGA", 100)
+CUSTO_ITENS_POR_NFE = _env_int("CUSTO_ITENS_POR_NFE", 20)
+
+# --- Entrega incremental (@defer / @stream) ---
+# Só tem efeito com uma versão do graphql-core que suporte execução incremental
+# (>= 3.3.0a9, ver extra 'incremental' no pyproject.toml)
+GRAPHQL_INCREMENTAL_HABILITADO = _env_bool("GRAPHQL_INCREMENTAL_HABILITADO", True)
@@ -0,0 +1,92 @@
+# src/field_mapping.py
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, Optional, Tuple, Union
+
+# Caminho no dict SOAP: chaves de dicionário (str) e índices de lista (int)
+Caminho = Tuple[Union[str, int], ...]
+# Campo GraphQL -> (caminho no dict SOAP, conversor opcional)
+Mapeamento = Dict[str, Tuple[Caminho, Optional[Callable[[Any], Any]]]]
+
+def str_ou_vazio(valor: Any) -> str:
+    """
+    Conversor equivalente ao str(valor or '') usado no transformer C#.
+    """
+    return str(valor or '')
+
+class MapeamentoCompilado:
+    """
+    Tabela declarativa campo GraphQL -> caminho SOAP, compilada em funções
+    Python que constroem o modelo diretamente.
+
+    Cada função gerada percorre os caminhos como uma árvore de prefixos:
+    um prefixo comum (ex: 'Endereco' -> 'Cidade') é buscado uma única vez
+    e reaproveitado por todos os campos que o compartilham, com a mesma
+    semântica do safe_get (tipo errado ou ausente no caminho -> None).
+    Há uma função por conjunto de campos selecionados, gerada sob demanda
+    e cacheada, então campos não pedidos não custam nada.
+    """
+
+    def __init__(self, nome: str, modelo: type, mapeamento: Mapeamento):
+        self.nome = nome
+        self.modelo = modelo
+        self.mapeamento = mapeamento
+        # Função para "todos os campos", compilada na importação
+        self._todos = self._compilar(frozenset(mapeamento))
+
+    def construtor(self, selecao: Optional[Any] = None) -> Callable[..., Any]:
+        """
+        Retorna a função construir(dados, **extras) para os campos selecionados
+        (todos, se selecao for None). 'extras' são repassados ao modelo.
+        """
+        if selecao is None:
+            return self._todos
+        return self._compilar(frozenset(campo for campo in selecao if campo in self.mapeamento))
+
+    def construir(self, dados: Any, selecao: Optional[Any] = None, **extras: Any) -> Any:
+        """
+        Atalho: constrói o modelo a partir de 'dados' com os campos selecionados.
+        """
+        return self.construtor(selecao)(dados, **extras)
+
+    @lru_cache(maxsize=64)
+    def _compilar(self, campos: FrozenSet[str]) -> Callable[..., Any]:
+        linhas = ["def construir(dados, **extras):"]
+        variaveis: Dict[Caminho, str] = {(): "dados"}
+        ambiente: Dict[str, Any] = {"_modelo": self.modelo, "_dict": dict, "_list": list}
+        argumentos = []
+
+        def _no(caminho: Caminho) -> str:
+            # Gera (uma única vez) a variável com o valor do prefixo 'caminho'
+            if caminho in variaveis:
+                return variaveis[caminho]
+            pai = _no(caminho[:-1])
+            chave = caminho[-1]
+            nome = f"n{len(variaveis)}"
+            if isinstance(chave, int):
+                linhas.append(
+                    f"    {nome} = {pai}[{chave}] if isinstance({pai}, _list) and len({pai}) > {chave} else None"
+                )
+            else:
+                linhas.append(
+                    f"    {nome} = {pai}.get({chave!r}) if isinstance({pai}, _dict) else None"
+                )
+            variaveis[caminho] = nome
+            return nome
+
+        # Ordem estável: mesma ordem da tabela declarativa
+        for campo, (caminho, conversor) in self.mapeamento.items():
+            if campo not in campos:
+                continue
+            valor = _no(tuple(caminho))
+            if conversor is not None:
+                nome_conversor = f"_conv_{campo}"
+                ambiente[nome_conversor] = conversor
+                valor = f"{nome_conversor}({valor})"
+            argumentos.append(f"{campo}={valor}")
+
+        argumentos.append("**extras")
+        linhas.append(f"    return _modelo({', '.join(argumentos)})")
+
+        codigo = "\n".join(linhas)
+        exec(compile(codigo, f"<mapeamento {self.nome}>", "exec"), ambiente)
+        return ambiente["construir"]
@@ -0,0 +1,157 @@
+# src/http_pool.py
+import threading
+import time
+from typing import Any, Dict
+from urllib.parse import urlsplit
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from . import config, metrics
+
+# Pools de conexão HTTP por host upstream (esquema + host + porta).
+# Os serviços Cargas, NFe e CTe do SGT costumam estar no mesmo host:
+# todos os clientes Zeep (de qualquer WSDL) desse host compartilham
+# as mesmas conexões keep-alive, sem repetir handshakes TLS.
+_clientes_async: Dict[str, httpx.AsyncClient] = {}
+_sessoes_sync: Dict[str, requests.Session] = {}
+_lock = threading.Lock()
+# POSTs em andamento (usado pelo controle de admissão)
+_em_voo = 0
+
+_PORTAS_PADRAO = {'http': 80, 'https': 443}
+
+def chave_host(url: str) -> str:
+    """
+    Identifica o host upstream de uma URL (ex: 'https://sgt.exemplo.com:443').
+    """
+    partes = urlsplit(url)
+    esquema = (partes.scheme or 'http').lower()
+    porta = partes.port or _PORTAS_PADRAO.get(esquema)
+    return f"{esquema}://{(partes.hostname or '').lower()}:{porta}"
+
+def nome_metrica(host: str) -> str:
+    """
+    Nome do host (chave_host) nas métricas, sem o esquema: 'sgt.exemplo.com:443'.
+    """
+    return host.split('://', 1)[-1]
+
+def _http2_disponivel() -> bool:
+    if not config.HTTP_POOL_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        print("[HTTP] HTTP_POOL_HTTP2 ativo, mas o pacote 'h2' não está instalado. Usando HTTP/1.1.")
+        return False
+
+def _criar_cliente_async(host: str) -> httpx.AsyncClient:
+    nome = nome_metrica(host)
+
+    async def _antes_da_requisicao(request: httpx.Request) -> None:
+        # O trace do httpcore informa se a requisição abriu uma conexão nova
+        estado = {'nova': False}
+
+        async def _trace(evento: str, info: Dict[str, Any]) -> None:
+            if evento == 'connection.connect_tcp.complete':
+                estado['nova'] = True
+
+        request.extensions['trace'] = _trace
+        request.extensions['pool_estado'] = estado
+
+    async def _depois_da_resposta(response: httpx.Response) -> None:
+        estado = response.request.extensions.get('pool_estado')
+        metrics.incrementar(f'http_pool.{nome}.requisicoes')
+        if estado is not None and estado['nova']:
+            metrics.incrementar(f'http_pool.{nome}.conexoes_novas')
+        else:
+            metrics.incrementar(f'http_pool.{nome}.conexoes_reutilizadas')
+
+    http2 = _http2_disponivel()
+    print(f"[HTTP] Criando pool de conexões para {host} (http2={http2})")
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=config.SOAP_MAX_CONEXOES,
+            max_keepalive_connections=config.SOAP_MAX_CONEXOES_KEEPALIVE,
+            keepalive_expiry=config.HTTP_POOL_KEEPALIVE_EXPIRACAO
+        ),
+        timeout=httpx.Timeout(
+            config.SOAP_TIMEOUT_OPERACAO,
+            connect=config.HTTP_POOL_TIMEOUT_CONEXAO
+        ),
+        http2=http2,
+        event_hooks={'request': [_antes_da_requisicao], 'response': [_depois_da_resposta]}
+    )
+
+def obter_cliente_async(url: str) -> httpx.AsyncClient:
+    """
+    Retorna o cliente httpx (pool de conexões) do host da URL,
+    criando-o no primeiro uso.
+    """
+    host = chave_host(url)
+    with _lock:
+        cliente = _clientes_async.get(host)
+        if cliente is None or cliente.is_closed:
+            cliente = _criar_cliente_async(host)
+            _clientes_async[host] = cliente
+        return cliente
+
+def obter_sessao_sync(url: str) -> requests.Session:
+    """
+    Retorna a sessão requests (pool de conexões) do host da URL, usada
+    pelos clientes Zeep síncronos.
+    """
+    host = chave_host(url)
+    with _lock:
+        sessao = _sessoes_sync.get(host)
+        if sessao is None:
+            sessao = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=config.SOAP_MAX_CONEXOES_KEEPALIVE)
+            sessao.mount('http://', adaptador)
+            sessao.mount('https://', adaptador)
+            _sessoes_sync[host] = sessao
+        return sessao
+
+def registrar_latencia(url: str, segundos: float) -> None:
+    """
+    Registra a latência (ms) de uma chamada ao host da URL;
+    os percentis (p50/p95/p99) aparecem em /metrics.
+    """
+    metrics.registrar_amostra(f'http_pool.{nome_metrica(chave_host(url))}.latencia_ms', segundos * 1000)
+
+def em_voo() -> int:
+    """
+    Chamadas POST ao upstream em andamento neste worker (todos os hosts).
+    """
+    return _em_voo
+
+async def post(url: str, conteudo: bytes, headers: Dict[str, str]) -> httpx.Response:
+    """
+    POST pelo pool do host, registrando a latência (com o corpo da resposta lido).
+    """
+    global _em_voo
+    _em_voo += 1
+    metrics.definir('http_pool.em_voo', _em_voo)
+    inicio = time.perf_counter()
+    try:
+        response = await obter_cliente_async(url).post(url, content=conteudo, headers=headers)
+    finally:
+        _em_voo -= 1
+        metrics.definir('http_pool.em_voo', _em_voo)
+    registrar_latencia(url, time.perf_counter() - inicio)
+    return response
+
+async def fechar_pools() -> None:
+    """
+    Fecha todos os pools (chamado no shutdown da aplicação).
+    """
+    with _lock:
+        clientes = list(_clientes_async.values())
+        sessoes = list(_sessoes_sync.values())
+        _clientes_async.clear()
+        _sessoes_sync.clear()
+    for cliente in clientes:
+        if not cliente.is_closed:
+            await cliente.aclose()
+    for sessao in sessoes:
+        sessao.close()
@@ -0,0 +1,112 @@
+# src/loaders.py
+import asyncio
+import strawberry
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Union
+from strawberry.dataloader import DataLoader
+from . import config
+from .routing import SERVICO_NFE, obter_destino
+from .soap_client import PaginacaoExcedida, RespostaNegativaSGT, chamar_buscar_nota_fiscal_por_chave_async, chamar_buscar_todas_notas_fiscais_async
+
+class NotaFiscalNaoEncontrada(Exception):
+    """
+    Erro por chave: a NF-e não foi encontrada ou a consulta ao SGT falhou.
+    """
+
+def _criar_loader_nota_fiscal(wsdl_url: str, token: str) -> DataLoader:
+    """
+    Cria o DataLoader de BuscarNotaFiscal (CTe.svc) para um par WSDL/token.
+    As chaves repetidas na requisição são deduplicadas pelo cache do
+    DataLoader e o lote é despachado com concorrência limitada.
+    """
+
+    async def _carregar(chaves: List[str]) -> List[Union[dict, Exception]]:
+        print(f"[Loader] Despachando lote de {len(chaves)} chave(s) NF-e")
+        semaforo = asyncio.Semaphore(config.DATALOADER_MAX_CONCORRENCIA)
+
+        async def _carregar_uma(chave_nfe: str) -> Union[dict, Exception]:
+            try:
+                async with semaforo:
+                    dados = await chamar_buscar_nota_fiscal_por_chave_async(
+                        chave_nfe=chave_nfe,
+                        wsdl_url=wsdl_url,
+                        token=token
+                    )
+            except RespostaNegativaSGT as e:
+                # Erro da chave com o código e a mensagem do SGT
+                return e
+            if dados is None:
+                return NotaFiscalNaoEncontrada(f"NF-e {chave_nfe} não encontrada ou erro na consulta ao SGT.")
+            return dados
+
+        return await asyncio.gather(*[_carregar_uma(chave) for chave in chaves])
+
+    return DataLoader(load_fn=_carregar, max_batch_size=config.DATALOADER_MAX_LOTE)
+
+def obter_loader_nota_fiscal(info: strawberry.Info, wsdl_url: str, token: str) -> DataLoader:
+    """
+    Retorna o DataLoader de NF-e da requisição atual (um por WSDL/token).
+    Os loaders vivem no contexto criado por requisição em main.get_context.
+    """
+    loaders: Dict = info.context.setdefault("loaders", {})
+    chave = ("nota_fiscal", wsdl_url, token)
+    if chave not in loaders:
+        loaders[chave] = _criar_loader_nota_fiscal(wsdl_url, token)
+    return loaders[chave]
+
+@dataclass(frozen=True)
+class IndiceNotasFiscais:
+    """
+    Todas as NF-e de uma carga (dicts SOAP), indexadas por protocoloPedido.
+    """
+    notas: List[dict]
+    por_pedido: Dict[str, List[dict]]
+
+def _indexar_por_pedido(notas: List[dict]) -> IndiceNotasFiscais:
+    por_pedido: Dict[str, List[dict]] = defaultdict(list)
+    for nota in notas:
+        por_pedido[str(nota.get('ProtocoloPedido'))].append(nota)
+    return IndiceNotasFiscais(notas=notas, por_pedido=dict(por_pedido))
+
+def _criar_loader_notas_fiscais_carga(wsdl_url: str, token: str) -> DataLoader:
+    """
+    Cria o DataLoader das NF-e por carga (NFe.svc) para um par WSDL/token.
+    Cada protocolo de carga tem todas as suas páginas buscadas uma única
+    vez por requisição, não importa quantos Pedidos peçam suas notas.
+    """
+
+    async def _carregar(protocolos: List[str]) -> List[Union[Optional[IndiceNotasFiscais], Exception]]:
+        print(f"[Loader] Buscando NF-e de {len(protocolos)} carga(s)")
+        semaforo = asyncio.Semaphore(config.DATALOADER_MAX_CONCORRENCIA)
+
+        async def _carregar_um(protocolo_carga: str) -> Union[Optional[IndiceNotasFiscais], Exception]:
+            try:
+                async with semaforo:
+                    notas = await chamar_buscar_todas_notas_fiscais_async(
+                        protocolo_carga=protocolo_carga,
+                        tamanho_pagina=config.NFE_INDICE_TAMANHO_PAGINA,
+                        wsdl_url=wsdl_url,
+                        token=token
+                    )
+            except (RespostaNegativaSGT, PaginacaoExcedida) as e:
+                # Erro só desta carga: vira o erro GraphQL do campo notasFiscais
+                return e
+            # None: sem NF-e ou erro na consulta (mesma semântica do buscarNotasFiscaisVinculadas)
+            return _indexar_por_pedido(notas) if notas is not None else None
+
+        return await asyncio.gather(*[_carregar_um(protocolo) for protocolo in protocolos])
+
+    return DataLoader(load_fn=_carregar, max_batch_size=config.DATALOADER_MAX_LOTE)
+
+async def carregar_notas_fiscais_da_carga(info: strawberry.Info, protocolo_carga: str) -> Optional[IndiceNotasFiscais]:
+    """
+    Retorna o índice de NF-e da carga pelo DataLoader da requisição atual
+    (WSDL da NFe e token resolvidos a partir dos headers).
+    """
+    wsdl_url, token = obter_destino(info, SERVICO_NFE)
+    loaders: Dict = info.context.setdefault("loaders", {})
+    chave = ("notas_fiscais_carga", wsdl_url, token)
+    if chave not in loaders:
+        loaders[chave] = _criar_loader_notas_fiscais_carga(wsdl_url, token)
+    return await loaders[chave].load(protocolo_carga)
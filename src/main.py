@@ -1,10 +1,26 @@
 # src/main.py
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import HTMLResponse
-from strawberry.fastapi import GraphQLRouter
+from strawberry.schema.config import StrawberryConfig
 import strawberry
 from .resolvers import Query
+from .soap_client import fechar_http_client_async
+from .response_encoding import GraphQLRouterRapido, CompressaoMiddleware
+from .admission import AdmissaoMiddleware, monitor as monitor_carga
+from .query_cost import LimiteCustoConsulta
+from . import config
+from . import metrics
+from . import offload
+from . import scheduler
+
+try:
+    # Execução incremental (@defer/@stream) só existe no graphql-core >= 3.3.0a9
+    from graphql.execution import experimental_execute_incrementally  # noqa: F401
+    INCREMENTAL_DISPONIVEL = True
+except ImportError:
+    INCREMENTAL_DISPONIVEL = False
 from typing import Dict, Any
 
 # --- Ponto-Chave da Arquitetura ---
@@ -12,29 +28,67 @@ async def get_context(request: Request) -> Dict[str, Any]:
     """
     Injeta a requisição FastAPI no contexto do Strawberry
     para que os resolvers possam acessar os headers.
+    Também cria o espaço dos DataLoaders, que vivem só durante a requisição,
+    e associa a prioridade/prazo dos headers às chamadas ao SGT (ver scheduler).
     """
+    scheduler.definir_contexto(request.headers)
     return {
-        "request": request
+        "request": request,
+        "loaders": {}
     }
 # -----------------------------------
 
 # Criar o Schema do Strawberry
-schema = strawberry.Schema(query=Query)
+# Com execução incremental, o schema ganha as diretivas @defer e @stream
+# e as respostas são enviadas em partes (multipart/mixed).
+# O custo de cada consulta é estimado antes da execução (ver query_cost).
+schema = strawberry.Schema(
+    query=Query,
+    extensions=[LimiteCustoConsulta],
+    config=StrawberryConfig(
+        enable_experimental_incremental_execution=config.GRAPHQL_INCREMENTAL_HABILITADO and INCREMENTAL_DISPONIVEL
+    )
+)
 
 # Criar o "roteador" do GraphQL, passando o 'context_getter'
-graphql_app = GraphQLRouter(
+# (as respostas são serializadas com orjson, quando disponível)
+graphql_app = GraphQLRouterRapido(
     schema,
     context_getter=get_context
 )
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Ciclo de vida da aplicação: inicia a medição de carga do controle de
+    admissão e, no shutdown, fecha o pool httpx compartilhado e o pool de
+    processos (offload).
+    """
+    if config.ADMISSAO_HABILITADA:
+        monitor_carga.iniciar()
+    yield
+    await monitor_carga.parar()
+    await fechar_http_client_async()
+    offload.fechar()
+
 # Criar o app FastAPI
 app = FastAPI(
     title="Multiembarcador GraphQL Facade",
     description="Fachada GraphQL para o WebService SOAP SGT. " \
                 "Forneça os headers X-Target-WSDL e X-Auth-Token.",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
+# Respostas JSON grandes (ex: NotaFiscalDetalhe.xml) vão comprimidas
+if config.RESPOSTA_COMPRESSAO_HABILITADA:
+    app.add_middleware(CompressaoMiddleware)
+
+# Sob sobrecarga, recusa cedo (503 + Retry-After) as consultas de menor
+# prioridade ou mais caras. Adicionado por último para ser o mais externo.
+if config.ADMISSAO_HABILITADA:
+    app.add_middleware(AdmissaoMiddleware, schema=schema._schema)
+
 # Montar o GraphQL no endpoint /graphql
 app.include_router(graphql_app, prefix="/graphql")
 
@@ -45,10 +99,18 @@ def read_root():
         "message": "Multiembarcador GraphQL Facade",
         "endpoints": {
             "graphql": "/graphql - API GraphQL (somente API)",
-            "graphiql": "/graphiql - GraphiQL com Docs Explorer e suporte a headers customizados"
+            "graphiql": "/graphiql - GraphiQL com Docs Explorer e suporte a headers customizados",
+            "metrics": "/metrics - Métricas do worker (cache, conexões, etc.)"
         }
     }
 
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    """
+    Métricas em memória deste worker (ex: hits/misses do cache de WSDL).
+    """
+    return metrics.snapshot()
+
 @app.get("/graphiql", response_class=HTMLResponse, include_in_schema=False)
 async def graphiql():
     """
@@ -0,0 +1,89 @@
+# src/metrics.py
+import threading
+from collections import defaultdict, deque
+from typing import Deque, Dict, Any, Optional
+
+# Registro simples de métricas em memória (por processo/worker).
+# Exposto em JSON pelo endpoint /metrics (ver main.py).
+_lock = threading.Lock()
+_contadores: Dict[str, int] = defaultdict(int)
+# Amostras recentes (ex: latências) para cálculo de percentis
+_JANELA_AMOSTRAS = 1000
+_amostras: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=_JANELA_AMOSTRAS))
+
+def incrementar(nome: str, valor: int = 1) -> None:
+    """
+    Incrementa um contador nomeado (ex: 'wsdl_cache.hits').
+    """
+    with _lock:
+        _contadores[nome] += valor
+
+def definir(nome: str, valor: int) -> None:
+    """
+    Define o valor atual de um indicador (ex: 'response_cache.bytes').
+    """
+    with _lock:
+        _contadores[nome] = valor
+
+def obter_contador(nome: str) -> int:
+    """
+    Retorna o valor atual de um contador (0 se nunca incrementado).
+    """
+    with _lock:
+        return _contadores.get(nome, 0)
+
+def registrar_amostra(nome: str, valor: float) -> None:
+    """
+    Registra uma amostra (ex: latência em ms) de uma série nomeada.
+    Só as últimas amostras são mantidas (janela deslizante).
+    """
+    with _lock:
+        _amostras[nome].append(valor)
+
+def quantidade_amostras(nome: str) -> int:
+    """
+    Quantidade de amostras recentes da série.
+    """
+    with _lock:
+        return len(_amostras.get(nome, ()))
+
+def _percentil(ordenadas: list, p: float) -> float:
+    indice = min(len(ordenadas) - 1, max(0, int(round(p / 100 * len(ordenadas))) - 1))
+    return ordenadas[indice]
+
+def percentil(nome: str, p: float) -> Optional[float]:
+    """
+    Retorna o percentil p (0-100) das amostras recentes da série (None se vazia).
+    """
+    with _lock:
+        amostras = sorted(_amostras.get(nome, ()))
+    if not amostras:
+        return None
+    return _percentil(amostras, p)
+
+def snapshot() -> Dict[str, Any]:
+    """
+    Retorna uma cópia de todas as métricas, agrupadas pelo prefixo do nome.
+    Ex: {'wsdl_cache': {'hits': 3, 'misses': 1}}
+    """
+    with _lock:
+        itens: Dict[str, Any] = dict(_contadores)
+        series = {nome: sorted(valores) for nome, valores in _amostras.items() if valores}
+
+    # Séries de amostras viram um resumo de percentis
+    for nome, ordenadas in series.items():
+        itens[nome] = {
+            'amostras': len(ordenadas),
+            'p50': round(_percentil(ordenadas, 50), 3),
+            'p95': round(_percentil(ordenadas, 95), 3),
+            'p99': round(_percentil(ordenadas, 99), 3),
+        }
+
+    agrupado: Dict[str, Any] = {}
+    for nome, valor in sorted(itens.items()):
+        grupo, _, chave = nome.partition('.')
+        if chave:
+            agrupado.setdefault(grupo, {})[chave] = valor
+        else:
+            agrupado[grupo] = valor
+    return agrupado
@@ -1,70 +1,132 @@
 # src/models.py
+import dataclasses
 import strawberry
-from typing import List, Optional
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+from . import config
+
+def _internados(info: strawberry.Info) -> Optional[Dict]:
+    """
+    Instâncias compartilhadas da requisição (só no modo MODELOS_COMPACTOS).
+    """
+    if not config.MODELOS_COMPACTOS:
+        return None
+    return info.context.setdefault("internados", {})
 
 @strawberry.type
 class ItemPedido:
     """ Baseado no 'ItemPedido' do C# """
-    codigoGrupoProduto: Optional[str]
-    codigoProduto: Optional[str]
-    codigoNcm: Optional[str]
-    descricaoGrupoProduto: Optional[str]
-    descricaoProduto: Optional[str]
-    metroCubico: Optional[float]
-    pesoUnitario: Optional[float]
-    quantidade: Optional[float]
-    valorUnitario: Optional[float]
+    codigoGrupoProduto: Optional[str] = None
+    codigoProduto: Optional[str] = None
+    codigoNcm: Optional[str] = None
+    descricaoGrupoProduto: Optional[str] = None
+    descricaoProduto: Optional[str] = None
+    metroCubico: Optional[float] = None
+    pesoUnitario: Optional[float] = None
+    quantidade: Optional[float] = None
+    valorUnitario: Optional[float] = None
 
 @strawberry.type
 class Participante:
     """ Tipo genérico para Expedidor (Remetente) e Recebedor (Destinatario) """
-    bairro: Optional[str]
-    cep: Optional[str]
-    cidade: Optional[str]
-    cnpj: Optional[str]
-    descricao: Optional[str]
-    endereco: Optional[str]
-    estado: Optional[str]
-    ibge: Optional[str]
-    ie: Optional[str]
-    logradouro: Optional[str]
-    numero: Optional[str]
-    razaoSocial: Optional[str]
+    bairro: Optional[str] = None
+    cep: Optional[str] = None
+    cidade: Optional[str] = None
+    cnpj: Optional[str] = None
+    descricao: Optional[str] = None
+    endereco: Optional[str] = None
+    estado: Optional[str] = None
+    ibge: Optional[str] = None
+    ie: Optional[str] = None
+    logradouro: Optional[str] = None
+    numero: Optional[str] = None
+    razaoSocial: Optional[str] = None
 
 @strawberry.type
 class Pedido:
     """ Baseado no 'Pedido' do C# """
-    codFilial: Optional[str]
-    numeroPedidoEmbarcador: Optional[str]
-    protocoloPedido: Optional[str]
-    codigoRota: Optional[str]
-    dataInicioCarregamento: Optional[str] # Usar str ou strawberry.DateTime
-    dataPrevisaoEntrega: Optional[str]    # Usar str ou strawberry.DateTime
-    observacao: Optional[str]
-    ordemEntrega: Optional[int]
-    pesoBruto: Optional[float]
-    tipoCarga: Optional[str]
-    tipoOperacao: Optional[str]
-    tipoPedido: Optional[str]
-    vendedor: Optional[str]
-    expedidor: Optional[Participante]
-    recebedor: Optional[Participante]
-    itensPedido: List[ItemPedido]
+    codFilial: Optional[str] = None
+    numeroPedidoEmbarcador: Optional[str] = None
+    protocoloPedido: Optional[str] = None
+    codigoRota: Optional[str] = None
+    dataInicioCarregamento: Optional[str] = None # Usar str ou strawberry.DateTime
+    dataPrevisaoEntrega: Optional[str] = None    # Usar str ou strawberry.DateTime
+    observacao: Optional[str] = None
+    ordemEntrega: Optional[int] = None
+    pesoBruto: Optional[float] = None
+    tipoCarga: Optional[str] = None
+    tipoOperacao: Optional[str] = None
+    tipoPedido: Optional[str] = None
+    vendedor: Optional[str] = None
+    # Linha CargaIntegracao original: expedidor, recebedor e itensPedido
+    # são montados sob demanda, só quando o cliente os seleciona.
+    dados_soap: strawberry.Private[Optional[Dict[str, Any]]] = None
+
+    @strawberry.field
+    def expedidor(self, info: strawberry.Info) -> Optional[Participante]:
+        from .transformation import transformar_participante
+        from .selection import selecao_campos
+        return transformar_participante(self.dados_soap, 'Remetente', selecao_campos(info), _internados(info))
+
+    @strawberry.field
+    def recebedor(self, info: strawberry.Info) -> Optional[Participante]:
+        from .transformation import transformar_participante
+        from .selection import selecao_campos
+        return transformar_participante(self.dados_soap, 'Destinatario', selecao_campos(info), _internados(info))
+
+    @strawberry.field
+    def itensPedido(self, info: strawberry.Info) -> List[ItemPedido]:
+        from .transformation import transformar_itens_pedido
+        from .selection import selecao_campos
+        return transformar_itens_pedido(self.dados_soap, selecao_campos(info), _internados(info))
+
+    @strawberry.field
+    async def notasFiscais(self, info: strawberry.Info) -> Optional[List["DadosNotaFiscal"]]:
+        """ NF-e do pedido, a partir das NF-e da carga (buscadas uma única vez por requisição) """
+        from .loaders import carregar_notas_fiscais_da_carga
+        from .transformation import transformar_nota_fiscal
+        from .selection import selecao_campos
+        dados = self.dados_soap or {}
+        if dados.get('ProtocoloCarga') is None:
+            return None
+        protocolo_carga = str(dados['ProtocoloCarga'])
+        indice = await carregar_notas_fiscais_da_carga(info, protocolo_carga)
+        if indice is None:
+            return None
+        notas = indice.por_pedido.get(str(dados.get('ProtocoloPedido')), [])
+        return transformar_nota_fiscal(notas, protocolo_carga, selecao_campos(info))
 
 @strawberry.type
 class Carregamento:
     """ Objeto aninhado principal, baseado no 'Carregamento' do C# """
-    numeroCarga: Optional[str]
-    filial: Optional[str]
-    protocoloCarga: Optional[str]
-    cpfMotorista: Optional[str]
-    nomeMotorista: Optional[str]
-    modeloVeicular: Optional[str]
-    placaVeiculo: Optional[str]
-    tipoOperacao: Optional[str]
-    tipoVeiculo: Optional[str]
-    transportador: Optional[str] # CNPJ
-    pedidos: List[Pedido]
+    numeroCarga: Optional[str] = None
+    filial: Optional[str] = None
+    protocoloCarga: Optional[str] = None
+    cpfMotorista: Optional[str] = None
+    nomeMotorista: Optional[str] = None
+    modeloVeicular: Optional[str] = None
+    placaVeiculo: Optional[str] = None
+    tipoOperacao: Optional[str] = None
+    tipoVeiculo: Optional[str] = None
+    transportador: Optional[str] = None # CNPJ
+    pedidos: List[Pedido] = strawberry.field(default_factory=list)
+    # Primeira linha CargaIntegracao (usada pelo notasFiscais)
+    dados_soap: strawberry.Private[Optional[Dict[str, Any]]] = None
+
+    @strawberry.field
+    async def notasFiscais(self, info: strawberry.Info) -> Optional[List["DadosNotaFiscal"]]:
+        """ Todas as NF-e da carga (todas as páginas, buscadas uma única vez por requisição) """
+        from .loaders import carregar_notas_fiscais_da_carga
+        from .transformation import transformar_nota_fiscal
+        from .selection import selecao_campos
+        dados = self.dados_soap or {}
+        if dados.get('ProtocoloCarga') is None:
+            return None
+        protocolo_carga = str(dados['ProtocoloCarga'])
+        indice = await carregar_notas_fiscais_da_carga(info, protocolo_carga)
+        if indice is None:
+            return None
+        return transformar_nota_fiscal(indice.notas, protocolo_carga, selecao_campos(info))
 
 @strawberry.type
 class DadosNotaFiscal:
@@ -73,23 +135,173 @@ class DadosNotaFiscal:
     baseado no transformer C#.
     """
     protocoloCarga: str # O protocoloCarga passado como argumento
-    protocoloPedido: Optional[str]
-    chaveAcesso: Optional[str]
-    cnpjExpedidor: Optional[str] # x.Emitente.CPFCNPJ
-    cnpjRecebedor: Optional[str] # x.Destinatario.CPFCNPJ
-    dataEmissao: Optional[str]
-    numero: Optional[str]
-    serie: Optional[str]
-    pesoBruto: Optional[float]
-    pesoLiquido: Optional[float]
-    situacao: Optional[str]      # x.SituacaoNFeSefaz.ToString()
-    valor: Optional[float]
+    protocoloPedido: Optional[str] = None
+    chaveAcesso: Optional[str] = None
+    cnpjExpedidor: Optional[str] = None # x.Emitente.CPFCNPJ
+    cnpjRecebedor: Optional[str] = None # x.Destinatario.CPFCNPJ
+    dataEmissao: Optional[str] = None
+    numero: Optional[str] = None
+    serie: Optional[str] = None
+    pesoBruto: Optional[float] = None
+    pesoLiquido: Optional[float] = None
+    situacao: Optional[str] = None      # x.SituacaoNFeSefaz.ToString()
+    valor: Optional[float] = None
+
+@strawberry.type
+class ParticipanteNFe:
+    """ Emitente (emit) ou destinatário (dest) lido do XML da NF-e """
+    cnpj: Optional[str] = None
+    cpf: Optional[str] = None
+    nome: Optional[str] = None          # xNome
+    nomeFantasia: Optional[str] = None  # xFant
+    ie: Optional[str] = None
+    logradouro: Optional[str] = None
+    numero: Optional[str] = None
+    bairro: Optional[str] = None
+    codigoMunicipio: Optional[str] = None # cMun (IBGE)
+    municipio: Optional[str] = None
+    uf: Optional[str] = None
+    cep: Optional[str] = None
+
+@strawberry.type
+class TotaisNFe:
+    """ Totais da NF-e (total/ICMSTot) """
+    valorBaseCalculoIcms: Optional[float] = None
+    valorIcms: Optional[float] = None
+    valorBaseCalculoIcmsSt: Optional[float] = None
+    valorIcmsSt: Optional[float] = None
+    valorProdutos: Optional[float] = None
+    valorFrete: Optional[float] = None
+    valorSeguro: Optional[float] = None
+    valorDesconto: Optional[float] = None
+    valorIpi: Optional[float] = None
+    valorPis: Optional[float] = None
+    valorCofins: Optional[float] = None
+    valorOutros: Optional[float] = None
+    valorTotal: Optional[float] = None  # vNF
+
+@strawberry.type
+class ItemNFe:
+    """ Item (det/prod) da NF-e """
+    numeroItem: Optional[int] = None    # det/@nItem
+    codigoProduto: Optional[str] = None
+    ean: Optional[str] = None
+    descricao: Optional[str] = None
+    ncm: Optional[str] = None
+    cfop: Optional[str] = None
+    unidade: Optional[str] = None
+    quantidade: Optional[float] = None
+    valorUnitario: Optional[float] = None
+    valorTotal: Optional[float] = None
+
+@strawberry.type
+class ProtocoloNFe:
+    """ Protocolo de autorização (protNFe/infProt) """
+    numero: Optional[str] = None        # nProt
+    chaveAcesso: Optional[str] = None
+    dataRecebimento: Optional[str] = None
+    status: Optional[str] = None        # cStat (ex: 100 = autorizado)
+    motivo: Optional[str] = None        # xMotivo
+    ambiente: Optional[str] = None      # tpAmb (1 = produção, 2 = homologação)
 
 @strawberry.type
 class NotaFiscalDetalhe:
     """
     Representa o detalhe de uma NFe, incluindo seu XML.
     Retorno do método BuscarNotaFiscal do CTe.svc.
+    Os campos abaixo do xml são extraídos do próprio XML só quando
+    pedidos (ver nfe_xml.py): quem não precisa do documento inteiro
+    pode deixar o 'xml' fora da seleção.
+    """
+    chaveAcesso: Optional[str] = None
+    xml: Optional[str] = None
+
+    @strawberry.field
+    async def emitente(self, info: strawberry.Info) -> Optional[ParticipanteNFe]:
+        from .nfe_xml import extrair_secao
+        return await extrair_secao(info, self.chaveAcesso, self.xml, 'emitente')
+
+    @strawberry.field
+    async def destinatario(self, info: strawberry.Info) -> Optional[ParticipanteNFe]:
+        from .nfe_xml import extrair_secao
+        return await extrair_secao(info, self.chaveAcesso, self.xml, 'destinatario')
+
+    @strawberry.field
+    async def totais(self, info: strawberry.Info) -> Optional[TotaisNFe]:
+        from .nfe_xml import extrair_secao
+        return await extrair_secao(info, self.chaveAcesso, self.xml, 'totais')
+
+    @strawberry.field
+    async def itens(self, info: strawberry.Info) -> Optional[List[ItemNFe]]:
+        from .nfe_xml import extrair_secao
+        return await extrair_secao(info, self.chaveAcesso, self.xml, 'itens')
+
+    @strawberry.field
+    async def protocolo(self, info: strawberry.Info) -> Optional[ProtocoloNFe]:
+        """ Protocolo de autorização da SEFAZ (nulo se o XML não for um nfeProc) """
+        from .nfe_xml import extrair_secao
+        return await extrair_secao(info, self.chaveAcesso, self.xml, 'protocolo')
+
+@strawberry.type
+class ResultadoNotaFiscalPorChave:
+    """
+    Resultado por chave do buscarNotasFiscaisPorChaves.
+    Em caso de falha, 'nota' é nulo e 'erro' traz o motivo.
+    """
+    chaveNFe: str
+    nota: Optional[NotaFiscalDetalhe] = None
+    erro: Optional[str] = None
+
+@strawberry.type
+class ResultadoCarga:
+    """
+    Resultado por protocolo do buscarCargas.
+    Em caso de falha, 'carga' é nulo e 'erro' traz o motivo.
+    """
+    protocolo: str
+    carga: Optional[Carregamento] = None
+    erro: Optional[str] = None
+
+# --- Modo compacto (MODELOS_COMPACTOS) ---
+
+@lru_cache(maxsize=None)
+def classe_compacta(modelo: type) -> type:
+    """
+    Versão com __slots__ (sem __dict__ por instância) de um tipo Strawberry,
+    com os mesmos atributos e o mesmo construtor por palavra-chave.
+    Os tipos acima não têm interfaces, então o Strawberry lê os campos das
+    instâncias só por atributo e aceita a versão compacta no lugar do
+    tipo original (os resolvers recebem a instância compacta como self).
+    """
+    campos = [campo for campo in dataclasses.fields(modelo) if campo.init]
+    parametros, corpo = [], []
+    ambiente: Dict[str, Any] = {}
+    for campo in campos:
+        nome = campo.name
+        if campo.default_factory is not dataclasses.MISSING:
+            ambiente[f"_fabrica_{nome}"] = campo.default_factory
+            parametros.append(f"{nome}=None")
+            corpo.append(f"self.{nome} = _fabrica_{nome}() if {nome} is None else {nome}")
+        elif campo.default is not dataclasses.MISSING:
+            ambiente[f"_padrao_{nome}"] = campo.default
+            parametros.append(f"{nome}=_padrao_{nome}")
+            corpo.append(f"self.{nome} = {nome}")
+        else:
+            parametros.append(nome)
+            corpo.append(f"self.{nome} = {nome}")
+
+    codigo = f"def __init__(self, *, {', '.join(parametros)}):\n    " + "\n    ".join(corpo)
+    exec(compile(codigo, f"<{modelo.__name__}Compacto>", "exec"), ambiente)
+    return type(f"{modelo.__name__}Compacto", (), {
+        "__slots__": tuple(campo.name for campo in campos),
+        "__init__": ambiente["__init__"],
+        "__module__": modelo.__module__,
+        "__doc__": modelo.__doc__,
+    })
+
+def classe_modelo(modelo: type) -> type:
+    """
+    Classe usada para instanciar o modelo: a versão compacta com
+    MODELOS_COMPACTOS ligado, senão o próprio tipo Strawberry.
     """
-    chaveAcesso: Optional[str]
-    xml: Optional[str]
+    return classe_compacta(modelo) if config.MODELOS_COMPACTOS else modelo
@@ -0,0 +1,245 @@
+# src/nfe_xml.py
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+import strawberry
+from lxml import etree
+from . import config, metrics, offload
+from .coalescing import hash_token
+from .models import ItemNFe, ParticipanteNFe, ProtocoloNFe, TotaisNFe, classe_modelo
+
+# Extração dos campos do XML da NF-e (layout 4.00) com XPaths compilados
+# na importação. Cada seção (emitente, destinatario, totais, itens,
+# protocolo) só é extraída quando pedida na query e fica em cache pelo
+# hash do conteúdo do XML (separado por token): a NF-e autorizada não muda.
+
+_NS = {'nfe': 'http://www.portalfiscal.inf.br/nfe'}
+
+# Ignora a declaração de encoding do documento: o XML (str) é sempre codificado em UTF-8 antes
+# da análise
+_PARSER = etree.XMLParser(encoding='utf-8', resolve_entities=False, no_network=True, remove_blank_text=True)
+
+def _xpath(expressao: str) -> etree.XPath:
+    return etree.XPath(expressao, namespaces=_NS, smart_strings=False)
+
+def _texto(expressao: str) -> Callable[[etree._Element], Optional[str]]:
+    xpath = _xpath(f'string({expressao})')
+    return lambda no: xpath(no).strip() or None
+
+def _numero(expressao: str) -> Callable[[etree._Element], Optional[float]]:
+    xpath = _xpath(f'string({expressao})')
+
+    def ler(no: etree._Element) -> Optional[float]:
+        try:
+            return float(xpath(no))
+        except ValueError:
+            return None
+    return ler
+
+def _inteiro(expressao: str) -> Callable[[etree._Element], Optional[int]]:
+    xpath = _xpath(f'string({expressao})')
+
+    def ler(no: etree._Element) -> Optional[int]:
+        try:
+            return int(xpath(no))
+        except ValueError:
+            return None
+    return ler
+
+# enderEmit ou enderDest, conforme o participante
+_ENDERECO = '(nfe:enderEmit|nfe:enderDest)'
+
+_CAMPOS_PARTICIPANTE = {
+    'cnpj': _texto('nfe:CNPJ'),
+    'cpf': _texto('nfe:CPF'),
+    'nome': _texto('nfe:xNome'),
+    'nomeFantasia': _texto('nfe:xFant'),
+    'ie': _texto('nfe:IE'),
+    'logradouro': _texto(f'{_ENDERECO}/nfe:xLgr'),
+    'numero': _texto(f'{_ENDERECO}/nfe:nro'),
+    'bairro': _texto(f'{_ENDERECO}/nfe:xBairro'),
+    'codigoMunicipio': _texto(f'{_ENDERECO}/nfe:cMun'),
+    'municipio': _texto(f'{_ENDERECO}/nfe:xMun'),
+    'uf': _texto(f'{_ENDERECO}/nfe:UF'),
+    'cep': _texto(f'{_ENDERECO}/nfe:CEP'),
+}
+
+_CAMPOS_TOTAIS = {
+    'valorBaseCalculoIcms': _numero('nfe:vBC'),
+    'valorIcms': _numero('nfe:vICMS'),
+    'valorBaseCalculoIcmsSt': _numero('nfe:vBCST'),
+    'valorIcmsSt': _numero('nfe:vST'),
+    'valorProdutos': _numero('nfe:vProd'),
+    'valorFrete': _numero('nfe:vFrete'),
+    'valorSeguro': _numero('nfe:vSeg'),
+    'valorDesconto': _numero('nfe:vDesc'),
+    'valorIpi': _numero('nfe:vIPI'),
+    'valorPis': _numero('nfe:vPIS'),
+    'valorCofins': _numero('nfe:vCOFINS'),
+    'valorOutros': _numero('nfe:vOutro'),
+    'valorTotal': _numero('nfe:vNF'),
+}
+
+_CAMPOS_ITEM = {
+    'numeroItem': _inteiro('@nItem'),
+    'codigoProduto': _texto('nfe:prod/nfe:cProd'),
+    'ean': _texto('nfe:prod/nfe:cEAN'),
+    'descricao': _texto('nfe:prod/nfe:xProd'),
+    'ncm': _texto('nfe:prod/nfe:NCM'),
+    'cfop': _texto('nfe:prod/nfe:CFOP'),
+    'unidade': _texto('nfe:prod/nfe:uCom'),
+    'quantidade': _numero('nfe:prod/nfe:qCom'),
+    'valorUnitario': _numero('nfe:prod/nfe:vUnCom'),
+    'valorTotal': _numero('nfe:prod/nfe:vProd'),
+}
+
+_CAMPOS_PROTOCOLO = {
+    'numero': _texto('nfe:nProt'),
+    'chaveAcesso': _texto('nfe:chNFe'),
+    'dataRecebimento': _texto('nfe:dhRecbto'),
+    'status': _texto('nfe:cStat'),
+    'motivo': _texto('nfe:xMotivo'),
+    'ambiente': _texto('nfe:tpAmb'),
+}
+
+# Seção -> (XPath dos nós a partir da raiz, modelo, campos, é lista)
+# A raiz pode ser nfeProc (NF-e + protocolo) ou só NFe.
+_SECOES: Dict[str, Tuple[etree.XPath, type, Dict[str, Callable], bool]] = {
+    'emitente': (_xpath('//nfe:infNFe[1]/nfe:emit'), ParticipanteNFe, _CAMPOS_PARTICIPANTE, False),
+    'destinatario': (_xpath('//nfe:infNFe[1]/nfe:dest'), ParticipanteNFe, _CAMPOS_PARTICIPANTE, False),
+    'totais': (_xpath('//nfe:infNFe[1]/nfe:total/nfe:ICMSTot'), TotaisNFe, _CAMPOS_TOTAIS, False),
+    'itens': (_xpath('//nfe:infNFe[1]/nfe:det'), ItemNFe, _CAMPOS_ITEM, True),
+    'protocolo': (_xpath('//nfe:protNFe/nfe:infProt'), ProtocoloNFe, _CAMPOS_PROTOCOLO, False),
+}
+
+def _extrair_valores(raiz: etree._Element, secao: str) -> Any:
+    # Valores da seção como dict (ou lista de dicts), sem instanciar modelos
+    xpath, _, campos, lista = _SECOES[secao]
+    nos = xpath(raiz)
+    if lista:
+        return [{nome: ler(no) for nome, ler in campos.items()} for no in nos]
+    if not nos:
+        return None
+    return {nome: ler(nos[0]) for nome, ler in campos.items()}
+
+def _construir(secao: str, valores: Any) -> Any:
+    classe = classe_modelo(_SECOES[secao][1])
+    if valores is None:
+        return None
+    if isinstance(valores, list):
+        return [classe(**item) for item in valores]
+    return classe(**valores)
+
+def _analisar(xml: bytes) -> Optional[etree._Element]:
+    try:
+        metrics.incrementar('nfe_xml.analises')
+        return etree.fromstring(xml, _PARSER)
+    except (etree.XMLSyntaxError, ValueError) as e:
+        print(f"[NF-e] XML inválido, campos extraídos ficam nulos: {e}")
+        metrics.incrementar('nfe_xml.xml_invalido')
+        return None
+
+def extrair_secoes_em_processo(xml: bytes) -> Optional[Dict[str, Any]]:
+    """
+    Analisa o XML (bytes UTF-8) num processo do pool (ver offload) e
+    extrai todas as seções de uma vez, como dicts.
+    """
+    raiz = _analisar(xml)
+    if raiz is None:
+        return None
+    return {secao: _extrair_valores(raiz, secao) for secao in _SECOES}
+
+class CacheSecoesNFe:
+    """
+    Seções já extraídas por NF-e, com despejo LRU por número de notas.
+    """
+
+    def __init__(self, nome: str, max_itens: int):
+        self.nome = nome
+        self.max_itens = max_itens
+        self._itens: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+
+    def secoes(self, chave: Hashable) -> Dict[str, Any]:
+        """
+        Dict seção -> valor da NF-e (criado vazio no primeiro acesso).
+        """
+        secoes = self._itens.get(chave)
+        if secoes is not None:
+            self._itens.move_to_end(chave)
+            return secoes
+        secoes = self._itens[chave] = {}
+        while len(self._itens) > self.max_itens:
+            self._itens.popitem(last=False)
+            metrics.incrementar(f'{self.nome}.despejos')
+        metrics.definir(f'{self.nome}.itens', len(self._itens))
+        return secoes
+
+    def limpar(self) -> None:
+        self._itens.clear()
+        metrics.definir(f'{self.nome}.itens', 0)
+
+_cache_secoes: Optional[CacheSecoesNFe] = None
+
+def get_cache_secoes() -> CacheSecoesNFe:
+    """
+    Retorna o cache de seções de NF-e do worker.
+    """
+    global _cache_secoes
+    if _cache_secoes is None:
+        _cache_secoes = CacheSecoesNFe('nfe_xml.cache', config.NFE_XML_CACHE_MAX_ITENS)
+    return _cache_secoes
+
+async def _extrair_no_pool(xml: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        return await offload.executar(extrair_secoes_em_processo, xml)
+    except Exception as e:
+        print(f"[Offload] Falha ao analisar XML da NF-e no pool, analisando no processo: {e}")
+        return extrair_secoes_em_processo(xml)
+
+async def extrair_secao(info: strawberry.Info, chave_acesso: Optional[str], xml: Optional[str], secao: str) -> Any:
+    """
+    Valor de uma seção do XML da NF-e (emitente, destinatario, totais,
+    itens ou protocolo). O XML é analisado no máximo uma vez por
+    requisição (a árvore fica no contexto) e cada seção extraída fica em
+    cache entre requisições, por token (hash) e hash SHA-256 do XML.
+    XMLs a partir de OFFLOAD_TAMANHO_MINIMO bytes são analisados no pool
+    de processos, que já devolve todas as seções.
+    """
+    if not xml:
+        return None
+
+    conteudo = xml.encode('utf-8')
+    # Conteúdo (não só a chave de acesso) e token na chave: documentos
+    # diferentes nunca se confundem e um tenant não lê o cache de outro
+    request = info.context.get("request")
+    token = request.headers.get("X-Auth-Token") if request is not None else None
+    chave = (hash_token(token), chave_acesso, hashlib.sha256(conteudo).hexdigest()) if token else None
+    secoes = get_cache_secoes().secoes(chave) if chave is not None else {}
+    if secao in secoes:
+        metrics.incrementar('nfe_xml.cache.hits')
+        return secoes[secao]
+    metrics.incrementar('nfe_xml.cache.misses')
+
+    arvores: Dict = info.context.setdefault("nfe_xml", {})
+    chave_arvore = chave if chave is not None else id(xml)
+
+    if offload.habilitado(len(conteudo)):
+        # Uma única tarefa no pool por NF-e na requisição, compartilhada pelas seções
+        if chave_arvore not in arvores:
+            arvores[chave_arvore] = asyncio.ensure_future(_extrair_no_pool(conteudo))
+        valores = await arvores[chave_arvore]
+        if valores is None:
+            secoes[secao] = None
+        else:
+            for nome, valor in valores.items():
+                secoes.setdefault(nome, _construir(nome, valor))
+        return secoes[secao]
+
+    if chave_arvore not in arvores:
+        arvores[chave_arvore] = _analisar(conteudo)
+    raiz = arvores[chave_arvore]
+
+    valor = _construir(secao, _extrair_valores(raiz, secao)) if raiz is not None else None
+    secoes[secao] = valor
+    return valor
@@ -0,0 +1,73 @@
+# src/offload.py
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+from . import config, metrics
+
+# Pool de processos para o trabalho de CPU pesado (decodificar respostas
+# SOAP grandes, analisar XML de NF-e), que em Python puro segura o GIL e
+# travaria as outras requisições do worker. Os payloads vão como bytes
+# crus; de volta vêm só dicts/listas simples.
+_executor: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+# Tarefas enviadas ao pool e ainda não concluídas (na fila ou executando)
+_pendentes = 0
+
+def habilitado(tamanho: int) -> bool:
+    """
+    Se um payload com 'tamanho' bytes deve ir para o pool de processos.
+    """
+    return config.OFFLOAD_PROCESSOS > 0 and tamanho >= config.OFFLOAD_TAMANHO_MINIMO
+
+def profundidade_fila() -> int:
+    """
+    Tarefas aguardando ou em execução no pool de processos.
+    """
+    return _pendentes
+
+def _obter_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            print(f"[Offload] Iniciando pool com {config.OFFLOAD_PROCESSOS} processo(s)")
+            # spawn: o worker tem threads e event loop, que não sobrevivem bem a um fork
+            _executor = ProcessPoolExecutor(
+                max_workers=config.OFFLOAD_PROCESSOS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            metrics.definir('offload.processos', config.OFFLOAD_PROCESSOS)
+        return _executor
+
+async def executar(funcao: Callable[..., Any], *argumentos: Any) -> Any:
+    """
+    Executa funcao(*argumentos) num processo do pool. A função deve ser
+    de nível de módulo e os argumentos/retorno, serializáveis (bytes, str,
+    dicts e listas simples).
+    """
+    global _pendentes
+    _pendentes += 1
+    metrics.definir('offload.fila', _pendentes)
+    metrics.incrementar('offload.tarefas')
+    inicio = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_obter_executor(), funcao, *argumentos)
+    except Exception:
+        metrics.incrementar('offload.erros')
+        raise
+    finally:
+        _pendentes -= 1
+        metrics.definir('offload.fila', _pendentes)
+        metrics.registrar_amostra('offload.duracao_ms', (time.perf_counter() - inicio) * 1000)
+
+def fechar() -> None:
+    """
+    Encerra o pool (chamado no shutdown da aplicação).
+    """
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,188 @@
+# src/query_cost.py
+import math
+from typing import Any, Dict, Iterable, Optional, Tuple
+from graphql import (
+    ExecutionResult, FieldNode, FragmentDefinitionNode, FragmentSpreadNode, GraphQLError, GraphQLList,
+    GraphQLObjectType, InlineFragmentNode, OperationDefinitionNode,
+    get_named_type, get_nullable_type,
+)
+from graphql.utilities import value_from_ast_untyped
+from strawberry.extensions import SchemaExtension
+from . import config, metrics
+from .selection import _incluido
+
+# Custo estimado de uma consulta GraphQL, calculado antes da execução:
+# cada campo custa o número de objetos em que aparece (multiplicadores das
+# listas) e cada chamada prevista ao SGT custa CUSTO_POR_CHAMADA_UPSTREAM.
+# Aliases contam separadamente: dez aliases de buscarCarga montam dez árvores.
+
+# Objetos estimados por lista, quando o tamanho não vem dos argumentos
+_MULTIPLICADORES = {
+    'Carregamento.pedidos': lambda: config.CUSTO_PEDIDOS_POR_CARGA,
+    'Pedido.itensPedido': lambda: config.CUSTO_ITENS_POR_PEDIDO,
+    'Carregamento.notasFiscais': lambda: config.CUSTO_NFE_POR_CARGA,
+    'Pedido.notasFiscais': lambda: max(1, config.CUSTO_NFE_POR_CARGA // max(1, config.CUSTO_PEDIDOS_POR_CARGA)),
+    'NotaFiscalDetalhe.itens': lambda: config.CUSTO_ITENS_POR_NFE,
+}
+
+# Campos aninhados que usam as NF-e da carga (buscadas uma vez por carga)
+_CAMPOS_INDICE_NFE = frozenset({'Carregamento.notasFiscais', 'Pedido.notasFiscais'})
+
+def _paginas_nfe(tamanho_pagina: int) -> int:
+    # Páginas para CUSTO_NFE_POR_CARGA notas, até o máximo da paginação automática
+    return min(config.NFE_PAGINACAO_MAX_PAGINAS, max(1, math.ceil(config.CUSTO_NFE_POR_CARGA / max(1, tamanho_pagina))))
+
+def _raiz(campo: str, argumentos: Dict[str, Any]) -> Tuple[int, int]:
+    """
+    (objetos na lista, chamadas ao SGT) de um campo raiz da Query.
+    """
+    if campo == 'buscarCargas':
+        n = len(set(argumentos.get('protocolos') or ()))
+        return n, n
+    if campo == 'buscarNotasFiscaisPorChaves':
+        n = len(set(argumentos.get('chavesNFe') or ()))
+        return n, n
+    if campo == 'buscarNotasFiscaisVinculadas':
+        limite = argumentos.get('limite') or 100
+        if argumentos.get('todas'):
+            return max(limite, config.CUSTO_NFE_POR_CARGA), _paginas_nfe(limite)
+        return limite, 1
+    return 1, 1
+
+class _Estimativa:
+    def __init__(self, schema, fragmentos: Dict[str, Any], variaveis: Dict[str, Any]):
+        self.schema = schema
+        self.fragmentos = fragmentos
+        self.variaveis = variaveis
+
+    def _campos(self, selecoes: Iterable[Any]) -> Iterable[FieldNode]:
+        # Campos do nível, com fragmentos expandidos e @skip/@include aplicados
+        for node in selecoes:
+            if not _incluido(node, self.variaveis):
+                continue
+            if isinstance(node, FieldNode):
+                yield node
+            elif isinstance(node, InlineFragmentNode):
+                yield from self._campos(node.selection_set.selections)
+            elif isinstance(node, FragmentSpreadNode):
+                fragmento = self.fragmentos.get(node.name.value)
+                if fragmento is not None:
+                    yield from self._campos(fragmento.selection_set.selections)
+
+    def _argumentos(self, node: FieldNode, definicao) -> Dict[str, Any]:
+        argumentos = {nome: arg.default_value for nome, arg in definicao.args.items()}
+        for argumento in node.arguments or ():
+            argumentos[argumento.name.value] = value_from_ast_untyped(argumento.value, self.variaveis)
+        return argumentos
+
+    def custo(self, tipo: GraphQLObjectType, selecoes: Iterable[Any], quantidade: int) -> Tuple[int, bool]:
+        """
+        Custo dos campos selecionados em 'quantidade' objetos do tipo, e se
+        algum deles usa as NF-e da carga.
+        """
+        total, usa_indice = 0, False
+        for node in self._campos(selecoes):
+            nome = node.name.value
+            definicao = tipo.fields.get(nome)
+            if nome.startswith('__') or definicao is None:
+                continue
+            chave = f'{tipo.name}.{nome}'
+            usa_indice = usa_indice or chave in _CAMPOS_INDICE_NFE
+            objetos = quantidade
+            if isinstance(get_nullable_type(definicao.type), GraphQLList):
+                objetos *= _MULTIPLICADORES.get(chave, lambda: 1)()
+            total += objetos
+            subtipo = get_named_type(definicao.type)
+            if node.selection_set and isinstance(subtipo, GraphQLObjectType):
+                subtotal, sub_indice = self.custo(subtipo, node.selection_set.selections, objetos)
+                total += subtotal
+                usa_indice = usa_indice or sub_indice
+        return total, usa_indice
+
+    def raiz(self, operacao: OperationDefinitionNode) -> Dict[str, Dict[str, int]]:
+        """
+        Custo e chamadas ao SGT de cada campo raiz (pela chave na resposta).
+        """
+        tipo = self.schema.query_type
+        por_campo: Dict[str, Dict[str, int]] = {}
+        for node in self._campos(operacao.selection_set.selections):
+            nome = node.name.value
+            definicao = tipo.fields.get(nome)
+            if nome.startswith('__') or definicao is None:
+                continue
+            objetos, chamadas = _raiz(nome, self._argumentos(node, definicao))
+            custo = objetos
+            if node.selection_set:
+                subtotal, usa_indice = self.custo(get_named_type(definicao.type), node.selection_set.selections, objetos)
+                custo += subtotal
+                if usa_indice:
+                    # Uma busca das NF-e (todas as páginas) por carga retornada
+                    cargas = objetos if nome == 'buscarCargas' else 1
+                    chamadas += cargas * _paginas_nfe(config.NFE_INDICE_TAMANHO_PAGINA)
+            custo += chamadas * config.CUSTO_POR_CHAMADA_UPSTREAM
+            resposta = node.alias.value if node.alias else nome
+            anterior = por_campo.get(resposta, {'custo': 0, 'chamadasUpstream': 0})
+            por_campo[resposta] = {
+                'custo': anterior['custo'] + custo,
+                'chamadasUpstream': anterior['chamadasUpstream'] + chamadas,
+            }
+        return por_campo
+
+def _operacao(documento, nome: Optional[str]) -> Optional[OperationDefinitionNode]:
+    operacoes = [d for d in documento.definitions if isinstance(d, OperationDefinitionNode)]
+    if nome:
+        return next((o for o in operacoes if o.name and o.name.value == nome), None)
+    return operacoes[0] if len(operacoes) == 1 else None
+
+def estimar_consulta(schema, documento, nome_operacao: Optional[str],
+                     variaveis: Optional[Dict[str, Any]]) -> Optional[Dict[str, Dict[str, int]]]:
+    """
+    Custo e chamadas ao SGT de cada campo raiz da operação do documento
+    (pela chave na resposta), ou None se ela não for uma query.
+    """
+    operacao = _operacao(documento, nome_operacao)
+    if operacao is None or operacao.operation.value != 'query':
+        return None
+    fragmentos = {
+        d.name.value: d for d in documento.definitions
+        if isinstance(d, FragmentDefinitionNode)
+    }
+    return _Estimativa(schema, fragmentos, variaveis or {}).raiz(operacao)
+
+class LimiteCustoConsulta(SchemaExtension):
+    """
+    Estima o custo da consulta depois da validação e, se passar de
+    CUSTO_MAXIMO, a recusa sem executar. O custo calculado vai em
+    extensions.custo da resposta.
+    """
+
+    def __init__(self, *, execution_context=None):
+        self.execution_context = execution_context
+        self.resultado: Optional[Dict[str, Any]] = None
+
+    def on_execute(self):
+        contexto = self.execution_context
+        por_campo = estimar_consulta(
+            contexto.schema._schema, contexto.graphql_document, contexto.operation_name, contexto.variables
+        )
+        if por_campo is not None:
+            total = sum(c['custo'] for c in por_campo.values())
+            self.resultado = {
+                'total': total,
+                'maximo': config.CUSTO_MAXIMO,
+                'chamadasUpstream': sum(c['chamadasUpstream'] for c in por_campo.values()),
+                'camposRaiz': por_campo,
+            }
+            metrics.registrar_amostra('graphql.custo', total)
+
+            if config.CUSTO_MAXIMO and total > config.CUSTO_MAXIMO:
+                print(f"[Custo] Consulta recusada: custo estimado {total} (máximo {config.CUSTO_MAXIMO})")
+                metrics.incrementar('graphql.recusadas_custo')
+                contexto.result = ExecutionResult(data=None, errors=[GraphQLError(
+                    f"Consulta muito cara: custo estimado {total}, máximo {config.CUSTO_MAXIMO}. "
+                    "Selecione menos campos, use menos aliases ou divida a consulta."
+                )])
+        yield
+
+    def get_results(self) -> Dict[str, Any]:
+        return {'custo': self.resultado} if self.resultado is not None else {}
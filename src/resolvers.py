@@ -1,43 +1,96 @@
 # src/resolvers.py
+import asyncio
 import strawberry
-from typing import Optional, List
-from .models import Carregamento, DadosNotaFiscal, NotaFiscalDetalhe
-from .soap_client import chamar_buscar_carga, chamar_buscar_carga_por_codigos_integracao, chamar_buscar_notas_fiscais, chamar_buscar_nota_fiscal_por_chave
+from typing import Optional, List, AsyncIterator
+from .models import Carregamento, DadosNotaFiscal, NotaFiscalDetalhe, ResultadoNotaFiscalPorChave, ResultadoCarga
+from .soap_client import (
+    chamar_buscar_carga_async,
+    chamar_buscar_carga_por_codigos_integracao_async,
+    chamar_buscar_notas_fiscais_async,
+    chamar_buscar_todas_notas_fiscais_async,
+    iterar_paginas_notas_fiscais_async
+)
+from .loaders import NotaFiscalNaoEncontrada, obter_loader_nota_fiscal
 from .transformation import transformar_carga_integracao, transformar_nota_fiscal, transformar_nota_fiscal_detalhe
 from fastapi import HTTPException
+from . import config
+from .selection import Selecao, selecao_campos, campo_tem_diretiva
+from .routing import SERVICO_CARGAS, SERVICO_NFE, SERVICO_CTE, obter_destino
+
+def _tem_stream(info: strawberry.Info) -> bool:
+    """
+    Indica se o campo atual foi pedido com @stream (e 'if' não é falso).
+    Só é possível quando a execução incremental está habilitada no schema.
+    """
+    return campo_tem_diretiva(info, "stream")
+
+async def _stream_notas_fiscais(primeira_pagina: List[dict], paginas: AsyncIterator[Optional[List[dict]]], protocolo_carga: str, selecao: Selecao) -> AsyncIterator[DadosNotaFiscal]:
+    """
+    Entrega as NF-e transformadas página a página, enquanto as páginas
+    seguintes ainda estão sendo buscadas.
+    """
+    for nota in transformar_nota_fiscal(notas=primeira_pagina, protocolo_carga_str=protocolo_carga, selecao=selecao):
+        yield nota
+
+    async for pagina in paginas:
+        if pagina is None:
+            raise Exception("Falha ao buscar uma das páginas de NF-e no SGT.")
+        for nota in transformar_nota_fiscal(notas=pagina, protocolo_carga_str=protocolo_carga, selecao=selecao):
+            yield nota
+
+async def _buscar_cargas_em_lote(protocolos: List[str], wsdl_url: str, token: str, concorrencia: int, selecao: Optional[Selecao] = None) -> AsyncIterator[ResultadoCarga]:
+    """
+    Busca e transforma várias cargas com concorrência limitada,
+    entregando cada resultado assim que fica pronto (ordem de conclusão).
+    """
+    semaforo = asyncio.Semaphore(concorrencia)
+
+    async def _buscar_uma(protocolo: str) -> ResultadoCarga:
+        try:
+            async with semaforo:
+                raw_data = await chamar_buscar_carga_async(
+                    protocolo_str=protocolo,
+                    wsdl_url=wsdl_url,
+                    token=token
+                )
+            if not raw_data:
+                return ResultadoCarga(protocolo=protocolo, carga=None, erro="Carga não encontrada ou erro na consulta ao SGT.")
+
+            carga = transformar_carga_integracao(raw_data, selecao)
+            if not carga:
+                return ResultadoCarga(protocolo=protocolo, carga=None, erro="Falha na transformação dos dados.")
+            return ResultadoCarga(protocolo=protocolo, carga=carga, erro=None)
+
+        except Exception as e:
+            print(f"[Query] Erro ao buscar carga {protocolo}: {e}")
+            return ResultadoCarga(protocolo=protocolo, carga=None, erro=str(e))
+
+    tarefas = [asyncio.ensure_future(_buscar_uma(p)) for p in protocolos]
+    try:
+        for proxima in asyncio.as_completed(tarefas):
+            yield await proxima
+    finally:
+        # Se o cliente desistir no meio, não deixa chamadas órfãs rodando
+        for tarefa in tarefas:
+            tarefa.cancel()
 
 @strawberry.type
 class Query:
 
     @strawberry.field
-    def buscarCarga(self, protocolo: str, info: strawberry.Info) -> Optional[Carregamento]:
+    async def buscarCarga(self, protocolo: str, info: strawberry.Info) -> Optional[Carregamento]:
         """
         Busca dados de uma carga no webservice SOAP (endpoint e token
         via headers) e os transforma para um formato aninhado.
         """
 
-        # 1. Acessar o contexto para ler a requisição (e os headers)
-        # Isso só funciona por causa do 'context_getter' no main.py
-        request = info.context.get("request")
-        if not request:
-            raise HTTPException(status_code=500, detail="Contexto da requisição não encontrado.")
-
-        # 2. Ler os headers dinâmicos
-        target_wsdl_url = request.headers.get("X-Target-WSDL")
-        target_token = request.headers.get("X-Auth-Token")
-
-        # 3. Validar os headers
-        if not target_wsdl_url or not target_token:
-            print("Erro: Headers X-Target-WSDL ou X-Auth-Token não fornecidos.")
-            raise HTTPException(
-                status_code=400,
-                detail="Headers X-Target-WSDL e X-Auth-Token são obrigatórios."
-            )
+        # 1-3. Resolver o WSDL do serviço e o token a partir dos headers
+        target_wsdl_url, target_token = obter_destino(info, SERVICO_CARGAS)
 
         print(f"[Query] buscando protocolo {protocolo} em {target_wsdl_url}")
 
         # 4. Chamar o cliente SOAP
-        raw_data = chamar_buscar_carga(
+        raw_data = await chamar_buscar_carga_async(
             protocolo_str=protocolo,
             wsdl_url=target_wsdl_url,
             token=target_token
@@ -50,7 +103,7 @@ class Query:
         print(f"[Query] Recebidos {len(raw_data)} registros do SOAP. Transformando...")
 
         # 5. Chamar a função de transformação
-        carregamento_transformado = transformar_carga_integracao(raw_data)
+        carregamento_transformado = transformar_carga_integracao(raw_data, selecao=selecao_campos(info))
 
         if not carregamento_transformado:
              print("Falha na transformação dos dados.")
@@ -58,33 +111,19 @@ class Query:
         return carregamento_transformado
 
     @strawberry.field
-    def buscarCargaPorCodigosIntegracao(self, codigoFilial: str, numeroCarga: str, info: strawberry.Info) -> Optional[Carregamento]:
+    async def buscarCargaPorCodigosIntegracao(self, codigoFilial: str, numeroCarga: str, info: strawberry.Info) -> Optional[Carregamento]:
         """
         Busca dados de uma carga por código de filial e número da carga.
         Retorna o mesmo formato do buscarCarga.
         """
 
-        # 1. Acessar o contexto para ler a requisição (e os headers)
-        request = info.context.get("request")
-        if not request:
-            raise HTTPException(status_code=500, detail="Contexto da requisição não encontrado.")
-
-        # 2. Ler os headers dinâmicos
-        target_wsdl_url = request.headers.get("X-Target-WSDL")
-        target_token = request.headers.get("X-Auth-Token")
-
-        # 3. Validar os headers
-        if not target_wsdl_url or not target_token:
-            print("Erro: Headers X-Target-WSDL ou X-Auth-Token não fornecidos.")
-            raise HTTPException(
-                status_code=400,
-                detail="Headers X-Target-WSDL e X-Auth-Token são obrigatórios."
-            )
+        # 1-3. Resolver o WSDL do serviço e o token a partir dos headers
+        target_wsdl_url, target_token = obter_destino(info, SERVICO_CARGAS)
 
         print(f"[Query] buscando carga com filial {codigoFilial} e número {numeroCarga} em {target_wsdl_url}")
 
         # 4. Chamar o cliente SOAP
-        raw_data = chamar_buscar_carga_por_codigos_integracao(
+        raw_data = await chamar_buscar_carga_por_codigos_integracao_async(
             codigo_filial=codigoFilial,
             numero_carga=numeroCarga,
             wsdl_url=target_wsdl_url,
@@ -98,7 +137,7 @@ class Query:
         print(f"[Query] Recebidos {len(raw_data)} registros do SOAP. Transformando...")
 
         # 5. Chamar a função de transformação (mesma do buscarCarga)
-        carregamento_transformado = transformar_carga_integracao(raw_data)
+        carregamento_transformado = transformar_carga_integracao(raw_data, selecao=selecao_campos(info))
 
         if not carregamento_transformado:
              print("Falha na transformação dos dados.")
@@ -106,45 +145,57 @@ class Query:
         return carregamento_transformado
 
     @strawberry.field
-    def buscarNotasFiscaisVinculadas(
+    async def buscarNotasFiscaisVinculadas(
         self,
         protocoloCarga: str,
         info: strawberry.Info,
         inicio: Optional[int] = 0,
-        limite: Optional[int] = 100
+        limite: Optional[int] = 100,
+        todas: Optional[bool] = False
     ) -> Optional[List[DadosNotaFiscal]]:
         """
         Busca as Notas Fiscais vinculadas a um protocolo de carga.
         Usa o WSDL da NFe (endpoint e token via headers).
+        Com 'todas: true', a fachada percorre todas as páginas (de tamanho
+        'limite', ignorando 'inicio') e devolve uma lista única, que pode
+        ser recebida aos poucos com @stream.
         """
 
-        # 1. Acessar o contexto para ler a requisição (e os headers)
-        request = info.context.get("request")
-        if not request:
-            raise HTTPException(status_code=500, detail="Contexto da requisição não encontrado.")
-
-        # 2. Ler os headers dinâmicos
-        target_wsdl_url = request.headers.get("X-Target-WSDL")
-        target_token = request.headers.get("X-Auth-Token")
-
-        # 3. Validar os headers
-        if not target_wsdl_url or not target_token:
-            print("Erro: Headers X-Target-WSDL ou X-Auth-Token não fornecidos.")
-            raise HTTPException(
-                status_code=400,
-                detail="Headers X-Target-WSDL e X-Auth-Token são obrigatórios."
-            )
+        # 1-3. Resolver o WSDL do serviço e o token a partir dos headers
+        target_wsdl_url, target_token = obter_destino(info, SERVICO_NFE)
 
         print(f"[Query] buscando Notas Fiscais para protocolo {protocoloCarga} em {target_wsdl_url}")
 
-        # 4. Chamar o cliente SOAP (nova função)
-        raw_data = chamar_buscar_notas_fiscais(
-            protocolo_carga=protocoloCarga,
-            inicio=inicio,
-            limite=limite,
-            wsdl_url=target_wsdl_url,
-            token=target_token
-        )
+        # 4. Chamar o cliente SOAP (uma página ou todas)
+        if todas and _tem_stream(info):
+            # Com @stream, a primeira página é enviada enquanto as demais são buscadas
+            paginas = iterar_paginas_notas_fiscais_async(
+                protocolo_carga=protocoloCarga,
+                tamanho_pagina=limite or 100,
+                wsdl_url=target_wsdl_url,
+                token=target_token
+            )
+            primeira_pagina = await anext(paginas, None)
+            if primeira_pagina is None:
+                print("Nenhum dado retornado do SOAP (NFe).")
+                return None
+            return _stream_notas_fiscais(primeira_pagina, paginas, protocoloCarga, selecao_campos(info))
+
+        if todas:
+            raw_data = await chamar_buscar_todas_notas_fiscais_async(
+                protocolo_carga=protocoloCarga,
+                tamanho_pagina=limite or 100,
+                wsdl_url=target_wsdl_url,
+                token=target_token
+            )
+        else:
+            raw_data = await chamar_buscar_notas_fiscais_async(
+                protocolo_carga=protocoloCarga,
+                inicio=inicio,
+                limite=limite,
+                wsdl_url=target_wsdl_url,
+                token=target_token
+            )
 
         if raw_data is None:
             print("Nenhum dado retornado do SOAP (NFe).")
@@ -159,13 +210,14 @@ class Query:
         # 5. Chamar a função de transformação (nova função)
         notas_transformadas = transformar_nota_fiscal(
             notas=raw_data,
-            protocolo_carga_str=protocoloCarga
+            protocolo_carga_str=protocoloCarga,
+            selecao=selecao_campos(info)
         )
 
         return notas_transformadas
 
     @strawberry.field
-    def buscarNotaFiscalPorChave(
+    async def buscarNotaFiscalPorChave(
         self,
         chaveNFe: str,
         info: strawberry.Info
@@ -175,31 +227,17 @@ class Query:
         Usa o WSDL do CTe (endpoint e token via headers).
         """
 
-        # 1. Acessar o contexto para ler a requisição (e os headers)
-        request = info.context.get("request")
-        if not request:
-            raise HTTPException(status_code=500, detail="Contexto da requisição não encontrado.")
-
-        # 2. Ler os headers dinâmicos
-        target_wsdl_url = request.headers.get("X-Target-WSDL")
-        target_token = request.headers.get("X-Auth-Token")
-
-        # 3. Validar os headers
-        if not target_wsdl_url or not target_token:
-            print("Erro: Headers X-Target-WSDL ou X-Auth-Token não fornecidos.")
-            raise HTTPException(
-                status_code=400,
-                detail="Headers X-Target-WSDL e X-Auth-Token são obrigatórios."
-            )
+        # 1-3. Resolver o WSDL do serviço e o token a partir dos headers
+        target_wsdl_url, target_token = obter_destino(info, SERVICO_CTE)
 
         print(f"[Query] buscando Detalhe da NF-e {chaveNFe} em {target_wsdl_url}")
 
-        # 4. Chamar o cliente SOAP (nova função)
-        raw_data = chamar_buscar_nota_fiscal_por_chave(
-            chave_nfe=chaveNFe,
-            wsdl_url=target_wsdl_url,
-            token=target_token
-        )
+        # 4. Chamar o cliente SOAP via DataLoader da requisição
+        # (aliases com a mesma chave compartilham a mesma chamada)
+        try:
+            raw_data = await obter_loader_nota_fiscal(info, target_wsdl_url, target_token).load(chaveNFe)
+        except NotaFiscalNaoEncontrada:
+            raw_data = None
 
         if raw_data is None:
             print("Nenhum dado retornado do SOAP (CTe.BuscarNotaFiscal).")
@@ -213,3 +251,82 @@ class Query:
         )
 
         return nota_transformada
+
+    @strawberry.field
+    async def buscarNotasFiscaisPorChaves(
+        self,
+        chavesNFe: List[str],
+        info: strawberry.Info
+    ) -> List[ResultadoNotaFiscalPorChave]:
+        """
+        Busca o XML de várias Notas Fiscais pelas chaves, em lote.
+        Chaves repetidas são consultadas uma única vez e as chamadas ao
+        SGT rodam com concorrência limitada. Cada chave tem seu próprio
+        resultado ou erro, sem falhar o lote inteiro.
+        Usa o WSDL do CTe (endpoint e token via headers).
+        """
+
+        # 1-3. Resolver o WSDL do serviço e o token a partir dos headers
+        target_wsdl_url, target_token = obter_destino(info, SERVICO_CTE)
+
+        print(f"[Query] buscando {len(chavesNFe)} NF-e(s) por chave em {target_wsdl_url}")
+
+        # 4. Carregar todas as chaves pelo DataLoader (erros por chave)
+        loader = obter_loader_nota_fiscal(info, target_wsdl_url, target_token)
+        resultados = await asyncio.gather(
+            *[loader.load(chave) for chave in chavesNFe],
+            return_exceptions=True
+        )
+
+        # 5. Transformar cada resultado individualmente
+        saida = []
+        for chave, resultado in zip(chavesNFe, resultados):
+            if isinstance(resultado, Exception):
+                saida.append(ResultadoNotaFiscalPorChave(chaveNFe=chave, nota=None, erro=str(resultado)))
+                continue
+
+            nota = transformar_nota_fiscal_detalhe(nota=resultado)
+            erro = None if nota else "Falha na transformação dos dados da NF-e."
+            saida.append(ResultadoNotaFiscalPorChave(chaveNFe=chave, nota=nota, erro=erro))
+
+        return saida
+
+    @strawberry.field
+    async def buscarCargas(
+        self,
+        protocolos: List[str],
+        info: strawberry.Info,
+        concorrencia: Optional[int] = None
+    ) -> List[ResultadoCarga]:
+        """
+        Busca várias cargas de uma vez, com chamadas ao SGT em paralelo
+        (limitadas por 'concorrencia', até BULK_MAX_CONCORRENCIA).
+        Protocolos repetidos são consultados uma única vez. Os resultados
+        vêm na ordem em que ficam prontos, cada um com sua carga ou erro.
+        Com @stream, cada resultado é enviado assim que fica pronto.
+        """
+
+        # 1-3. Resolver o WSDL do serviço e o token a partir dos headers
+        target_wsdl_url, target_token = obter_destino(info, SERVICO_CARGAS)
+
+        # Deduplica preservando a ordem de chegada
+        protocolos_unicos = list(dict.fromkeys(protocolos))
+        if len(protocolos_unicos) > config.BULK_MAX_ITENS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Máximo de {config.BULK_MAX_ITENS} protocolos por consulta."
+            )
+
+        limite = min(concorrencia or config.BULK_MAX_CONCORRENCIA, config.BULK_MAX_CONCORRENCIA)
+        limite = max(limite, 1)
+
+        print(f"[Query] buscando {len(protocolos_unicos)} cargas (concorrência {limite}) em {target_wsdl_url}")
+
+        # 4-5. Buscar e transformar em paralelo
+        selecao_carga = selecao_campos(info).get("carga", {})
+        resultados = _buscar_cargas_em_lote(protocolos_unicos, target_wsdl_url, target_token, limite, selecao_carga)
+
+        # Com @stream, cada carga é enviada ao cliente assim que fica pronta
+        if _tem_stream(info):
+            return resultados
+        return [resultado async for resultado in resultados]
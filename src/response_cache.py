@@ -0,0 +1,232 @@
+# src/response_cache.py
+import asyncio
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+from . import config
+from . import metrics
+
+def estimar_tamanho(valor: Any) -> int:
+    """
+    Estima (em bytes) o tamanho de uma resposta serializada (dicts/listas/escalares).
+    """
+    tamanho = sys.getsizeof(valor)
+    if isinstance(valor, dict):
+        for chave, item in valor.items():
+            tamanho += sys.getsizeof(chave) + estimar_tamanho(item)
+    elif isinstance(valor, (list, tuple)):
+        for item in valor:
+            tamanho += estimar_tamanho(item)
+    return tamanho
+
+class _Entrada:
+    __slots__ = ('valor', 'tamanho', 'gravado_em', 'ttl')
+
+    def __init__(self, valor: Any, tamanho: int, ttl: float):
+        self.valor = valor
+        self.tamanho = tamanho
+        self.gravado_em = time.monotonic()
+        self.ttl = ttl
+
+class CacheRespostas:
+    """
+    Cache de respostas SOAP com TTL por operação, limite de memória com
+    despejo LRU e stale-while-revalidate.
+
+    Uma entrada com idade até o TTL é servida diretamente. Entre o TTL e
+    TTL + janela_obsoleta ela ainda é servida, mas dispara uma revalidação
+    em segundo plano. Depois disso é tratada como ausente.
+    As chaves já incluem o hash do token (ver coalescing.chave_chamada),
+    então tenants diferentes nunca compartilham entradas.
+    """
+
+    def __init__(self, nome: str, ttl_por_operacao: Dict[str, float], janela_obsoleta: float, max_bytes: int):
+        self.nome = nome
+        self.ttl_por_operacao = ttl_por_operacao
+        self.janela_obsoleta = janela_obsoleta
+        self.max_bytes = max_bytes
+        self._itens: "OrderedDict[Hashable, _Entrada]" = OrderedDict()
+        self._bytes = 0
+        self._revalidando: Set[Hashable] = set()
+        self._tarefas: Set[asyncio.Task] = set()
+
+    def _remover(self, chave: Hashable) -> None:
+        entrada = self._itens.pop(chave, None)
+        if entrada is not None:
+            self._bytes -= entrada.tamanho
+
+    def _gravar(self, chave: Hashable, valor: Any, ttl: float) -> None:
+        tamanho = estimar_tamanho(valor)
+        if tamanho > self.max_bytes:
+            # Resposta maior que o cache inteiro: não vale a pena guardar
+            return
+
+        self._remover(chave)
+        self._itens[chave] = _Entrada(valor, tamanho, ttl)
+        self._bytes += tamanho
+
+        # Despejo LRU até caber no limite de memória
+        while self._bytes > self.max_bytes and self._itens:
+            chave_antiga, _ = next(iter(self._itens.items()))
+            self._remover(chave_antiga)
+            metrics.incrementar(f'{self.nome}.despejos')
+
+        metrics.definir(f'{self.nome}.bytes', self._bytes)
+        metrics.definir(f'{self.nome}.itens', len(self._itens))
+
+    def limpar(self) -> None:
+        """
+        Remove todas as entradas.
+        """
+        self._itens.clear()
+        self._bytes = 0
+        metrics.definir(f'{self.nome}.bytes', 0)
+        metrics.definir(f'{self.nome}.itens', 0)
+
+    def obter_ultima(self, chave: Hashable) -> Any:
+        """
+        Última resposta gravada para a chave, mesmo que já expirada
+        (None se não houver). Usada quando o upstream está fora do ar.
+        """
+        entrada = self._itens.get(chave)
+        if entrada is None:
+            return None
+        metrics.incrementar(f'{self.nome}.hits_upstream_indisponivel')
+        return entrada.valor
+
+    async def _revalidar(self, chave: Hashable, ttl: float, fabrica: Callable[[], Awaitable[Any]]) -> None:
+        try:
+            valor = await fabrica()
+            if valor is not None:
+                self._gravar(chave, valor, ttl)
+                metrics.incrementar(f'{self.nome}.revalidacoes')
+        except Exception as e:
+            print(f"[Cache] Falha ao revalidar entrada em segundo plano: {e}")
+        finally:
+            self._revalidando.discard(chave)
+
+    async def consultar(self, operacao: str, chave: Hashable, fabrica: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Retorna a resposta cacheada para a chave ou executa fabrica() e grava o resultado.
+        Respostas None (erro / não encontrado) não são gravadas aqui.
+        """
+        ttl = self.ttl_por_operacao.get(operacao, 0)
+        if ttl <= 0:
+            return await fabrica()
+
+        entrada = self._itens.get(chave)
+        if entrada is not None:
+            idade = time.monotonic() - entrada.gravado_em
+            if idade <= entrada.ttl:
+                self._itens.move_to_end(chave)
+                metrics.incrementar(f'{self.nome}.hits')
+                return entrada.valor
+
+            if idade <= entrada.ttl + self.janela_obsoleta:
+                self._itens.move_to_end(chave)
+                metrics.incrementar(f'{self.nome}.hits_obsoletos')
+                if chave not in self._revalidando:
+                    self._revalidando.add(chave)
+                    tarefa = asyncio.ensure_future(self._revalidar(chave, ttl, fabrica))
+                    self._tarefas.add(tarefa)
+                    tarefa.add_done_callback(self._tarefas.discard)
+                return entrada.valor
+
+            self._remover(chave)
+
+        metrics.incrementar(f'{self.nome}.misses')
+        valor = await fabrica()
+        if valor is not None:
+            self._gravar(chave, valor, ttl)
+        return valor
+
+@dataclass(frozen=True)
+class RespostaNegativa:
+    """
+    Resposta upstream de "não encontrado": CodigoMensagem != 0 ou Objeto vazio.
+    """
+    codigo: Optional[int]
+    mensagem: Optional[str]
+
+class CacheNegativo:
+    """
+    Cache de curta duração para respostas negativas, por operação e argumentos.
+    Evita repetir no SGT chamadas que falham sempre da mesma forma
+    (protocolos ou chaves inválidos consultados em loop).
+    """
+
+    def __init__(self, nome: str, ttl: float, max_itens: int):
+        self.nome = nome
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self._itens: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def obter(self, chave: Hashable) -> Optional[RespostaNegativa]:
+        """
+        Retorna a resposta negativa cacheada para a chave, se ainda válida.
+        """
+        if self.ttl <= 0:
+            return None
+        item = self._itens.get(chave)
+        if item is None:
+            return None
+        resposta, gravado_em = item
+        if time.monotonic() - gravado_em > self.ttl:
+            del self._itens[chave]
+            return None
+        metrics.incrementar(f'{self.nome}.hits')
+        return resposta
+
+    def gravar(self, chave: Hashable, resposta: RespostaNegativa) -> None:
+        """
+        Grava uma resposta negativa, despejando as mais antigas acima do limite.
+        """
+        if self.ttl <= 0:
+            return
+        self._itens.pop(chave, None)
+        self._itens[chave] = (resposta, time.monotonic())
+        while len(self._itens) > self.max_itens:
+            self._itens.popitem(last=False)
+            metrics.incrementar(f'{self.nome}.despejos')
+        metrics.incrementar(f'{self.nome}.gravacoes')
+        metrics.definir(f'{self.nome}.itens', len(self._itens))
+
+    def limpar(self) -> None:
+        """
+        Remove todas as entradas.
+        """
+        self._itens.clear()
+        metrics.definir(f'{self.nome}.itens', 0)
+
+_cache_respostas: Optional[CacheRespostas] = None
+_cache_negativo: Optional[CacheNegativo] = None
+
+def get_response_cache() -> CacheRespostas:
+    """
+    Retorna o cache de respostas do worker, configurado a partir do config.
+    """
+    global _cache_respostas
+    if _cache_respostas is None:
+        ttls = config.RESPONSE_CACHE_TTL_POR_OPERACAO if config.RESPONSE_CACHE_HABILITADO else {}
+        _cache_respostas = CacheRespostas(
+            nome='response_cache',
+            ttl_por_operacao=ttls,
+            janela_obsoleta=config.RESPONSE_CACHE_JANELA_OBSOLETA,
+            max_bytes=config.RESPONSE_CACHE_MAX_MB * 1024 * 1024
+        )
+    return _cache_respostas
+
+def get_negative_cache() -> CacheNegativo:
+    """
+    Retorna o cache negativo do worker, configurado a partir do config.
+    """
+    global _cache_negativo
+    if _cache_negativo is None:
+        _cache_negativo = CacheNegativo(
+            nome='negative_cache',
+            ttl=config.NEGATIVE_CACHE_TTL if config.NEGATIVE_CACHE_HABILITADO else 0,
+            max_itens=config.NEGATIVE_CACHE_MAX_ITENS
+        )
+    return _cache_negativo
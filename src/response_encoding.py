@@ -0,0 +1,153 @@
+# src/response_encoding.py
+import gzip
+import json
+from typing import Any, Dict, List, Optional, Union
+from starlette.responses import Response
+from strawberry.fastapi import GraphQLRouter
+from . import config, metrics
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def codificador_json() -> str:
+    """
+    Nome do codificador JSON em uso ('orjson' ou 'json').
+    """
+    return 'orjson' if orjson is not None and config.RESPOSTA_JSON_RAPIDO else 'json'
+
+def codificar_json(dados: Any) -> bytes:
+    """
+    Serializa o resultado GraphQL direto em bytes UTF-8: com orjson quando
+    instalado (extra 'resposta'), senão com o json da biblioteca padrão.
+    """
+    if orjson is not None and config.RESPOSTA_JSON_RAPIDO:
+        return orjson.dumps(dados)
+    return json.dumps(dados, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+class GraphQLRouterRapido(GraphQLRouter):
+    """
+    GraphQLRouter que entrega o JSON já em bytes (sem passar por str),
+    usando codificar_json.
+    """
+
+    def encode_json(self, data: object) -> str:
+        # Usado pelo Strawberry nas partes multipart de @defer/@stream
+        return codificar_json(data).decode('utf-8')
+
+    def create_response(self, response_data: Union[Dict, List[Dict]], sub_response: Response) -> Response:
+        response = Response(
+            codificar_json(response_data),
+            media_type="application/json",
+            status_code=sub_response.status_code or 200,
+        )
+        response.headers.raw.extend(sub_response.headers.raw)
+        return response
+
+def _aceitas(accept_encoding: str) -> Dict[str, float]:
+    # 'br;q=1.0, gzip;q=0.8, *;q=0.1' -> {'br': 1.0, 'gzip': 0.8, '*': 0.1}
+    codificacoes = {}
+    for item in accept_encoding.split(','):
+        nome, _, parametros = item.strip().partition(';')
+        q = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith('q='):
+            try:
+                q = float(parametros[2:])
+            except ValueError:
+                q = 0.0
+        if nome:
+            codificacoes[nome.strip().lower()] = q
+    return codificacoes
+
+def escolher_codificacao(accept_encoding: str) -> Optional[str]:
+    """
+    Codificação de conteúdo a usar ('br', 'gzip' ou None), conforme o
+    Accept-Encoding do cliente. Brotli só se o pacote estiver instalado.
+    """
+    aceitas = _aceitas(accept_encoding)
+    for nome in ('br', 'gzip'):
+        if nome == 'br' and brotli is None:
+            continue
+        if aceitas.get(nome, aceitas.get('*', 0.0)) > 0:
+            return nome
+    return None
+
+def comprimir(conteudo: bytes, codificacao: str) -> bytes:
+    """
+    Comprime o corpo da resposta com a codificação escolhida.
+    """
+    if codificacao == 'br':
+        return brotli.compress(conteudo, quality=config.RESPOSTA_COMPRESSAO_QUALIDADE_BROTLI)
+    return gzip.compress(conteudo, compresslevel=config.RESPOSTA_COMPRESSAO_NIVEL_GZIP)
+
+class CompressaoMiddleware:
+    """
+    Middleware ASGI que comprime (brotli ou gzip) respostas JSON completas
+    a partir de RESPOSTA_COMPRESSAO_TAMANHO_MINIMO bytes. Respostas em
+    partes (multipart de @defer/@stream) passam sem alteração, para não
+    atrasar a entrega incremental.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ''
+        for nome, valor in scope.get('headers', []):
+            if nome == b'accept-encoding':
+                accept_encoding = valor.decode('latin-1')
+                break
+        codificacao = escolher_codificacao(accept_encoding)
+        if codificacao is None:
+            await self.app(scope, receive, send)
+            return
+
+        inicio: Dict[str, Any] = {}
+        repassando = False
+
+        async def _enviar(mensagem):
+            nonlocal repassando
+            if repassando:
+                await send(mensagem)
+                return
+            if mensagem['type'] == 'http.response.start':
+                # Segura o início até saber se o corpo vem inteiro
+                inicio.update(mensagem)
+                return
+
+            corpo = mensagem.get('body', b'')
+            cabecalhos = inicio.get('headers', [])
+            comprimivel = (
+                not mensagem.get('more_body', False)
+                and len(corpo) >= config.RESPOSTA_COMPRESSAO_TAMANHO_MINIMO
+                and any(n == b'content-type' and v.startswith(b'application/json') for n, v in cabecalhos)
+                and not any(n == b'content-encoding' for n, v in cabecalhos)
+            )
+            if comprimivel:
+                comprimido = comprimir(corpo, codificacao)
+                metrics.incrementar(f'resposta.compressao.{codificacao}')
+                metrics.incrementar('resposta.compressao.bytes_originais', len(corpo))
+                metrics.incrementar('resposta.compressao.bytes_enviados', len(comprimido))
+                inicio['headers'] = [(n, v) for n, v in cabecalhos if n != b'content-length'] + [
+                    (b'content-encoding', codificacao.encode('latin-1')),
+                    (b'content-length', str(len(comprimido)).encode('latin-1')),
+                    (b'vary', b'Accept-Encoding'),
+                ]
+                mensagem = dict(mensagem, body=comprimido)
+            else:
+                repassando = True
+            await send(inicio)
+            await send(mensagem)
+
+        await self.app(scope, receive, _enviar)
@@ -0,0 +1,81 @@
+# src/routing.py
+import re
+import strawberry
+from typing import Mapping, Optional, Tuple
+from fastapi import HTTPException
+from . import config
+
+# Serviços do SGT usados pela fachada
+SERVICO_CARGAS = "Cargas"
+SERVICO_NFE = "NFe"
+SERVICO_CTE = "CTe"
+SERVICOS = (SERVICO_CARGAS, SERVICO_NFE, SERVICO_CTE)
+
+# Segmento do serviço no caminho do WSDL (ex: .../Cargas.svc?wsdl)
+_PADRAO_SERVICO = re.compile(r'/(Cargas|NFe|CTe)\.svc', re.IGNORECASE)
+
+def _wsdl_da_base(base_url: str, servico: str) -> str:
+    return f"{base_url.rstrip('/')}/{servico}.svc?wsdl"
+
+def _derivar_de_wsdl(wsdl_url: str, servico: str) -> str:
+    """
+    Troca o serviço no caminho de um WSDL do SGT
+    (ex: .../Cargas.svc?wsdl -> .../NFe.svc?wsdl). WSDLs fora desse
+    padrão são usados como estão.
+    """
+    return _PADRAO_SERVICO.sub(f'/{servico}.svc', wsdl_url, count=1)
+
+def resolver_wsdl(servico: str, headers: Mapping[str, str]) -> Optional[str]:
+    """
+    Resolve o WSDL de um serviço para a requisição, nesta ordem:
+    1. Header X-Target-WSDL-<Servico> (ex: X-Target-WSDL-NFe)
+    2. Header X-SGT-Base-URL -> <base>/<Servico>.svc?wsdl
+    3. Header X-Target-WSDL, com o serviço trocado no caminho
+       (ex: um único header apontando para Cargas.svc atende NFe.svc)
+    4. Configuração: SGT_WSDL_<SERVICO> ou SGT_BASE_URL
+    Assim, campos raiz de serviços diferentes na mesma consulta vão
+    cada um para o seu serviço (e rodam em paralelo).
+    """
+    explicito = headers.get(f"X-Target-WSDL-{servico}")
+    if explicito:
+        return explicito
+
+    base_url = headers.get("X-SGT-Base-URL")
+    if base_url:
+        return _wsdl_da_base(base_url, servico)
+
+    wsdl_url = headers.get("X-Target-WSDL")
+    if wsdl_url:
+        return _derivar_de_wsdl(wsdl_url, servico)
+
+    if config.SGT_WSDL_POR_SERVICO.get(servico):
+        return config.SGT_WSDL_POR_SERVICO[servico]
+    if config.SGT_BASE_URL:
+        return _wsdl_da_base(config.SGT_BASE_URL, servico)
+    return None
+
+def obter_destino(info: strawberry.Info, servico: str) -> Tuple[str, str]:
+    """
+    Resolve o WSDL do serviço (ver resolver_wsdl) e lê o token
+    (X-Auth-Token) da requisição.
+    Isso só funciona por causa do 'context_getter' no main.py.
+    """
+    # 1. Acessar o contexto para ler a requisição (e os headers)
+    request = info.context.get("request")
+    if not request:
+        raise HTTPException(status_code=500, detail="Contexto da requisição não encontrado.")
+
+    # 2. Ler os headers dinâmicos (WSDL do serviço e token)
+    target_wsdl_url = resolver_wsdl(servico, request.headers)
+    target_token = request.headers.get("X-Auth-Token")
+
+    # 3. Validar os headers
+    if not target_wsdl_url or not target_token:
+        print(f"Erro: WSDL do serviço {servico} ou X-Auth-Token não fornecidos.")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Header X-Auth-Token e WSDL do serviço {servico} (X-Target-WSDL, "
+                   f"X-Target-WSDL-{servico} ou X-SGT-Base-URL) são obrigatórios."
+        )
+
+    return target_wsdl_url, target_token
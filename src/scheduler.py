@@ -0,0 +1,229 @@
+# src/scheduler.py
+import asyncio
+import contextvars
+import time
+from typing import Awaitable, Callable, Dict, List, Mapping, Optional, Tuple, TypeVar
+from . import config, metrics
+from .http_pool import chave_host, nome_metrica
+
+T = TypeVar('T')
+
+# Escalonador das chamadas ao SGT: limite de concorrência e fila por
+# token (hash) e por host upstream, com classes de prioridade atendidas
+# por weighted fair queuing. Consultas interativas (GraphiQL, operadores)
+# não ficam atrás dos jobs de conciliação em lote, e um único token não
+# consegue ocupar toda a capacidade do worker.
+
+INTERATIVA = 'interativa'
+NORMAL = 'normal'
+LOTE = 'lote'
+
+HEADER_PRIORIDADE = 'x-prioridade'
+# Prazo da requisição em ms (a partir da chegada)
+HEADER_PRAZO = 'x-prazo-ms'
+
+# Prioridade e prazo (time.monotonic) da requisição atual, definidos em main.get_context
+_prioridade_requisicao: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('prioridade_requisicao', default=None)
+_prazo_requisicao: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar('prazo_requisicao', default=None)
+
+class RejeitadaPeloEscalonador(Exception):
+    """
+    Chamada recusada antes de ir ao SGT (fila cheia ou prazo inalcançável).
+    """
+
+class FilaCheia(RejeitadaPeloEscalonador):
+    pass
+
+class PrazoExcedido(RejeitadaPeloEscalonador):
+    pass
+
+def definir_contexto(headers: Mapping[str, str]) -> None:
+    """
+    Lê X-Prioridade e X-Prazo-Ms da requisição HTTP e os associa às
+    chamadas upstream feitas durante ela.
+    """
+    prioridade = (headers.get(HEADER_PRIORIDADE) or '').strip().lower()
+    _prioridade_requisicao.set(prioridade if prioridade in config.ESCALONADOR_PESOS else None)
+
+    prazo = None
+    try:
+        prazo_ms = float(headers.get(HEADER_PRAZO) or 0)
+        if prazo_ms > 0:
+            prazo = time.monotonic() + prazo_ms / 1000
+    except ValueError:
+        pass
+    _prazo_requisicao.set(prazo)
+
+def prioridade_atual(operacao: str) -> str:
+    """
+    Prioridade da chamada: a do header da requisição, senão a configurada
+    para a operação, senão ESCALONADOR_PRIORIDADE_PADRAO.
+    """
+    return (
+        _prioridade_requisicao.get()
+        or config.ESCALONADOR_PRIORIDADE_POR_OPERACAO.get(operacao)
+        or config.ESCALONADOR_PRIORIDADE_PADRAO
+    )
+
+def prazo_atual() -> Optional[float]:
+    """
+    Prazo (time.monotonic) da requisição atual, se informado.
+    """
+    return _prazo_requisicao.get()
+
+def _rotulo_token(token_hash: str) -> str:
+    # Prefixo do hash do token, para métricas por tenant sem expor o token
+    return token_hash[:8]
+
+class _Pedido:
+    __slots__ = ('host', 'token', 'prioridade', 'etiqueta', 'chegada', 'futuro')
+
+    def __init__(self, host: str, token: str, prioridade: str, etiqueta: float):
+        self.host = host
+        self.token = token
+        self.prioridade = prioridade
+        # Tempo virtual de término (WFQ): menor é atendido primeiro
+        self.etiqueta = etiqueta
+        self.chegada = time.monotonic()
+        self.futuro: asyncio.Future = asyncio.get_running_loop().create_future()
+
+class Escalonador:
+    """
+    Concede vagas de execução respeitando os limites por token e por host.
+    Cada fluxo (prioridade, token) recebe etiquetas de término virtual
+    espaçadas por 1 / peso da prioridade; entre os pedidos na fila com
+    vaga disponível, sai o de menor etiqueta. Assim as classes dividem a
+    capacidade na proporção dos pesos e, dentro de cada classe, os tokens
+    se revezam.
+    """
+
+    def __init__(self):
+        self._fila: List[_Pedido] = []
+        self._tempo_virtual = 0.0
+        self._ultima_etiqueta: Dict[Tuple[str, str], float] = {}
+        self._em_execucao_host: Dict[str, int] = {}
+        self._em_execucao_token: Dict[str, int] = {}
+        self._fila_host: Dict[str, int] = {}
+        self._fila_token: Dict[str, int] = {}
+        # Duração média (s) das chamadas por host, para estimar a espera
+        self._duracao_media: Dict[str, float] = {}
+
+    def profundidade_fila(self) -> int:
+        return len(self._fila)
+
+    def em_execucao(self) -> int:
+        return sum(self._em_execucao_host.values())
+
+    def _tem_vaga(self, host: str, token: str) -> bool:
+        return (
+            self._em_execucao_host.get(host, 0) < config.ESCALONADOR_MAX_POR_HOST
+            and self._em_execucao_token.get(token, 0) < config.ESCALONADOR_MAX_POR_TOKEN
+        )
+
+    def _ocupar(self, host: str, token: str) -> None:
+        self._em_execucao_host[host] = self._em_execucao_host.get(host, 0) + 1
+        self._em_execucao_token[token] = self._em_execucao_token.get(token, 0) + 1
+        metrics.definir('escalonador.em_execucao', self.em_execucao())
+
+    def _liberar(self, host: str, token: str) -> None:
+        self._em_execucao_host[host] -= 1
+        self._em_execucao_token[token] -= 1
+        metrics.definir('escalonador.em_execucao', self.em_execucao())
+        self._despachar()
+
+    def _contar_fila(self, pedido: _Pedido, delta: int) -> None:
+        self._fila_host[pedido.host] = self._fila_host.get(pedido.host, 0) + delta
+        self._fila_token[pedido.token] = self._fila_token.get(pedido.token, 0) + delta
+        metrics.definir('escalonador.fila', len(self._fila))
+        metrics.definir(f'escalonador.fila_host.{nome_metrica(pedido.host)}', self._fila_host[pedido.host])
+        metrics.definir(f'escalonador.fila_token.{_rotulo_token(pedido.token)}', self._fila_token[pedido.token])
+
+    def _remover_da_fila(self, pedido: _Pedido) -> None:
+        self._fila.remove(pedido)
+        self._contar_fila(pedido, -1)
+
+    def _despachar(self) -> None:
+        # Concede vagas aos pedidos de menor etiqueta que tenham vaga no host e no token
+        while self._fila:
+            elegiveis = [p for p in self._fila if self._tem_vaga(p.host, p.token)]
+            if not elegiveis:
+                return
+            pedido = min(elegiveis, key=lambda p: p.etiqueta)
+            self._remover_da_fila(pedido)
+            self._tempo_virtual = max(self._tempo_virtual, pedido.etiqueta)
+            self._ocupar(pedido.host, pedido.token)
+            pedido.futuro.set_result(None)
+
+    def _estimar_espera(self, host: str, token: str) -> float:
+        # Chamadas à frente divididas pela concorrência disponível, vezes a duração média
+        duracao = self._duracao_media.get(host, config.ESCALONADOR_DURACAO_INICIAL)
+        por_host = self._fila_host.get(host, 0) / max(1, config.ESCALONADOR_MAX_POR_HOST)
+        por_token = self._fila_token.get(token, 0) / max(1, config.ESCALONADOR_MAX_POR_TOKEN)
+        return (max(por_host, por_token) + 1) * duracao if not self._tem_vaga(host, token) else 0.0
+
+    def _registrar_duracao(self, host: str, segundos: float) -> None:
+        anterior = self._duracao_media.get(host)
+        self._duracao_media[host] = segundos if anterior is None else anterior * 0.8 + segundos * 0.2
+
+    async def executar(self, wsdl_url: str, token_hash: str, prioridade: str, prazo: Optional[float],
+                       fabrica: Callable[[], Awaitable[T]]) -> T:
+        """
+        Aguarda a vez da chamada e executa fabrica(). Levanta FilaCheia se
+        a fila do token estiver no limite, ou PrazoExcedido se a espera
+        estimada (ou real) passar do prazo.
+        """
+        host = chave_host(wsdl_url)
+        agora = time.monotonic()
+
+        if not self._fila and self._tem_vaga(host, token_hash):
+            self._ocupar(host, token_hash)
+        else:
+            if self._fila_token.get(token_hash, 0) >= config.ESCALONADOR_FILA_MAX_POR_TOKEN:
+                metrics.incrementar('escalonador.rejeitadas_fila_cheia')
+                raise FilaCheia(f"Fila do token {_rotulo_token(token_hash)} cheia")
+            if prazo is not None and agora + self._estimar_espera(host, token_hash) > prazo:
+                metrics.incrementar('escalonador.rejeitadas_prazo')
+                raise PrazoExcedido("Espera estimada na fila passa do prazo da requisição")
+
+            fluxo = (prioridade, token_hash)
+            peso = config.ESCALONADOR_PESOS.get(prioridade, 1)
+            etiqueta = max(self._tempo_virtual, self._ultima_etiqueta.get(fluxo, 0.0)) + 1 / peso
+            self._ultima_etiqueta[fluxo] = etiqueta
+            pedido = _Pedido(host, token_hash, prioridade, etiqueta)
+            self._fila.append(pedido)
+            self._contar_fila(pedido, +1)
+            self._despachar()
+
+            try:
+                espera = None if prazo is None else max(0.0, prazo - time.monotonic())
+                await asyncio.wait_for(asyncio.shield(pedido.futuro), espera)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if pedido.futuro.done():
+                    # A vaga foi concedida junto com o cancelamento/timeout: devolve
+                    self._liberar(host, token_hash)
+                else:
+                    self._remover_da_fila(pedido)
+                    pedido.futuro.cancel()
+                if isinstance(e, asyncio.TimeoutError):
+                    metrics.incrementar('escalonador.rejeitadas_prazo')
+                    raise PrazoExcedido("Prazo da requisição esgotado na fila") from None
+                raise
+            metrics.registrar_amostra(f'escalonador.espera_ms.{prioridade}', (time.monotonic() - agora) * 1000)
+
+        inicio = time.monotonic()
+        try:
+            return await fabrica()
+        finally:
+            self._registrar_duracao(host, time.monotonic() - inicio)
+            self._liberar(host, token_hash)
+
+_escalonador: Optional[Escalonador] = None
+
+def get_escalonador() -> Escalonador:
+    """
+    Retorna o escalonador do worker.
+    """
+    global _escalonador
+    if _escalonador is None:
+        _escalonador = Escalonador()
+    return _escalonador
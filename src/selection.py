@@ -0,0 +1,69 @@
+# src/selection.py
+import strawberry
+from typing import Any, Dict, Iterable
+from graphql import FieldNode, FragmentSpreadNode, InlineFragmentNode
+from graphql.utilities import value_from_ast_untyped
+
+# Seleção GraphQL simplificada: nome do campo -> seleção dos subcampos.
+# Ex: {'numeroCarga': {}, 'pedidos': {'protocoloPedido': {}, 'recebedor': {'cidade': {}}}}
+Selecao = Dict[str, Dict]
+
+def _argumento_diretiva(diretiva: Any, nome: str, variaveis: Dict[str, Any], padrao: Any = None) -> Any:
+    for argumento in diretiva.arguments or ():
+        if argumento.name.value == nome:
+            return value_from_ast_untyped(argumento.value, variaveis)
+    return padrao
+
+def _incluido(node: Any, variaveis: Dict[str, Any]) -> bool:
+    """
+    Avalia @skip / @include de um nó da query.
+    """
+    for diretiva in node.directives or ():
+        nome = diretiva.name.value
+        if nome == 'skip' and _argumento_diretiva(diretiva, 'if', variaveis, False) is True:
+            return False
+        if nome == 'include' and _argumento_diretiva(diretiva, 'if', variaveis, True) is False:
+            return False
+    return True
+
+def _mesclar(nodes: Iterable[Any], fragmentos: Dict[str, Any], variaveis: Dict[str, Any], destino: Selecao) -> Selecao:
+    for node in nodes:
+        if not _incluido(node, variaveis):
+            continue
+        if isinstance(node, FieldNode):
+            subcampos = destino.setdefault(node.name.value, {})
+            if node.selection_set:
+                _mesclar(node.selection_set.selections, fragmentos, variaveis, subcampos)
+        elif isinstance(node, InlineFragmentNode):
+            # Inclui fragmentos com @defer (sem type condition)
+            _mesclar(node.selection_set.selections, fragmentos, variaveis, destino)
+        elif isinstance(node, FragmentSpreadNode):
+            fragmento = fragmentos.get(node.name.value)
+            if fragmento is not None:
+                _mesclar(fragmento.selection_set.selections, fragmentos, variaveis, destino)
+    return destino
+
+def selecao_campos(info: strawberry.Info) -> Selecao:
+    """
+    Retorna os subcampos pedidos pelo cliente no campo atual (fragmentos e
+    aliases mesclados, @skip/@include respeitados).
+    """
+    raw = info._raw_info
+    selecoes = [
+        selecao
+        for field_node in raw.field_nodes
+        if field_node.selection_set
+        for selecao in field_node.selection_set.selections
+    ]
+    return _mesclar(selecoes, raw.fragments, raw.variable_values, {})
+
+def campo_tem_diretiva(info: strawberry.Info, nome: str) -> bool:
+    """
+    Indica se o campo atual foi pedido com a diretiva (e seu 'if' não é falso).
+    """
+    raw = info._raw_info
+    for field_node in raw.field_nodes:
+        for diretiva in field_node.directives or ():
+            if diretiva.name.value == nome and _argumento_diretiva(diretiva, 'if', raw.variable_values, True) is not False:
+                return True
+    return False
@@ -1,18 +1,191 @@
 # src/soap_client.py
+import asyncio
+import time
+import httpx
 import zeep
 from zeep.helpers import serialize_object
-from lxml import etree
-from typing import Optional, List, Any
+from zeep.transports import Transport, AsyncTransport
+from zeep.wsdl.utils import etree_to_string
+from typing import Optional, List, Any, AsyncIterator, Awaitable, Callable, Tuple
+from collections import OrderedDict
 from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit
+from . import config, metrics, http_pool, offload, circuit_breaker, scheduler
+from .wsdl_cache import get_wsdl_cache
+from .coalescing import SingleFlight, chave_chamada
+from .response_cache import RespostaNegativa, get_response_cache, get_negative_cache
+from .soap_decoder import NAO_DECODIFICADO, obter_decodificador
+from .soap_envelope import caminhos_argumentos, criar_header_token, obter_modelo_envelope
+
+# Coalescência (single-flight) da criação de clientes e das chamadas upstream
+_coalescer_clientes = SingleFlight('coalescencia_clientes')
+_coalescer_chamadas = SingleFlight('coalescencia_chamadas')
+
+# Clientes assíncronos já criados, consultados direto no event loop: só a
+# primeira criação de cada WSDL passa pela thread (mesmo limite do lru_cache)
+_MAX_CLIENTES_ASYNC = 10
+_clientes_async: "OrderedDict[str, zeep.AsyncClient]" = OrderedDict()
 
 @lru_cache(maxsize=10) # Cacheia os 10 últimos clientes WSDL
 def get_zeep_client(wsdl_url: str) -> zeep.Client:
     """
     Cria e cacheia um cliente Zeep.
     Parsear WSDL é uma operação lenta e cara.
+    Os documentos WSDL/XSD vêm do cache em disco compartilhado, se disponível,
+    e as conexões vêm do pool do host (compartilhado com os outros WSDLs dele).
     """
     print(f"[Zeep] Criando novo cliente para: {wsdl_url}")
-    return zeep.Client(wsdl=wsdl_url)
+    transport = Transport(
+        cache=get_wsdl_cache(),
+        timeout=config.SOAP_TIMEOUT_WSDL,
+        session=http_pool.obter_sessao_sync(wsdl_url)
+    )
+    return zeep.Client(wsdl=wsdl_url, transport=transport)
+
+async def fechar_http_client_async() -> None:
+    """
+    Fecha os pools de conexão por host (chamado no shutdown da aplicação)
+    e descarta os clientes Zeep que os usavam.
+    """
+    await http_pool.fechar_pools()
+    get_zeep_client.cache_clear()
+    get_zeep_async_client.cache_clear()
+    _clientes_async.clear()
+    obter_decodificador.cache_clear()
+    obter_modelo_envelope.cache_clear()
+
+@lru_cache(maxsize=_MAX_CLIENTES_ASYNC) # Cacheia os 10 últimos clientes WSDL assíncronos
+def get_zeep_async_client(wsdl_url: str) -> zeep.AsyncClient:
+    """
+    Cria e cacheia um cliente Zeep assíncrono sobre o pool httpx do host do WSDL.
+    O carregamento do WSDL continua síncrono no Zeep, por isso o primeiro
+    acesso deve ser feito fora do event loop (ver obter_zeep_async_client).
+    """
+    print(f"[Zeep] Criando novo cliente assíncrono para: {wsdl_url}")
+    transport = AsyncTransport(
+        client=http_pool.obter_cliente_async(wsdl_url),
+        cache=get_wsdl_cache(),
+        timeout=config.SOAP_TIMEOUT_WSDL
+    )
+    return zeep.AsyncClient(wsdl=wsdl_url, transport=transport)
+
+async def obter_zeep_async_client(wsdl_url: str) -> zeep.AsyncClient:
+    """
+    Obtém o cliente assíncrono sem bloquear o event loop.
+    Cliente já criado volta direto, sem thread; a criação (download e parse
+    do WSDL) roda em uma thread, e requisições concorrentes para um WSDL
+    novo aguardam a mesma criação.
+    """
+    client = _clientes_async.get(wsdl_url)
+    if client is not None:
+        _clientes_async.move_to_end(wsdl_url)
+        return client
+
+    client = await _coalescer_clientes.executar(
+        wsdl_url, lambda: asyncio.to_thread(get_zeep_async_client, wsdl_url)
+    )
+    _clientes_async[wsdl_url] = client
+    _clientes_async.move_to_end(wsdl_url)
+    while len(_clientes_async) > _MAX_CLIENTES_ASYNC:
+        _clientes_async.popitem(last=False)
+    return client
+
+class RespostaNegativaSGT(Exception):
+    """
+    O SGT respondeu "não encontrado" (CodigoMensagem != 0 ou Objeto vazio),
+    agora ou numa resposta ainda no cache negativo. Leva o código e a
+    mensagem originais até o erro GraphQL.
+    """
+
+    def __init__(self, operacao: str, negativa: RespostaNegativa):
+        self.codigo = negativa.codigo
+        self.mensagem = negativa.mensagem
+        super().__init__(f"{operacao}: SGT respondeu {negativa.codigo} - {negativa.mensagem or 'sem dados'}")
+
+    @property
+    def vazia(self) -> bool:
+        """
+        Consulta bem-sucedida (CodigoMensagem 0), só que sem itens.
+        """
+        return self.codigo == 0
+
+class PaginacaoExcedida(Exception):
+    """
+    As NF-e da carga passam de NFE_PAGINACAO_MAX_PAGINAS páginas: a
+    paginação automática não devolve uma lista incompleta como se fosse
+    a lista inteira.
+    """
+
+def _detectar_resposta_negativa(response: Optional[dict], atributo_lista: Optional[str] = None) -> Optional[RespostaNegativa]:
+    """
+    Identifica respostas de "não encontrado": CodigoMensagem != 0 ou Objeto vazio
+    (ou, se informado, Objeto.<atributo_lista> vazio).
+    Retorna None para respostas com dados (ou sem formato reconhecível).
+    """
+    if not isinstance(response, dict) or 'CodigoMensagem' not in response:
+        return None
+
+    objeto = response.get('Objeto')
+    vazio = not objeto or (atributo_lista is not None and not objeto.get(atributo_lista))
+    if response['CodigoMensagem'] != 0 or vazio:
+        return RespostaNegativa(codigo=response['CodigoMensagem'], mensagem=response.get('Mensagem'))
+    return None
+
+def _log_resposta_vazia(response: Optional[dict]) -> None:
+    codigo = response.get('CodigoMensagem') if response else None
+    mensagem = response.get('Mensagem') if response else None
+    print(f"[SOAP] Resposta vazia ou com erro: {codigo} - {mensagem}")
+
+def _processar_resposta_carga(response: Optional[dict]) -> Optional[List[dict]]:
+    """
+    Processa a resposta (já em dict) de BuscarCarga / BuscarCargaPorCodigosIntegracao.
+    Caminho: <Operacao>Result -> Objeto -> CargaIntegracao (lista)
+    """
+    objeto = response.get('Objeto') if response else None
+    if response and response.get('CodigoMensagem') == 0 and objeto and objeto.get('CargaIntegracao'):
+        return objeto['CargaIntegracao']
+
+    _log_resposta_vazia(response)
+    return None
+
+def _processar_resposta_notas_fiscais(response: Optional[dict]) -> Optional[List[dict]]:
+    """
+    Processa a resposta (já em dict) de BuscarNotasFiscaisVinculadas.
+    Caminho: BuscarNotasFiscaisVinculadasResult -> Objeto -> Itens -> NotaFiscal (lista)
+    """
+    objeto = response.get('Objeto') if response else None
+    if response and response.get('CodigoMensagem') == 0 and objeto and objeto.get('Itens'):
+        itens = objeto['Itens']
+
+        # A lista de notas está dentro de Itens.NotaFiscal
+        if isinstance(itens, dict):
+            notas_fiscais = itens.get('NotaFiscal')
+            if notas_fiscais:
+                return notas_fiscais if isinstance(notas_fiscais, list) else [notas_fiscais]
+            else:
+                print("[SOAP] Resposta OK, mas sem notas fiscais (Itens.NotaFiscal está vazio).")
+                return [] # Retorna lista vazia
+        elif isinstance(itens, list):
+            # Se Itens já for diretamente a lista de notas
+            return itens
+        else:
+            print("[SOAP] Resposta OK, mas estrutura de Itens inesperada.")
+            return []
+
+    _log_resposta_vazia(response)
+    return None
+
+def _processar_resposta_nota_fiscal(response: Optional[dict]) -> Optional[dict]:
+    """
+    Processa a resposta (já em dict) de BuscarNotaFiscal.
+    Caminho: BuscarNotaFiscalResult -> Objeto
+    'Objeto' aqui é um único item, não uma lista.
+    """
+    if response and response.get('CodigoMensagem') == 0 and response.get('Objeto'):
+        return response['Objeto']
+
+    _log_resposta_vazia(response)
+    return None
 
 def chamar_buscar_carga(protocolo_str: str, wsdl_url: str, token: str) -> Optional[List[dict]]:
     """
@@ -23,11 +196,7 @@ def chamar_buscar_carga(protocolo_str: str, wsdl_url: str, token: str) -> Option
         client = get_zeep_client(wsdl_url=wsdl_url)
 
         # 2. Criar o Header SOAP com o Token dinâmico
-        header = etree.Element(
-            '{Token}Token',
-            xmlns="Token"
-        )
-        header.text = token
+        header = criar_header_token(token)
 
         # 3. Criar o payload baseado no XML de exemplo
         # A estrutura esperada é:
@@ -45,19 +214,14 @@ def chamar_buscar_carga(protocolo_str: str, wsdl_url: str, token: str) -> Option
 
         # 4. Chamar o serviço
         print(f"[SOAP] Chamando BuscarCarga...")
-        response = client.service.BuscarCarga(
+        response = serialize_object(client.service.BuscarCarga(
             protocolo=payload,
             _soapheaders=[header]
-        )
+        ))
 
         # 5. Processar a resposta (baseado no response.txt)
         # Caminho: BuscarCargaResult -> Objeto -> CargaIntegracao (lista)
-        if response and response.CodigoMensagem == 0 and response.Objeto and response.Objeto.CargaIntegracao:
-            # Serializa a resposta do Zeep para um dict/list Python padrão
-            return serialize_object(response.Objeto.CargaIntegracao)
-
-        print(f"[SOAP] Resposta vazia ou com erro: {response.CodigoMensagem} - {response.Mensagem}")
-        return None
+        return _processar_resposta_carga(response)
 
     except Exception as e:
         print(f"Erro catastrófico ao chamar SOAP: {e}")
@@ -72,11 +236,7 @@ def chamar_buscar_carga_por_codigos_integracao(codigo_filial: str, numero_carga:
         client = get_zeep_client(wsdl_url=wsdl_url)
 
         # 2. Criar o Header SOAP com o Token dinâmico
-        header = etree.Element(
-            '{Token}Token',
-            xmlns="Token"
-        )
-        header.text = token
+        header = criar_header_token(token)
 
         # 3. Criar o payload baseado no XML de exemplo
         # A estrutura esperada é:
@@ -96,19 +256,14 @@ def chamar_buscar_carga_por_codigos_integracao(codigo_filial: str, numero_carga:
 
         # 4. Chamar o serviço
         print(f"[SOAP] Chamando BuscarCargaPorCodigosIntegracao...")
-        response = client.service.BuscarCargaPorCodigosIntegracao(
+        response = serialize_object(client.service.BuscarCargaPorCodigosIntegracao(
             codigosIntegracao=payload,
             _soapheaders=[header]
-        )
+        ))
 
         # 5. Processar a resposta (mesmo formato do BuscarCarga)
         # Caminho: BuscarCargaPorCodigosIntegracaoResult -> Objeto -> CargaIntegracao (lista)
-        if response and response.CodigoMensagem == 0 and response.Objeto and response.Objeto.CargaIntegracao:
-            # Serializa a resposta do Zeep para um dict/list Python padrão
-            return serialize_object(response.Objeto.CargaIntegracao)
-
-        print(f"[SOAP] Resposta vazia ou com erro: {response.CodigoMensagem} - {response.Mensagem}")
-        return None
+        return _processar_resposta_carga(response)
 
     except Exception as e:
         print(f"Erro catastrófico ao chamar SOAP: {e}")
@@ -124,11 +279,7 @@ def chamar_buscar_notas_fiscais(protocolo_carga: str, inicio: int, limite: int,
         client = get_zeep_client(wsdl_url=wsdl_url)
 
         # 2. Criar o Header SOAP com o Token dinâmico
-        header = etree.Element(
-            '{Token}Token',
-            xmlns="Token"
-        )
-        header.text = token
+        header = criar_header_token(token)
 
         # 3. Chamar o serviço
         # O corpo da requisição é simples, sem tipos complexos aninhados:
@@ -141,36 +292,16 @@ def chamar_buscar_notas_fiscais(protocolo_carga: str, inicio: int, limite: int,
 
         print(f"[SOAP] Chamando BuscarNotasFiscaisVinculadas com protocoloCarga={protocolo_carga}, inicio={inicio}, limite={limite}")
 
-        response = client.service.BuscarNotasFiscaisVinculadas(
+        response = serialize_object(client.service.BuscarNotasFiscaisVinculadas(
             protocoloCarga=protocolo_carga,
             inicio=inicio,
             limite=limite,
             _soapheaders=[header]
-        )
+        ))
 
         # 4. Processar a resposta (baseado no response.txt)
         # Caminho: BuscarNotasFiscaisVinculadasResult -> Objeto -> Itens -> NotaFiscal (lista)
-        if response and response.CodigoMensagem == 0 and response.Objeto and response.Objeto.Itens:
-            # Primeiro serializa o objeto Itens para um dict Python
-            itens_serializado = serialize_object(response.Objeto.Itens)
-
-            # A lista de notas está dentro de Itens.NotaFiscal
-            if itens_serializado and isinstance(itens_serializado, dict):
-                notas_fiscais = itens_serializado.get('NotaFiscal')
-                if notas_fiscais:
-                    return notas_fiscais if isinstance(notas_fiscais, list) else [notas_fiscais]
-                else:
-                    print("[SOAP] Resposta OK, mas sem notas fiscais (Itens.NotaFiscal está vazio).")
-                    return [] # Retorna lista vazia
-            elif itens_serializado and isinstance(itens_serializado, list):
-                # Se Itens já for diretamente a lista de notas
-                return itens_serializado
-            else:
-                print("[SOAP] Resposta OK, mas estrutura de Itens inesperada.")
-                return []
-
-        print(f"[SOAP] Resposta vazia ou com erro: {response.CodigoMensagem} - {response.Mensagem}")
-        return None
+        return _processar_resposta_notas_fiscais(response)
 
     except Exception as e:
         print(f"Erro catastrófico ao chamar SOAP (NFe): {e}")
@@ -186,11 +317,7 @@ def chamar_buscar_nota_fiscal_por_chave(chave_nfe: str, wsdl_url: str, token: st
         client = get_zeep_client(wsdl_url=wsdl_url)
 
         # 2. Criar o Header SOAP com o Token dinâmico
-        header = etree.Element(
-            '{Token}Token',
-            xmlns="Token"
-        )
-        header.text = token
+        header = criar_header_token(token)
 
         # 3. Chamar o serviço (request body simples)
         # <tem:BuscarNotaFiscal>
@@ -199,21 +326,498 @@ def chamar_buscar_nota_fiscal_por_chave(chave_nfe: str, wsdl_url: str, token: st
 
         print(f"[SOAP] Chamando BuscarNotaFiscal com chaveNFe={chave_nfe}")
 
-        response = client.service.BuscarNotaFiscal(
+        response = serialize_object(client.service.BuscarNotaFiscal(
             chaveNFe=chave_nfe,
             _soapheaders=[header]
-        )
+        ))
 
         # 4. Processar a resposta (baseado no XML de response)
         # Caminho: BuscarNotaFiscalResult -> Objeto
-        # 'Objeto' aqui é um único item, não uma lista.
-        if response and response.CodigoMensagem == 0 and response.Objeto:
-            # Serializa o objeto singular
-            return serialize_object(response.Objeto)
+        return _processar_resposta_nota_fiscal(response)
+
+    except Exception as e:
+        print(f"Erro catastrófico ao chamar SOAP (CTe.BuscarNotaFiscal): {e}")
+        return None
+
+# --- Versões assíncronas (não bloqueiam o event loop) ---
+# Todas passam por _executar_chamada: cache de respostas e coalescência
+# de chamadas idênticas e concorrentes (mesmo WSDL, token, operação e argumentos).
+
+async def _executar_chamada(operacao: str, chave: Tuple, fabrica: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Executa uma chamada upstream através das camadas compartilhadas:
+    cache negativo -> circuit breaker -> cache de respostas -> coalescência
+    (single-flight) -> escalonador (prioridade, limites por token e host) -> SOAP.
+    fabrica() retorna os dados, None (erro) ou uma RespostaNegativa,
+    que é gravada no cache negativo. Respostas negativas (novas ou do
+    cache) levantam RespostaNegativaSGT com o código e a mensagem do SGT.
+    """
+    cache_negativo = get_negative_cache()
+    negativa = cache_negativo.obter(chave)
+    if negativa is not None:
+        print(f"[SOAP] {operacao}: resposta negativa em cache: {negativa.codigo} - {negativa.mensagem}")
+        raise RespostaNegativaSGT(operacao, negativa)
+
+    # Circuito aberto no host do WSDL: responde com a última resposta em cache, se houver
+    if circuit_breaker.circuito_aberto(chave[0]):
+        ultima = get_response_cache().obter_ultima(chave)
+        print(f"[SOAP] {operacao}: circuito aberto, {'servindo do cache' if ultima is not None else 'falhando rápido'}")
+        return ultima
+
+    # Prioridade e prazo são os da requisição que dispara a chamada
+    # (as coalescidas só aguardam o resultado)
+    prioridade, prazo = scheduler.prioridade_atual(operacao), scheduler.prazo_atual()
+
+    async def _escalonada() -> Any:
+        if not config.ESCALONADOR_HABILITADO:
+            return await fabrica()
+        return await scheduler.get_escalonador().executar(chave[0], chave[1], prioridade, prazo, fabrica)
+
+    async def _upstream() -> Any:
+        try:
+            resultado = await _coalescer_chamadas.executar(chave, _escalonada)
+        except scheduler.RejeitadaPeloEscalonador as e:
+            print(f"[SOAP] {operacao}: chamada recusada pelo escalonador: {e}")
+            return None
+        if isinstance(resultado, RespostaNegativa):
+            cache_negativo.gravar(chave, resultado)
+            raise RespostaNegativaSGT(operacao, resultado)
+        return resultado
+
+    return await get_response_cache().consultar(operacao, chave, _upstream)
+
+def decodificar_em_processo(wsdl_url: str, operacao: str, conteudo: bytes) -> Tuple[bool, Any]:
+    """
+    Decodifica a resposta num processo do pool (ver offload): o processo
+    monta (uma vez) seu próprio cliente Zeep e decodificador a partir do
+    WSDL em cache. Retorna (decodificou, resultado), já que o sentinela
+    NAO_DECODIFICADO não mantém a identidade entre processos.
+    """
+    resultado = obter_decodificador(get_zeep_client(wsdl_url), operacao).decodificar(conteudo)
+    if resultado is NAO_DECODIFICADO:
+        return False, None
+    return True, resultado
+
+async def _decodificar(client: zeep.AsyncClient, operacao: str, conteudo: bytes) -> Any:
+    """
+    Decodifica a resposta no próprio processo ou, acima de
+    OFFLOAD_TAMANHO_MINIMO bytes, no pool de processos.
+    """
+    if offload.habilitado(len(conteudo)):
+        try:
+            decodificou, resultado = await offload.executar(
+                decodificar_em_processo, client.wsdl.location, operacao, conteudo
+            )
+            return resultado if decodificou else NAO_DECODIFICADO
+        except Exception as e:
+            print(f"[Offload] Falha ao decodificar {operacao} no pool, decodificando no processo: {e}")
+    return obter_decodificador(client, operacao).decodificar(conteudo)
+
+# HTTP que indica upstream indisponível (o 500 é usado pelos SOAP Faults)
+_STATUS_INDISPONIVEL = (502, 503, 504)
+
+async def _post_protegido(wsdl_url: str, operacao: str, endereco: str, corpo: bytes, http_headers: dict) -> httpx.Response:
+    """
+    POST pelo pool de conexões do host do endpoint, sob o circuit breaker
+    do host do WSDL e com o timeout adaptativo da operação (ver
+    circuit_breaker). Levanta CircuitoAberto sem chamar o SGT se o
+    circuito estiver aberto.
+    """
+    if not config.CIRCUIT_BREAKER_HABILITADO:
+        timeout = circuit_breaker.timeout_operacao(wsdl_url, operacao)
+        return await _post_com_timeout(wsdl_url, operacao, endereco, corpo, http_headers, timeout)
+
+    disjuntor = circuit_breaker.obter_disjuntor(wsdl_url)
+    sonda = disjuntor.antes_da_chamada()
+    sucesso = None
+    try:
+        # Sondas de recuperação usam o timeout cheio: o host pode ter voltado mais lento
+        timeout = config.SOAP_TIMEOUT_OPERACAO if sonda is not None else circuit_breaker.timeout_operacao(wsdl_url, operacao)
+        resposta = await _post_com_timeout(wsdl_url, operacao, endereco, corpo, http_headers, timeout)
+        sucesso = resposta.status_code not in _STATUS_INDISPONIVEL
+        return resposta
+    except (asyncio.TimeoutError, httpx.HTTPError):
+        sucesso = False
+        raise
+    finally:
+        disjuntor.registrar(sucesso, sonda)
+
+async def _post_com_timeout(wsdl_url: str, operacao: str, endereco: str, corpo: bytes,
+                            http_headers: dict, timeout: float) -> httpx.Response:
+    inicio = time.perf_counter()
+    try:
+        resposta = await asyncio.wait_for(http_pool.post(endereco, corpo, http_headers), timeout)
+    except asyncio.TimeoutError:
+        print(f"[SOAP] {operacao}: timeout após {timeout:.1f}s")
+        metrics.incrementar('upstream.timeouts')
+        # O próprio timeout entra como amostra, para o limite subir se o host ficou mais lento
+        circuit_breaker.registrar_latencia(wsdl_url, operacao, timeout)
+        raise
+    circuit_breaker.registrar_latencia(wsdl_url, operacao, time.perf_counter() - inicio)
+    return resposta
+
+class _OrcamentoHedge:
+    """
+    Orçamento de duplicatas (token bucket): cada chamada ao SGT acumula
+    HEDGE_ORCAMENTO_PERCENTUAL / 100 de crédito e cada duplicata gasta 1,
+    então as duplicatas nunca passam desse percentual da carga upstream.
+    """
+
+    def __init__(self, maximo: float = 10.0):
+        self.maximo = maximo
+        self.creditos = 0.0
+
+    def registrar_chamada(self) -> None:
+        self.creditos = min(self.maximo, self.creditos + config.HEDGE_ORCAMENTO_PERCENTUAL / 100)
+
+    def consumir(self) -> bool:
+        if self.creditos < 1:
+            return False
+        self.creditos -= 1
+        return True
+
+_orcamento_hedge = _OrcamentoHedge()
 
-        print(f"[SOAP] Resposta vazia ou com erro: {response.CodigoMensagem} - {response.Mensagem}")
+def _endereco_alternativo(endereco: str) -> str:
+    """
+    Endereço da duplicata: o mesmo endpoint no host de HEDGE_HOSTS_ALTERNATIVOS,
+    se houver um para o host do endereço; senão o próprio endereço.
+    """
+    partes = urlsplit(endereco)
+    alternativo = config.HEDGE_HOSTS_ALTERNATIVOS.get(partes.netloc.lower())
+    return urlunsplit(partes._replace(netloc=alternativo)) if alternativo else endereco
+
+def _resposta_valida(tarefa: asyncio.Future) -> bool:
+    # Vale como resposta do hedge: sem exceção e sem HTTP de upstream indisponível
+    return tarefa.exception() is None and tarefa.result().status_code not in _STATUS_INDISPONIVEL
+
+async def _post_com_hedge(wsdl_url: str, operacao: str, endereco: str, corpo: bytes, http_headers: dict) -> httpx.Response:
+    """
+    POST de uma operação somente leitura (HEDGE_OPERACOES) com hedging:
+    se a chamada passar do percentil HEDGE_PERCENTIL da latência da
+    operação, uma duplicata é enviada (ao host alternativo, se configurado),
+    vale a primeira resposta válida (sem erro nem HTTP 502/503/504) e a
+    outra é cancelada; se as duas falharem, vale o resultado da original.
+    Sem histórico de latência ou sem orçamento, é um POST comum.
+    """
+    if not config.HEDGE_HABILITADO or operacao not in config.HEDGE_OPERACOES:
+        return await _post_protegido(wsdl_url, operacao, endereco, corpo, http_headers)
+
+    _orcamento_hedge.registrar_chamada()
+    espera = circuit_breaker.percentil_latencia(wsdl_url, operacao, config.HEDGE_PERCENTIL)
+    original = asyncio.ensure_future(_post_protegido(wsdl_url, operacao, endereco, corpo, http_headers))
+    if espera is None:
+        return await original
+
+    duplicata = None
+    try:
+        concluidas, _ = await asyncio.wait({original}, timeout=espera)
+        if concluidas:
+            return original.result()
+        if not _orcamento_hedge.consumir():
+            metrics.incrementar('hedge.sem_orcamento')
+            return await original
+
+        endereco_hedge = _endereco_alternativo(endereco)
+        # No host alternativo, circuit breaker e latências são os dele
+        url_saude = endereco_hedge if endereco_hedge != endereco else wsdl_url
+        print(f"[SOAP] {operacao}: sem resposta em {espera * 1000:.0f} ms, enviando duplicata para {http_pool.chave_host(endereco_hedge)}")
+        metrics.incrementar('hedge.disparados')
+        duplicata = asyncio.ensure_future(_post_protegido(url_saude, operacao, endereco_hedge, corpo, http_headers))
+
+        pendentes = {original, duplicata}
+        while pendentes:
+            concluidas, pendentes = await asyncio.wait(pendentes, return_when=asyncio.FIRST_COMPLETED)
+            vencedora = next((tarefa for tarefa in concluidas if _resposta_valida(tarefa)), None)
+            if vencedora is not None:
+                metrics.incrementar('hedge.vencedor_duplicata' if vencedora is duplicata else 'hedge.vencedor_original')
+                return vencedora.result()
+        # Uma falha (exceção ou 502/503/504) só vale se a outra também falhar
+        metrics.incrementar('hedge.ambas_falharam')
+        return original.result()
+    finally:
+        for tarefa in (original, duplicata):
+            if tarefa is not None and not tarefa.done():
+                tarefa.cancel()
+
+async def _chamar_operacao(client: zeep.AsyncClient, operacao: str, token: str, **argumentos: Any) -> Optional[dict]:
+    """
+    Chama a operação SOAP e devolve o <Operacao>Result como dict.
+    Com SOAP_ENVELOPE_PRECOMPILADO, o corpo da requisição sai de um modelo
+    em bytes compilado uma vez por operação (ver soap_envelope); sem ele,
+    o Zeep monta o envelope a cada chamada.
+    Com SOAP_DECODIFICADOR_RAPIDO, a resposta é lida direto do XML (ver
+    soap_decoder), sem o grafo de objetos do Zeep nem o serialize_object.
+    Falhas SOAP e respostas fora do formato esperado seguem pelo
+    processamento completo do Zeep.
+    """
+    servico = client.service
+    binding = servico._binding
+
+    modelo = None
+    if config.SOAP_ENVELOPE_PRECOMPILADO:
+        caminhos = caminhos_argumentos(argumentos)
+        if caminhos is not None:
+            modelo = obter_modelo_envelope(client, operacao, caminhos)
+    if modelo is not None:
+        corpo = modelo.montar(token, argumentos)
+        endereco, http_headers = modelo.endereco, modelo.cabecalhos_http
+    else:
+        envelope, http_headers = binding._create(
+            operacao, (), dict(argumentos, _soapheaders=[criar_header_token(token)]),
+            client=client, options=servico._binding_options
+        )
+        corpo, endereco = etree_to_string(envelope), servico._binding_options['address']
+
+    resposta_http = client.transport.new_response(
+        await _post_com_hedge(client.wsdl.location, operacao, endereco, corpo, http_headers)
+    )
+
+    if config.SOAP_DECODIFICADOR_RAPIDO:
+        if resposta_http.status_code == 200:
+            resultado = await _decodificar(client, operacao, resposta_http.content)
+            if resultado is not NAO_DECODIFICADO:
+                metrics.incrementar('decodificador.rapido')
+                return resultado
+        metrics.incrementar('decodificador.fallback')
+
+    # O Zeep processa a resposta (e levanta Fault/TransportError, se for o caso)
+    response = binding.process_reply(client, binding.get(operacao), resposta_http)
+    return serialize_object(response)
+
+async def _buscar_carga_async(protocolo_str: str, wsdl_url: str, token: str) -> Optional[List[dict]]:
+    try:
+        client = await obter_zeep_async_client(wsdl_url)
+
+        print(f"[SOAP] Chamando BuscarCarga (async) com protocoloIntegracaoCarga='{protocolo_str}'")
+        response = await _chamar_operacao(
+            client, 'BuscarCarga', token,
+            protocolo={'protocoloIntegracaoCarga': protocolo_str}
+        )
+        negativa = _detectar_resposta_negativa(response, 'CargaIntegracao')
+        if negativa is not None:
+            print(f"[SOAP] Resposta vazia ou com erro: {negativa.codigo} - {negativa.mensagem}")
+            return negativa
+        return _processar_resposta_carga(response)
+
+    except Exception as e:
+        print(f"Erro catastrófico ao chamar SOAP: {e}")
         return None
 
+async def chamar_buscar_carga_async(protocolo_str: str, wsdl_url: str, token: str) -> Optional[List[dict]]:
+    """
+    Versão assíncrona de chamar_buscar_carga (BuscarCarga).
+    """
+    chave = chave_chamada('BuscarCarga', wsdl_url, token, protocolo_str)
+    return await _executar_chamada(
+        'BuscarCarga', chave, lambda: _buscar_carga_async(protocolo_str, wsdl_url, token)
+    )
+
+async def _buscar_carga_por_codigos_integracao_async(codigo_filial: str, numero_carga: str, wsdl_url: str, token: str) -> Optional[List[dict]]:
+    try:
+        client = await obter_zeep_async_client(wsdl_url)
+
+        print(f"[SOAP] Chamando BuscarCargaPorCodigosIntegracao (async) com CodigoIntegracaoFilial='{codigo_filial}', NumeroCarga='{numero_carga}'")
+        response = await _chamar_operacao(
+            client, 'BuscarCargaPorCodigosIntegracao', token,
+            codigosIntegracao={
+                'CodigoIntegracaoFilial': codigo_filial,
+                'NumeroCarga': numero_carga
+            }
+        )
+        negativa = _detectar_resposta_negativa(response, 'CargaIntegracao')
+        if negativa is not None:
+            print(f"[SOAP] Resposta vazia ou com erro: {negativa.codigo} - {negativa.mensagem}")
+            return negativa
+        return _processar_resposta_carga(response)
+
+    except Exception as e:
+        print(f"Erro catastrófico ao chamar SOAP: {e}")
+        return None
+
+async def chamar_buscar_carga_por_codigos_integracao_async(codigo_filial: str, numero_carga: str, wsdl_url: str, token: str) -> Optional[List[dict]]:
+    """
+    Versão assíncrona de chamar_buscar_carga_por_codigos_integracao.
+    """
+    chave = chave_chamada('BuscarCargaPorCodigosIntegracao', wsdl_url, token, codigo_filial, numero_carga)
+    return await _executar_chamada(
+        'BuscarCargaPorCodigosIntegracao', chave, lambda: _buscar_carga_por_codigos_integracao_async(codigo_filial, numero_carga, wsdl_url, token)
+    )
+
+async def _buscar_notas_fiscais_async(protocolo_carga: str, inicio: int, limite: int, wsdl_url: str, token: str) -> Optional[dict]:
+    try:
+        client = await obter_zeep_async_client(wsdl_url)
+
+        print(f"[SOAP] Chamando BuscarNotasFiscaisVinculadas (async) com protocoloCarga={protocolo_carga}, inicio={inicio}, limite={limite}")
+        response = await _chamar_operacao(
+            client, 'BuscarNotasFiscaisVinculadas', token,
+            protocoloCarga=protocolo_carga,
+            inicio=inicio,
+            limite=limite
+        )
+        negativa = _detectar_resposta_negativa(response, 'Itens')
+        if negativa is not None:
+            print(f"[SOAP] Resposta vazia ou com erro: {negativa.codigo} - {negativa.mensagem}")
+            return negativa
+
+        notas = _processar_resposta_notas_fiscais(response)
+        if notas is None:
+            return None
+        # A página vem junto com o total de registros (usado pela paginação automática)
+        return {
+            'notas': notas,
+            'total': response['Objeto'].get('NumeroTotalDeRegistro')
+        }
+
+    except Exception as e:
+        print(f"Erro catastrófico ao chamar SOAP (NFe): {e}")
+        return None
+
+async def chamar_buscar_pagina_notas_fiscais_async(protocolo_carga: str, inicio: int, limite: int, wsdl_url: str, token: str) -> Optional[dict]:
+    """
+    Busca uma página de BuscarNotasFiscaisVinculadas.
+    Retorna {'notas': [...], 'total': NumeroTotalDeRegistro (ou None)}.
+    """
+    chave = chave_chamada('BuscarNotasFiscaisVinculadas', wsdl_url, token, protocolo_carga, inicio, limite)
+    return await _executar_chamada(
+        'BuscarNotasFiscaisVinculadas', chave, lambda: _buscar_notas_fiscais_async(protocolo_carga, inicio, limite, wsdl_url, token)
+    )
+
+async def chamar_buscar_notas_fiscais_async(protocolo_carga: str, inicio: int, limite: int, wsdl_url: str, token: str) -> Optional[List[dict]]:
+    """
+    Versão assíncrona de chamar_buscar_notas_fiscais (BuscarNotasFiscaisVinculadas).
+    """
+    pagina = await _buscar_pagina_ou_vazia(protocolo_carga, inicio, limite, wsdl_url, token)
+    return pagina['notas'] if pagina is not None else None
+
+async def _buscar_pagina_ou_vazia(protocolo_carga: str, inicio: int, limite: int, wsdl_url: str, token: str) -> Optional[dict]:
+    """
+    Como chamar_buscar_pagina_notas_fiscais_async, mas a resposta negativa
+    de consulta bem-sucedida sem itens (CodigoMensagem 0) vira uma página
+    sem notas. As demais respostas negativas levantam RespostaNegativaSGT.
+    """
+    try:
+        return await chamar_buscar_pagina_notas_fiscais_async(protocolo_carga, inicio, limite, wsdl_url, token)
+    except RespostaNegativaSGT as e:
+        if e.vazia:
+            return {'notas': [], 'total': None}
+        raise
+
+async def iterar_paginas_notas_fiscais_async(protocolo_carga: str, tamanho_pagina: int, wsdl_url: str, token: str) -> AsyncIterator[Optional[List[dict]]]:
+    """
+    Percorre todas as páginas de BuscarNotasFiscaisVinculadas, entregando as
+    notas de cada página (em ordem) assim que ela chega.
+    A primeira página informa o total; as demais são buscadas em paralelo
+    (até NFE_PAGINACAO_MAX_PARALELO em voo). Sem total, segue página a página
+    até receber uma página incompleta.
+    Entrega None (e encerra) se uma página falhar, e levanta
+    PaginacaoExcedida se as notas passarem de NFE_PAGINACAO_MAX_PAGINAS
+    páginas.
+    """
+    tamanho_pagina = max(tamanho_pagina, 1)
+    max_paginas = config.NFE_PAGINACAO_MAX_PAGINAS
+
+    def _excedida(quantidade: str) -> PaginacaoExcedida:
+        print(f"[SOAP] Paginação NF-e: carga {protocolo_carga} com {quantidade} NF-e passa de {max_paginas} página(s) de {tamanho_pagina}")
+        metrics.incrementar('nfe_paginacao.excedidas')
+        return PaginacaoExcedida(
+            f"A carga {protocolo_carga} tem {quantidade} NF-e, acima do máximo de {max_paginas * tamanho_pagina} "
+            f"da paginação automática ({max_paginas} páginas de {tamanho_pagina}). Use inicio/limite."
+        )
+
+    # 1. Primeira página (define o total)
+    primeira = await _buscar_pagina_ou_vazia(protocolo_carga, 0, tamanho_pagina, wsdl_url, token)
+    if primeira is None:
+        yield None
+        return
+
+    total = primeira['total']
+    if total is not None and total > max_paginas * tamanho_pagina:
+        raise _excedida(str(total))
+
+    yield primeira['notas']
+
+    # 2a. Total conhecido: busca as páginas restantes em paralelo
+    if total is not None:
+        inicios = list(range(tamanho_pagina, total, tamanho_pagina))
+        if not inicios:
+            return
+
+        print(f"[SOAP] Paginação NF-e: total={total}, {len(inicios)} página(s) restante(s) em paralelo")
+        semaforo = asyncio.Semaphore(config.NFE_PAGINACAO_MAX_PARALELO)
+
+        async def _buscar_pagina(inicio: int) -> Optional[dict]:
+            async with semaforo:
+                return await _buscar_pagina_ou_vazia(protocolo_carga, inicio, tamanho_pagina, wsdl_url, token)
+
+        tarefas = [asyncio.ensure_future(_buscar_pagina(inicio)) for inicio in inicios]
+        try:
+            for inicio, tarefa in zip(inicios, tarefas):
+                pagina = await tarefa
+                if pagina is None:
+                    print(f"[SOAP] Falha ao buscar a página inicio={inicio} das NF-e.")
+                    yield None
+                    return
+                yield pagina['notas']
+        finally:
+            # Se o consumidor desistir no meio, não deixa páginas órfãs em voo
+            for tarefa in tarefas:
+                tarefa.cancel()
+        return
+
+    # 2b. Total desconhecido: segue sequencialmente até uma página incompleta
+    # (uma página vazia, sem itens, também é incompleta)
+    pagina = primeira
+    inicio = 0
+    while len(pagina['notas']) >= tamanho_pagina:
+        inicio += tamanho_pagina
+        pagina = await _buscar_pagina_ou_vazia(protocolo_carga, inicio, tamanho_pagina, wsdl_url, token)
+        if pagina is None:
+            # Erro, circuito aberto ou recusa: a lista não está completa
+            print(f"[SOAP] Falha ao buscar a página inicio={inicio} das NF-e.")
+            yield None
+            return
+        if pagina['notas'] and inicio // tamanho_pagina >= max_paginas:
+            # Ainda há notas depois da última página permitida
+            raise _excedida(f"mais de {max_paginas * tamanho_pagina}")
+        yield pagina['notas']
+
+async def chamar_buscar_todas_notas_fiscais_async(protocolo_carga: str, tamanho_pagina: int, wsdl_url: str, token: str) -> Optional[List[dict]]:
+    """
+    Percorre todas as páginas de BuscarNotasFiscaisVinculadas e devolve uma lista única
+    (ou None se alguma página falhar).
+    """
+    notas: List[dict] = []
+    async for pagina in iterar_paginas_notas_fiscais_async(protocolo_carga, tamanho_pagina, wsdl_url, token):
+        if pagina is None:
+            return None
+        notas.extend(pagina)
+    return notas
+
+async def _buscar_nota_fiscal_por_chave_async(chave_nfe: str, wsdl_url: str, token: str) -> Optional[dict]:
+    try:
+        client = await obter_zeep_async_client(wsdl_url)
+
+        print(f"[SOAP] Chamando BuscarNotaFiscal (async) com chaveNFe={chave_nfe}")
+        response = await _chamar_operacao(
+            client, 'BuscarNotaFiscal', token,
+            chaveNFe=chave_nfe
+        )
+        negativa = _detectar_resposta_negativa(response)
+        if negativa is not None:
+            print(f"[SOAP] Resposta vazia ou com erro: {negativa.codigo} - {negativa.mensagem}")
+            return negativa
+        return _processar_resposta_nota_fiscal(response)
+
     except Exception as e:
         print(f"Erro catastrófico ao chamar SOAP (CTe.BuscarNotaFiscal): {e}")
         return None
+
+async def chamar_buscar_nota_fiscal_por_chave_async(chave_nfe: str, wsdl_url: str, token: str) -> Optional[dict]:
+    """
+    Versão assíncrona de chamar_buscar_nota_fiscal_por_chave (CTe.BuscarNotaFiscal).
+    """
+    chave = chave_chamada('BuscarNotaFiscal', wsdl_url, token, chave_nfe)
+    return await _executar_chamada(
+        'BuscarNotaFiscal', chave, lambda: _buscar_nota_fiscal_por_chave_async(chave_nfe, wsdl_url, token)
+    )
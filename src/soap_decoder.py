@@ -0,0 +1,165 @@
+# src/soap_decoder.py
+from functools import lru_cache
+from io import BytesIO
+from typing import Any, Callable, Dict, Tuple, Union
+import zeep
+from lxml import etree
+from zeep.xsd import ComplexType, Element
+
+# Retorno de decodificar() quando a resposta não tem o formato esperado
+# (SOAP Fault, elemento <Operacao>Result ausente, XML inválido):
+# o chamador deve recorrer ao processamento completo do Zeep.
+NAO_DECODIFICADO = object()
+
+class _Plano:
+    """
+    Plano de decodificação de um complexType, derivado uma única vez do
+    schema do WSDL: para cada elemento filho (pelo nome local), o plano
+    do filho (complexType) ou o conversor de texto (tipo simples), se
+    ele aceita múltiplas ocorrências (lista) e a chave no dict.
+    """
+    __slots__ = ('filhos', 'modelo', 'listas')
+
+    def __init__(self):
+        self.filhos: Dict[str, Tuple[Union['_Plano', Callable[[str], Any]], bool, str]] = {}
+        # Dict com todos os campos em None, como o serialize_object do Zeep
+        self.modelo: Dict[str, Any] = {}
+        # Campos de lista (começam como [] em vez de None)
+        self.listas: Tuple[str, ...] = ()
+
+    def novo_valor(self) -> Dict[str, Any]:
+        valores = dict(self.modelo)
+        for nome in self.listas:
+            valores[nome] = []
+        return valores
+
+def _conversor(tipo: Any) -> Callable[[str], Any]:
+    """
+    Conversor texto -> valor Python do tipo simples do XSD
+    (mesma regra do Zeep: valor inválido vira None).
+    """
+    def converter(texto: str) -> Any:
+        try:
+            return tipo.pythonvalue(texto)
+        except (TypeError, ValueError):
+            return None
+    return converter
+
+def _montar_plano(tipo: ComplexType, memo: Dict[int, _Plano]) -> _Plano:
+    # memo evita recursão infinita em tipos que referenciam a si mesmos
+    if id(tipo) in memo:
+        return memo[id(tipo)]
+    plano = _Plano()
+    memo[id(tipo)] = plano
+
+    listas = []
+    for nome, elemento in tipo.elements:
+        # xs:any e afins não são decodificados (ficam de fora do dict)
+        if not isinstance(elemento, Element):
+            continue
+        if isinstance(elemento.type, ComplexType):
+            filho = _montar_plano(elemento.type, memo)
+        else:
+            filho = _conversor(elemento.type)
+        lista = elemento.accepts_multiple
+        plano.filhos[elemento.qname.localname] = (filho, lista, nome)
+        plano.modelo[nome] = None
+        if lista:
+            listas.append(nome)
+    plano.listas = tuple(listas)
+    return plano
+
+class DecodificadorResposta:
+    """
+    Decodifica a resposta SOAP de uma operação direto do XML com
+    lxml.etree.iterparse, elemento a elemento, produzindo o mesmo dict
+    que serialize_object(resposta do Zeep) produziria, sem montar o grafo
+    de objetos do Zeep. Cada subárvore é descartada assim que lida.
+    """
+
+    def __init__(self, operacao: str, tipo_resultado: ComplexType):
+        self.operacao = operacao
+        self.tag_resultado = f'{operacao}Result'
+        self.plano = _montar_plano(tipo_resultado, {})
+
+    def decodificar(self, conteudo: bytes) -> Any:
+        """
+        Retorna o dict do <Operacao>Result (None se vazio/nulo) ou
+        NAO_DECODIFICADO se a resposta não tiver o formato esperado.
+        """
+        # Pilha de [plano ou conversor, é lista, chave no pai, valores do complexType]
+        pilha: list = []
+        ignorar = 0
+
+        try:
+            eventos = etree.iterparse(
+                BytesIO(conteudo), events=('start', 'end'),
+                resolve_entities=False, no_network=True, huge_tree=True
+            )
+            for evento, elem in eventos:
+                nome = elem.tag.rpartition('}')[2] if isinstance(elem.tag, str) else None
+
+                if evento == 'start':
+                    if ignorar:
+                        ignorar += 1
+                    elif not pilha:
+                        if nome == 'Fault':
+                            return NAO_DECODIFICADO
+                        if nome == self.tag_resultado:
+                            pilha.append([self.plano, False, None, None])
+                    else:
+                        plano = pilha[-1][0]
+                        filho = plano.filhos.get(nome) if isinstance(plano, _Plano) else None
+                        if filho is None:
+                            # Elemento fora do schema: ignora a subárvore inteira
+                            ignorar = 1
+                        else:
+                            pilha.append([filho[0], filho[1], filho[2], None])
+                    continue
+
+                # evento == 'end'
+                if ignorar:
+                    ignorar -= 1
+                elif pilha:
+                    definicao, lista, chave, valores = pilha.pop()
+                    if isinstance(definicao, _Plano):
+                        # Como no Zeep: complexType sem filhos vira None, a menos
+                        # que tenha atributos (ex: i:nil="true"), quando vira o
+                        # dict vazio (listas em [])
+                        if valores is None and elem.attrib and definicao.filhos:
+                            valores = definicao.novo_valor()
+                        valor = valores
+                    else:
+                        valor = definicao(elem.text) if elem.text is not None else None
+
+                    if not pilha:
+                        return valor
+
+                    pai = pilha[-1]
+                    if pai[3] is None:
+                        pai[3] = pai[0].novo_valor()
+                    if lista:
+                        pai[3][chave].append(valor)
+                    else:
+                        pai[3][chave] = valor
+
+                # Libera a subárvore já lida (e os irmãos anteriores)
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+
+        except etree.XMLSyntaxError as e:
+            print(f"[SOAP] Resposta {self.operacao} com XML inválido: {e}")
+
+        return NAO_DECODIFICADO
+
+@lru_cache(maxsize=64)
+def obter_decodificador(client: zeep.Client, operacao: str) -> DecodificadorResposta:
+    """
+    Cria (uma vez por cliente e operação) o decodificador a partir do
+    schema de saída da operação no WSDL já carregado pelo Zeep.
+    """
+    operacao_wsdl = client.service._binding.get(operacao)
+    # Document/literal "wrapped": <Operacao>Response -> <Operacao>Result
+    _, elemento_resultado = operacao_wsdl.output.body.type.elements[0]
+    return DecodificadorResposta(operacao, elemento_resultado.type)
@@ -0,0 +1,144 @@
+# src/soap_envelope.py
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+import zeep
+from lxml import etree
+from zeep.wsdl.utils import etree_to_string
+
+# Caminho de um argumento no payload (ex: ('protocolo', 'protocoloIntegracaoCarga'))
+CaminhoArgumento = Tuple[str, ...]
+
+# Marcadores (caracteres de uso privado, válidos em XML) que reservam no
+# envelope renderizado pelo Zeep a posição do token e de cada argumento
+_MARCADOR = '\ue000{}\ue001'
+_PADRAO_MARCADOR = re.compile('\ue000(\\d+)\ue001'.encode('utf-8'))
+
+# Caracteres que o lxml (e portanto o Zeep) recusa em texto XML
+_PADRAO_INVALIDO_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+
+def _escapar(valor: Any) -> bytes:
+    """
+    Escapa um valor como o lxml faz no texto de um elemento: &, <, > e \\r
+    (que, literal, o parser do SGT normalizaria para \\n).
+    """
+    texto = str(valor)
+    if _PADRAO_INVALIDO_XML.search(texto):
+        raise ValueError("All strings must be XML compatible: Unicode or ASCII, no NULL bytes or control characters")
+    return escape(texto, {'\r': '&#13;'}).encode('utf-8')
+
+def caminhos_argumentos(argumentos: Dict[str, Any], prefixo: CaminhoArgumento = ()) -> Optional[Tuple[CaminhoArgumento, ...]]:
+    """
+    Formato do payload: caminho de cada valor folha, na ordem dos argumentos.
+    Dois payloads com o mesmo formato usam o mesmo modelo de envelope.
+    Retorna None se alguma folha não for str/int (ex: None, que o Zeep
+    omite do envelope): nesse caso o payload não usa modelo.
+    """
+    caminhos: List[CaminhoArgumento] = []
+    for nome, valor in argumentos.items():
+        if isinstance(valor, dict):
+            filhos = caminhos_argumentos(valor, prefixo + (nome,))
+            if filhos is None:
+                return None
+            caminhos.extend(filhos)
+        elif isinstance(valor, (str, int)) and not isinstance(valor, bool):
+            caminhos.append(prefixo + (nome,))
+        else:
+            return None
+    return tuple(caminhos)
+
+def _valor(argumentos: Dict[str, Any], caminho: CaminhoArgumento) -> Any:
+    valor: Any = argumentos
+    for chave in caminho:
+        valor = valor[chave]
+    return valor
+
+def criar_header_token(token: str) -> etree._Element:
+    """
+    Cria o Header SOAP com o Token dinâmico.
+    """
+    header = etree.Element(
+        '{Token}Token',
+        xmlns="Token"
+    )
+    header.text = token
+    return header
+
+class ModeloEnvelope:
+    """
+    Envelope SOAP de uma operação pré-renderizado em bytes: o Zeep monta
+    o envelope uma única vez (a partir do WSDL em cache) com marcadores no
+    lugar do token e dos argumentos, já com SOAPAction, namespaces e
+    endpoint resolvidos. Na chamada, só os valores são escapados e
+    concatenados entre os trechos fixos.
+    """
+
+    def __init__(self, operacao: str, endereco: str, cabecalhos_http: Dict[str, str],
+                 partes: List[bytes], posicoes: List[int], caminhos: Tuple[CaminhoArgumento, ...]):
+        self.operacao = operacao
+        self.endereco = endereco
+        self.cabecalhos_http = cabecalhos_http
+        # partes[0] + valor(posicoes[0]) + partes[1] + ... + partes[-1]
+        self._partes = partes
+        # 0 = token, i > 0 = argumento caminhos[i - 1]
+        self._posicoes = posicoes
+        self._caminhos = caminhos
+
+    def montar(self, token: str, argumentos: Dict[str, Any]) -> bytes:
+        """
+        Gera o corpo da requisição para o token e os argumentos informados
+        (com o mesmo formato usado para compilar o modelo).
+        """
+        valores = [token] + [_valor(argumentos, caminho) for caminho in self._caminhos]
+        partes = self._partes
+        corpo = [partes[0]]
+        for i, posicao in enumerate(self._posicoes):
+            corpo.append(_escapar(valores[posicao]))
+            corpo.append(partes[i + 1])
+        return b''.join(corpo)
+
+@lru_cache(maxsize=128)
+def obter_modelo_envelope(client: zeep.Client, operacao: str, caminhos: Tuple[CaminhoArgumento, ...]) -> Optional[ModeloEnvelope]:
+    """
+    Compila (uma vez por cliente, operação e formato de payload) o modelo
+    de envelope. Retorna None se a operação não puder ser pré-renderizada
+    (ex: o schema rejeita os marcadores); o chamador usa então o Zeep.
+    """
+    # Payload com um marcador em cada folha; marcador 0 é o token
+    argumentos: Dict[str, Any] = {}
+    for indice, caminho in enumerate(caminhos, start=1):
+        destino = argumentos
+        for chave in caminho[:-1]:
+            destino = destino.setdefault(chave, {})
+        destino[caminho[-1]] = _MARCADOR.format(indice)
+
+    servico = client.service
+    try:
+        envelope, cabecalhos_http = servico._binding._create(
+            operacao, (), dict(argumentos, _soapheaders=[criar_header_token(_MARCADOR.format(0))]),
+            client=client, options=servico._binding_options
+        )
+        conteudo = etree_to_string(envelope)
+    except Exception as e:
+        print(f"[SOAP] Não foi possível pré-compilar o envelope de {operacao}: {e}")
+        return None
+
+    # re.split com grupo alterna trechos fixos e índices dos marcadores
+    pedacos = _PADRAO_MARCADOR.split(conteudo)
+    partes = pedacos[0::2]
+    posicoes = [int(indice) for indice in pedacos[1::2]]
+    if sorted(posicoes) != list(range(len(caminhos) + 1)):
+        # Algum valor foi transformado/omitido pelo Zeep: não dá para usar o modelo
+        print(f"[SOAP] Envelope de {operacao} não pôde ser pré-compilado (marcadores alterados).")
+        return None
+
+    print(f"[SOAP] Envelope de {operacao} pré-compilado ({len(conteudo)} bytes)")
+    return ModeloEnvelope(
+        operacao=operacao,
+        endereco=servico._binding_options['address'],
+        cabecalhos_http=dict(cabecalhos_http),
+        partes=partes,
+        posicoes=posicoes,
+        caminhos=caminhos,
+    )
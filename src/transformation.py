@@ -1,6 +1,8 @@
 # src/transformation.py
 from typing import List, Optional, Any, Dict
-from .models import Carregamento, Pedido, ItemPedido, Participante, DadosNotaFiscal, NotaFiscalDetalhe
+from .models import Carregamento, Pedido, ItemPedido, Participante, DadosNotaFiscal, NotaFiscalDetalhe, classe_modelo
+from .selection import Selecao
+from .field_mapping import MapeamentoCompilado, str_ou_vazio
 
 def safe_get(data: Dict, *keys: Any) -> Optional[Any]:
     """
@@ -26,10 +28,161 @@ def safe_get(data: Dict, *keys: Any) -> Optional[Any]:
             return None
     return temp
 
-def transformar_carga_integracao(carga_integracao: List[Dict]) -> Optional[Carregamento]:
+# --- Mapeamentos campo GraphQL -> caminho no dict SOAP ---
+# Tabelas declarativas compiladas na importação (ver field_mapping.py).
+# A transformação só calcula os campos presentes na seleção do cliente
+# (selecao=None calcula todos). Com MODELOS_COMPACTOS, os modelos são
+# as versões com __slots__ (ver models.classe_compacta).
+
+CARREGAMENTO = MapeamentoCompilado('Carregamento', classe_modelo(Carregamento), {
+    'numeroCarga': (('NumeroCarga',), None),
+    'filial': (('Filial', 'CodigoIntegracao'), None),
+    'protocoloCarga': (('ProtocoloCarga',), None),
+    # Motoristas é um OrderedDict com estrutura: {'Motorista': [{...}, {...}]}
+    # Similar a Produtos, precisamos acessar a chave 'Motorista' que contém a lista
+    'cpfMotorista': (('Motoristas', 'Motorista', 0, 'CPF'), None),
+    'nomeMotorista': (('Motoristas', 'Motorista', 0, 'Nome'), None),
+    'modeloVeicular': (('ModeloVeicular', 'CodigoIntegracao'), None),
+    'placaVeiculo': (('Veiculo', 'Placa'), None),
+    'tipoOperacao': (('TipoOperacao', 'CodigoIntegracao'), None),
+    'tipoVeiculo': (('Veiculo', 'TipoVeiculo'), str_ou_vazio),
+    'transportador': (('TransportadoraEmitente', 'CNPJ'), None),
+})
+
+PEDIDO = MapeamentoCompilado('Pedido', classe_modelo(Pedido), {
+    'codFilial': (('Filial', 'CodigoIntegracao'), None),
+    'numeroPedidoEmbarcador': (('NumeroPedidoEmbarcador',), None),
+    'protocoloPedido': (('ProtocoloPedido',), None),
+    'codigoRota': (('CodigoIntegracaoRota',), None),
+    'dataInicioCarregamento': (('DataInicioCarregamento',), str_ou_vazio),
+    'dataPrevisaoEntrega': (('DataPrevisaoEntrega',), str_ou_vazio),
+    'observacao': (('Observacao',), None),
+    'ordemEntrega': (('OrdemEntrega',), None),
+    'pesoBruto': (('PesoBruto',), None),
+    'tipoCarga': (('TipoCargaEmbarcador', 'CodigoIntegracao'), None),
+    'tipoOperacao': (('TipoOperacao', 'CodigoIntegracao'), None),
+    'tipoPedido': (('TipoPedido',), str_ou_vazio),
+    'vendedor': (('Vendedor',), None),
+})
+
+# Relativo ao Remetente/Destinatario
+PARTICIPANTE = MapeamentoCompilado('Participante', classe_modelo(Participante), {
+    'bairro': (('Endereco', 'Bairro'), None),
+    'cep': (('Endereco', 'CEP'), None),
+    'cidade': (('Endereco', 'Cidade', 'Descricao'), None),
+    'cnpj': (('CPFCNPJ',), None),
+    'descricao': (('NomeFantasia',), None),
+    'endereco': (('Endereco', 'Logradouro'), None),
+    'estado': (('Endereco', 'Cidade', 'SiglaUF'), None),
+    'ibge': (('Endereco', 'Cidade', 'IBGE'), None),
+    'ie': (('RGIE',), None),
+    'logradouro': (('Endereco', 'Logradouro'), None),
+    'numero': (('Endereco', 'Numero'), None),
+    'razaoSocial': (('RazaoSocial',), None),
+})
+
+ITEM_PEDIDO = MapeamentoCompilado('ItemPedido', classe_modelo(ItemPedido), {
+    'codigoGrupoProduto': (('CodigoGrupoProduto',), None),
+    'codigoProduto': (('CodigoProduto',), None),
+    'codigoNcm': (('CodigoNCM',), None),
+    'descricaoGrupoProduto': (('DescricaoGrupoProduto',), None),
+    'descricaoProduto': (('DescricaoProduto',), None),
+    'metroCubico': (('MetroCubito',), None), # Atenção ao 'MetroCubito'
+    'pesoUnitario': (('PesoUnitario',), None),
+    'quantidade': (('Quantidade',), None),
+    'valorUnitario': (('ValorUnitario',), None),
+})
+
+NOTA_FISCAL = MapeamentoCompilado('DadosNotaFiscal', classe_modelo(DadosNotaFiscal), {
+    'protocoloPedido': (('ProtocoloPedido',), None),
+    'chaveAcesso': (('Chave',), None),
+    'cnpjExpedidor': (('Emitente', 'CPFCNPJ'), None),
+    'cnpjRecebedor': (('Destinatario', 'CPFCNPJ'), None),
+    'dataEmissao': (('DataEmissao',), None),
+    'numero': (('Numero',), None),
+    'serie': (('Serie',), None),
+    'pesoBruto': (('PesoBruto',), None),
+    'pesoLiquido': (('PesoLiquido',), None),
+    'situacao': (('SituacaoNFeSefaz',), str_ou_vazio),
+    'valor': (('Valor',), None),
+})
+
+NOTA_FISCAL_DETALHE = MapeamentoCompilado('NotaFiscalDetalhe', classe_modelo(NotaFiscalDetalhe), {
+    'chaveAcesso': (('ChaveNFe',), None),
+    'xml': (('XML',), None),
+})
+
+# Campos do Endereco que, junto com o CPFCNPJ, identificam um participante
+_CAMINHOS_ENDERECO = (
+    ('Logradouro',), ('Numero',), ('Bairro',), ('CEP',),
+    ('Cidade', 'Descricao'), ('Cidade', 'IBGE'), ('Cidade', 'SiglaUF'),
+)
+# Campos descritivos do produto, compartilhados entre itens do mesmo CodigoProduto
+_CAMPOS_PRODUTO = ('codigoGrupoProduto', 'codigoNcm', 'descricaoGrupoProduto', 'descricaoProduto')
+
+def transformar_participante(pedido_soap: Optional[Dict], chave: str, selecao: Optional[Selecao] = None,
+                             internados: Optional[Dict] = None) -> Participante:
+    """
+    Monta o Participante (expedidor/recebedor) a partir do 'Remetente'
+    ou 'Destinatario' de uma linha CargaIntegracao.
+    Com 'internados' (dict por requisição), participantes com o mesmo
+    CPFCNPJ e endereço (e a mesma seleção) são uma única instância.
+    """
+    pessoa = pedido_soap.get(chave) if isinstance(pedido_soap, dict) else None
+    if internados is None or not isinstance(pessoa, dict) or pessoa.get('CPFCNPJ') is None:
+        return PARTICIPANTE.construir(pessoa, selecao)
+
+    endereco = pessoa.get('Endereco')
+    chave_interna = (
+        'participante',
+        frozenset(selecao) if selecao is not None else None,
+        pessoa['CPFCNPJ'],
+        tuple(safe_get(endereco, *caminho) for caminho in _CAMINHOS_ENDERECO),
+    )
+    participante = internados.get(chave_interna)
+    if participante is None:
+        participante = internados[chave_interna] = PARTICIPANTE.construir(pessoa, selecao)
+    return participante
+
+def transformar_itens_pedido(pedido_soap: Optional[Dict], selecao: Optional[Selecao] = None,
+                             internados: Optional[Dict] = None) -> List[ItemPedido]:
+    """
+    Monta os ItemPedido a partir dos Produtos de uma linha CargaIntegracao.
+    Com 'internados' (dict por requisição), itens do mesmo CodigoProduto
+    compartilham os textos descritivos do produto (descrição, grupo, NCM).
+    """
+    itens_pedido = []
+    # Produtos é um OrderedDict com estrutura: {'Produto': [{...}, {...}]}
+    # Precisamos acessar a chave 'Produto' que contém a lista
+    produtos = safe_get(pedido_soap, 'Produtos', 'Produto')
+
+    if produtos and isinstance(produtos, list):
+        construir = ITEM_PEDIDO.construtor(selecao)
+        for a in produtos:
+            item = construir(a)
+            if internados is not None and isinstance(a, dict) and a.get('CodigoProduto') is not None:
+                _internar_produto(item, a['CodigoProduto'], internados)
+            itens_pedido.append(item)
+
+    return itens_pedido
+
+def _internar_produto(item: ItemPedido, codigo_produto: Any, internados: Dict) -> None:
+    chave_interna = ('produto', codigo_produto)
+    valores = tuple(getattr(item, campo) for campo in _CAMPOS_PRODUTO)
+    compartilhados = internados.get(chave_interna)
+    if compartilhados is None:
+        internados[chave_interna] = valores
+    elif compartilhados == valores:
+        for campo, valor in zip(_CAMPOS_PRODUTO, compartilhados):
+            setattr(item, campo, valor)
+
+def transformar_carga_integracao(carga_integracao: List[Dict], selecao: Optional[Selecao] = None) -> Optional[Carregamento]:
     """
     Transforma a resposta plana do SOAP (List<CargaIntegracao>)
     em um objeto 'Carregamento' aninhado.
+    Com 'selecao' (ver selection.selecao_campos), só monta os campos
+    pedidos pelo cliente; expedidor, recebedor e itensPedido de cada
+    Pedido são sempre montados sob demanda pelos seus resolvers.
     """
     if not carga_integracao:
         return None
@@ -38,92 +191,12 @@ def transformar_carga_integracao(carga_integracao: List[Dict]) -> Optional[Carre
         # 1. Obter dados do Cabeçalho (do primeiro item da lista)
         linha = carga_integracao[0]
 
-        carregamento = Carregamento(
-            numeroCarga=safe_get(linha, 'NumeroCarga'),
-            filial=safe_get(linha, 'Filial', 'CodigoIntegracao'),
-            protocoloCarga=safe_get(linha, 'ProtocoloCarga'),
-            # Motoristas é um OrderedDict com estrutura: {'Motorista': [{...}, {...}]}
-            # Similar a Produtos, precisamos acessar a chave 'Motorista' que contém a lista
-            cpfMotorista=safe_get(linha, 'Motoristas', 'Motorista', 0, 'CPF'),
-            nomeMotorista=safe_get(linha, 'Motoristas', 'Motorista', 0, 'Nome'),
-            modeloVeicular=safe_get(linha, 'ModeloVeicular', 'CodigoIntegracao'),
-            placaVeiculo=safe_get(linha, 'Veiculo', 'Placa'),
-            tipoOperacao=safe_get(linha, 'TipoOperacao', 'CodigoIntegracao'),
-            tipoVeiculo=str(safe_get(linha, 'Veiculo', 'TipoVeiculo') or ''),
-            transportador=safe_get(linha, 'TransportadoraEmitente', 'CNPJ'),
-            pedidos=[]
-        )
+        carregamento = CARREGAMENTO.construir(linha, selecao, dados_soap=linha)
 
         # 2. Iterar sobre TODOS os itens para montar a lista de Pedidos
-        for p in carga_integracao:
-            expedidor = Participante(
-                bairro=safe_get(p, 'Remetente', 'Endereco', 'Bairro'),
-                cep=safe_get(p, 'Remetente', 'Endereco', 'CEP'),
-                cidade=safe_get(p, 'Remetente', 'Endereco', 'Cidade', 'Descricao'),
-                cnpj=safe_get(p, 'Remetente', 'CPFCNPJ'),
-                descricao=safe_get(p, 'Remetente', 'NomeFantasia'),
-                endereco=safe_get(p, 'Remetente', 'Endereco', 'Logradouro'),
-                estado=safe_get(p, 'Remetente', 'Endereco', 'Cidade', 'SiglaUF'),
-                ibge=safe_get(p, 'Remetente', 'Endereco', 'Cidade', 'IBGE'),
-                ie=safe_get(p, 'Remetente', 'RGIE'),
-                logradouro=safe_get(p, 'Remetente', 'Endereco', 'Logradouro'),
-                numero=safe_get(p, 'Remetente', 'Endereco', 'Numero'),
-                razaoSocial=safe_get(p, 'Remetente', 'RazaoSocial')
-            )
-
-            recebedor = Participante(
-                bairro=safe_get(p, 'Destinatario', 'Endereco', 'Bairro'),
-                cep=safe_get(p, 'Destinatario', 'Endereco', 'CEP'),
-                cidade=safe_get(p, 'Destinatario', 'Endereco', 'Cidade', 'Descricao'),
-                cnpj=safe_get(p, 'Destinatario', 'CPFCNPJ'),
-                descricao=safe_get(p, 'Destinatario', 'NomeFantasia'),
-                endereco=safe_get(p, 'Destinatario', 'Endereco', 'Logradouro'),
-                estado=safe_get(p, 'Destinatario', 'Endereco', 'Cidade', 'SiglaUF'),
-                ibge=safe_get(p, 'Destinatario', 'Endereco', 'Cidade', 'IBGE'),
-                ie=safe_get(p, 'Destinatario', 'RGIE'),
-                logradouro=safe_get(p, 'Destinatario', 'Endereco', 'Logradouro'),
-                numero=safe_get(p, 'Destinatario', 'Endereco', 'Numero'),
-                razaoSocial=safe_get(p, 'Destinatario', 'RazaoSocial')
-            )
-
-            itens_pedido = []
-            # Produtos é um OrderedDict com estrutura: {'Produto': [{...}, {...}]}
-            # Precisamos acessar a chave 'Produto' que contém a lista
-            produtos = safe_get(p, 'Produtos', 'Produto')
-
-            if produtos and isinstance(produtos, list):
-                for a in produtos:
-                    itens_pedido.append(ItemPedido(
-                        codigoGrupoProduto=safe_get(a, 'CodigoGrupoProduto'),
-                        codigoProduto=safe_get(a, 'CodigoProduto'),
-                        codigoNcm=safe_get(a, 'CodigoNCM'),
-                        descricaoGrupoProduto=safe_get(a, 'DescricaoGrupoProduto'),
-                        descricaoProduto=safe_get(a, 'DescricaoProduto'),
-                        metroCubico=safe_get(a, 'MetroCubito'), # Atenção ao 'MetroCubito'
-                        pesoUnitario=safe_get(a, 'PesoUnitario'),
-                        quantidade=safe_get(a, 'Quantidade'),
-                        valorUnitario=safe_get(a, 'ValorUnitario')
-                    ))
-
-            pedido = Pedido(
-                codFilial=safe_get(p, 'Filial', 'CodigoIntegracao'),
-                numeroPedidoEmbarcador=safe_get(p, 'NumeroPedidoEmbarcador'),
-                protocoloPedido=safe_get(p, 'ProtocoloPedido'),
-                codigoRota=safe_get(p, 'CodigoIntegracaoRota'),
-                dataInicioCarregamento=str(safe_get(p, 'DataInicioCarregamento') or ''),
-                dataPrevisaoEntrega=str(safe_get(p, 'DataPrevisaoEntrega') or ''),
-                observacao=safe_get(p, 'Observacao'),
-                ordemEntrega=safe_get(p, 'OrdemEntrega'),
-                pesoBruto=safe_get(p, 'PesoBruto'),
-                tipoCarga=safe_get(p, 'TipoCargaEmbarcador', 'CodigoIntegracao'),
-                tipoOperacao=safe_get(p, 'TipoOperacao', 'CodigoIntegracao'),
-                tipoPedido=str(safe_get(p, 'TipoPedido') or ''),
-                vendedor=safe_get(p, 'Vendedor'),
-                expedidor=expedidor,
-                recebedor=recebedor,
-                itensPedido=itens_pedido
-            )
-            carregamento.pedidos.append(pedido)
+        if selecao is None or 'pedidos' in selecao:
+            construir_pedido = PEDIDO.construtor(selecao['pedidos'] if selecao is not None else None)
+            carregamento.pedidos = [construir_pedido(p, dados_soap=p) for p in carga_integracao]
 
         return carregamento
 
@@ -131,35 +204,20 @@ def transformar_carga_integracao(carga_integracao: List[Dict]) -> Optional[Carre
         print(f"Erro catastrófico ao transformar dados: {e}")
         return None
 
-def transformar_nota_fiscal(notas: List[Dict], protocolo_carga_str: str) -> List[DadosNotaFiscal]:
+def transformar_nota_fiscal(notas: List[Dict], protocolo_carga_str: str, selecao: Optional[Selecao] = None) -> List[DadosNotaFiscal]:
     """
     Transforma a resposta do SOAP (List<NotaFiscal>)
     em uma lista de 'DadosNotaFiscal', baseado na lógica C#.
+    Com 'selecao', só calcula os campos pedidos pelo cliente.
     """
     if not notas:
         return []
 
     try:
-        lista_transformada = []
-        for x in notas:
-            # Mapeamento baseado no transformer C#
-            nota = DadosNotaFiscal(
-                protocoloCarga=protocolo_carga_str, # O protocolo passado para a função
-                protocoloPedido=safe_get(x, 'ProtocoloPedido'),
-                chaveAcesso=safe_get(x, 'Chave'),
-                cnpjExpedidor=safe_get(x, 'Emitente', 'CPFCNPJ'),
-                cnpjRecebedor=safe_get(x, 'Destinatario', 'CPFCNPJ'),
-                dataEmissao=safe_get(x, 'DataEmissao'),
-                numero=safe_get(x, 'Numero'),
-                serie=safe_get(x, 'Serie'),
-                pesoBruto=safe_get(x, 'PesoBruto'),
-                pesoLiquido=safe_get(x, 'PesoLiquido'),
-                situacao=str(safe_get(x, 'SituacaoNFeSefaz') or ''),
-                valor=safe_get(x, 'Valor')
-            )
-            lista_transformada.append(nota)
-
-        return lista_transformada
+        # Mapeamento baseado no transformer C#
+        construir = NOTA_FISCAL.construtor(selecao)
+        # O protocoloCarga é o protocolo passado para a função
+        return [construir(x, protocoloCarga=protocolo_carga_str) for x in notas]
 
     except Exception as e:
         print(f"Erro catastrófico ao transformar dados da Nota Fiscal: {e}")
@@ -175,10 +233,7 @@ def transformar_nota_fiscal_detalhe(nota: Dict) -> Optional[NotaFiscalDetalhe]:
 
     try:
         # Lógica de transformação simples: ChaveAcesso e Xml
-        return NotaFiscalDetalhe(
-            chaveAcesso=safe_get(nota, 'ChaveNFe'),
-            xml=safe_get(nota, 'XML')
-        )
+        return NOTA_FISCAL_DETALHE.construir(nota)
     except Exception as e:
         print(f"Erro catastrófico ao transformar dados do detalhe da Nota Fiscal: {e}")
         return None # Retorna null em caso de erro
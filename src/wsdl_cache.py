@@ -0,0 +1,124 @@
+# src/wsdl_cache.py
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Optional
+from zeep.cache import Base
+from . import config
+from . import metrics
+
+class CacheDiscoWSDL(Base):
+    """
+    Cache em disco dos documentos WSDL/XSD baixados pelo Zeep.
+
+    O diretório é compartilhado por todos os workers (e sobrevive a restarts),
+    então um worker novo monta o cliente sem buscar nada na rede.
+    Cada documento é gravado com um arquivo de metadados contendo a URL,
+    o instante de gravação e o SHA-256 do conteúdo, validado a cada leitura.
+    """
+
+    def __init__(self, diretorio: str, ttl_segundos: int):
+        self.diretorio = diretorio
+        self.ttl_segundos = ttl_segundos
+        os.makedirs(self.diretorio, exist_ok=True)
+
+    def _caminhos(self, url: str):
+        nome = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.diretorio, nome)
+        return base + '.xml', base + '.json'
+
+    def _gravar_atomico(self, caminho: str, conteudo: bytes) -> None:
+        # Grava em arquivo temporário e renomeia: leitores de outros
+        # processos nunca enxergam um arquivo pela metade.
+        fd, temporario = tempfile.mkstemp(dir=self.diretorio, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as arquivo:
+                arquivo.write(conteudo)
+            os.replace(temporario, caminho)
+        except Exception:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
+    def _remover(self, *caminhos: str) -> None:
+        for caminho in caminhos:
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+
+    def add(self, url: str, content: bytes) -> None:
+        """
+        Grava o documento e seus metadados no diretório de cache.
+        """
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+
+        caminho_xml, caminho_meta = self._caminhos(url)
+        meta = {
+            'url': url,
+            'sha256': hashlib.sha256(content).hexdigest(),
+            'gravado_em': time.time()
+        }
+        try:
+            self._gravar_atomico(caminho_xml, content)
+            self._gravar_atomico(caminho_meta, json.dumps(meta).encode('utf-8'))
+            metrics.incrementar('wsdl_cache.gravacoes')
+        except OSError as e:
+            print(f"[WSDL Cache] Falha ao gravar {url} em disco: {e}")
+            metrics.incrementar('wsdl_cache.erros')
+
+    def get(self, url: str) -> Optional[bytes]:
+        """
+        Retorna o documento cacheado, ou None se ausente, expirado ou corrompido.
+        """
+        caminho_xml, caminho_meta = self._caminhos(url)
+        try:
+            with open(caminho_meta, 'rb') as arquivo:
+                meta = json.loads(arquivo.read())
+            with open(caminho_xml, 'rb') as arquivo:
+                conteudo = arquivo.read()
+        except (OSError, ValueError):
+            metrics.incrementar('wsdl_cache.misses')
+            return None
+
+        # 1. Validar TTL
+        if self.ttl_segundos > 0 and time.time() - meta.get('gravado_em', 0) > self.ttl_segundos:
+            print(f"[WSDL Cache] Documento expirado: {url}")
+            metrics.incrementar('wsdl_cache.expirados')
+            metrics.incrementar('wsdl_cache.misses')
+            self._remover(caminho_xml, caminho_meta)
+            return None
+
+        # 2. Validar integridade (hash do conteúdo)
+        if meta.get('url') != url or hashlib.sha256(conteudo).hexdigest() != meta.get('sha256'):
+            print(f"[WSDL Cache] Documento inválido (hash divergente): {url}")
+            metrics.incrementar('wsdl_cache.invalidos')
+            metrics.incrementar('wsdl_cache.misses')
+            self._remover(caminho_xml, caminho_meta)
+            return None
+
+        metrics.incrementar('wsdl_cache.hits')
+        return conteudo
+
+_cache_wsdl: Optional[CacheDiscoWSDL] = None
+
+def get_wsdl_cache() -> Optional[CacheDiscoWSDL]:
+    """
+    Retorna o cache em disco compartilhado (ou None se desabilitado).
+    """
+    global _cache_wsdl
+    if not config.WSDL_CACHE_HABILITADO:
+        return None
+    if _cache_wsdl is None:
+        try:
+            _cache_wsdl = CacheDiscoWSDL(
+                diretorio=config.WSDL_CACHE_DIR,
+                ttl_segundos=config.WSDL_CACHE_TTL
+            )
+        except OSError as e:
+            print(f"[WSDL Cache] Não foi possível usar {config.WSDL_CACHE_DIR}: {e}")
+            return None
+    return _cache_wsdl
@@ -0,0 +1,29 @@
+# tests/conftest.py
+from pathlib import Path
+import pytest
+import zeep
+
+WSDL_TESTE = Path(__file__).parent / 'fixtures' / 'sgt.wsdl'
+
+@pytest.fixture(scope='session')
+def cliente():
+    """
+    Cliente Zeep sobre um WSDL local com o mesmo formato do SGT
+    (operações e tipos usados pela fachada).
+    """
+    return zeep.Client(wsdl=str(WSDL_TESTE))
+
+def resposta_soap(operacao: str, resultado: str) -> bytes:
+    """
+    Envelope de resposta do SGT (WCF) para a operação com o XML interno
+    do <Operacao>Result; o prefixo i: (xsi) fica disponível para i:nil.
+    """
+    return (
+        '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">'
+        '<s:Body>'
+        f'<{operacao}Response xmlns="http://tempuri.org/">'
+        f'<{operacao}Result xmlns:i="http://www.w3.org/2001/XMLSchema-instance">{resultado}</{operacao}Result>'
+        f'</{operacao}Response>'
+        '</s:Body>'
+        '</s:Envelope>'
+    ).encode('utf-8')
@@ -0,0 +1,127 @@
+# tests/test_admission.py
+import asyncio
+import json
+import pytest
+import strawberry
+from src import admission, config
+from src.admission import AdmissaoMiddleware, _prioridade
+from src.resolvers import Query
+
+SCHEMA = strawberry.Schema(query=Query)._schema
+
+@pytest.fixture(autouse=True)
+def limites(monkeypatch):
+    monkeypatch.setattr(config, 'ADMISSAO_LIMITE_POR_PRIORIDADE', {'lote': 1.0, 'normal': 1.5, 'interativa': 2.5})
+    monkeypatch.setattr(config, 'ADMISSAO_RETRY_AFTER', 2.0)
+    monkeypatch.setattr(config, 'ADMISSAO_CHAMADAS_CONSULTA_CARA', 5)
+    monkeypatch.setattr(config, 'ESCALONADOR_PRIORIDADE_PADRAO', 'normal')
+
+def _corpo(consulta: str, variaveis=None) -> bytes:
+    return json.dumps({'query': consulta, 'variables': variaveis}).encode('utf-8')
+
+def _requisitar(pressao: float, corpo: bytes, prioridade=None, monkeypatch=None):
+    """
+    Envia um POST /graphql pelo middleware (em partes) e retorna
+    (mensagens enviadas ao cliente, corpo recebido pela aplicação ou None).
+    """
+    monkeypatch.setattr(admission.monitor, 'pressao', lambda: pressao)
+    recebido = []
+
+    async def aplicacao(scope, receive, send):
+        partes = []
+        while True:
+            mensagem = await receive()
+            partes.append(mensagem.get('body', b''))
+            if not mensagem.get('more_body'):
+                break
+        recebido.append(b''.join(partes))
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b'{}'})
+
+    metade = len(corpo) // 2
+    entradas = [
+        {'type': 'http.request', 'body': corpo[:metade], 'more_body': True},
+        {'type': 'http.request', 'body': corpo[metade:], 'more_body': False},
+    ]
+
+    async def receive():
+        return entradas.pop(0)
+
+    enviadas = []
+
+    async def send(mensagem):
+        enviadas.append(mensagem)
+
+    headers = [(b'content-type', b'application/json')]
+    if prioridade:
+        headers.append((b'x-prioridade', prioridade.encode('latin-1')))
+    scope = {'type': 'http', 'method': 'POST', 'path': '/graphql', 'headers': headers}
+    asyncio.run(AdmissaoMiddleware(aplicacao, schema=SCHEMA)(scope, receive, send))
+    return enviadas, (recebido[0] if recebido else None)
+
+_BARATA = '{ buscarCarga(protocolo: "1") { numeroCarga } }'
+_CARA = 'query($p: [String!]!) { buscarCargas(protocolos: $p) { protocolo } }'
+_SEIS = {'p': ['1', '2', '3', '4', '5', '6']}
+
+def test_sem_pressao_nem_le_o_corpo(monkeypatch):
+    enviadas, recebido = _requisitar(0.5, _corpo(_CARA, _SEIS), monkeypatch=monkeypatch)
+    assert recebido == _corpo(_CARA, _SEIS)
+    assert enviadas[0]['status'] == 200
+
+def test_aceita_sob_pressao_repassa_o_corpo_intacto(monkeypatch):
+    corpo = _corpo(_BARATA)
+    enviadas, recebido = _requisitar(1.2, corpo, monkeypatch=monkeypatch)
+    assert recebido == corpo
+    assert enviadas[0]['status'] == 200
+
+def test_recusa_com_503_e_retry_after(monkeypatch):
+    enviadas, recebido = _requisitar(1.2, _corpo(_BARATA), prioridade='lote', monkeypatch=monkeypatch)
+    assert recebido is None
+    inicio, corpo = enviadas
+    assert inicio['status'] == 503
+    headers = dict(inicio['headers'])
+    # ceil(ADMISSAO_RETRY_AFTER * pressão) = ceil(2.4)
+    assert headers[b'retry-after'] == b'3'
+    assert headers[b'content-length'] == str(len(corpo['body'])).encode('latin-1')
+    assert json.loads(corpo['body'])['errors'][0]['message']
+
+def test_consulta_cara_desce_uma_classe(monkeypatch):
+    # normal -> lote (limite 1.0): recusada na pressão 1.2
+    enviadas, _ = _requisitar(1.2, _corpo(_CARA, _SEIS), monkeypatch=monkeypatch)
+    assert enviadas[0]['status'] == 503
+    # interativa -> normal (limite 1.5): aceita em 1.2, recusada em 1.6
+    enviadas, _ = _requisitar(1.2, _corpo(_CARA, _SEIS), prioridade='interativa', monkeypatch=monkeypatch)
+    assert enviadas[0]['status'] == 200
+    enviadas, _ = _requisitar(1.6, _corpo(_CARA, _SEIS), prioridade='interativa', monkeypatch=monkeypatch)
+    assert enviadas[0]['status'] == 503
+
+@pytest.mark.parametrize('consulta, variaveis', [
+    # Poucos protocolos: poucas chamadas ao SGT
+    (_CARA, {'p': ['1', '2']}),
+    # Nomes de campos caros em comentários e strings não contam
+    ('# buscarCargas todas: true\n{ buscarCarga(protocolo: "buscarCargas todas: true") { numeroCarga } }', None),
+])
+def test_consultas_baratas_mantem_a_classe(consulta, variaveis):
+    assert _prioridade({}, _corpo(consulta, variaveis), SCHEMA) == 'normal'
+
+@pytest.mark.parametrize('consulta, variaveis', [
+    (_CARA, _SEIS),
+    # Aliases dentro de fragmento
+    ('{ ...F } fragment F on Query { ' + ' '.join(
+        f'c{i}: buscarCarga(protocolo: "{i}") {{ numeroCarga }}' for i in range(5)) + ' }', None),
+    # todas passado por variável, com páginas pequenas
+    ('query($t: Boolean) { buscarNotasFiscaisVinculadas(protocoloCarga: "1", limite: 10, todas: $t) { chaveAcesso } }',
+     {'t': True}),
+])
+def test_consultas_caras_descem(consulta, variaveis):
+    assert _prioridade({}, _corpo(consulta, variaveis), SCHEMA) == 'lote'
+    assert _prioridade({b'x-prioridade': b'interativa'}, _corpo(consulta, variaveis), SCHEMA) == 'normal'
+
+@pytest.mark.parametrize('corpo', [b'nao e json', b'{"query": "{ buscarCargas("}', b'[]', b'{"query": 1}'])
+def test_corpo_invalido_nao_e_caro(corpo):
+    assert _prioridade({}, corpo, SCHEMA) == 'normal'
+
+def test_lote_de_consultas_soma_as_chamadas():
+    um = {'query': _CARA, 'variables': {'p': ['1', '2', '3']}}
+    assert _prioridade({}, json.dumps([um]).encode('utf-8'), SCHEMA) == 'normal'
+    assert _prioridade({}, json.dumps([um, um]).encode('utf-8'), SCHEMA) == 'lote'
@@ -0,0 +1,189 @@
+# tests/test_circuit_breaker.py
+import pytest
+from src import circuit_breaker, config, http_pool
+from src.circuit_breaker import ABERTO, FECHADO, MEIO_ABERTO, CircuitoAberto, Disjuntor
+
+class _Relogio:
+    def __init__(self):
+        self.agora = 1000.0
+
+    def __call__(self) -> float:
+        return self.agora
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = _Relogio()
+    monkeypatch.setattr(circuit_breaker.time, 'monotonic', relogio)
+    monkeypatch.setattr(config, 'CIRCUIT_BREAKER_FALHAS', 3)
+    monkeypatch.setattr(config, 'CIRCUIT_BREAKER_TEMPO_ABERTO', 30.0)
+    monkeypatch.setattr(config, 'CIRCUIT_BREAKER_SONDAS', 1)
+    return relogio
+
+def _falhar(disjuntor: Disjuntor, vezes: int) -> None:
+    for _ in range(vezes):
+        disjuntor.antes_da_chamada()
+        disjuntor.registrar(False)
+
+def _abrir(disjuntor: Disjuntor) -> None:
+    _falhar(disjuntor, config.CIRCUIT_BREAKER_FALHAS)
+    assert disjuntor.estado == ABERTO
+
+def test_abre_apos_falhas_consecutivas(relogio):
+    disjuntor = Disjuntor('sgt.teste')
+    _falhar(disjuntor, 2)
+    assert disjuntor.estado == FECHADO
+    _falhar(disjuntor, 1)
+    assert disjuntor.estado == ABERTO
+    assert disjuntor.aberto()
+    with pytest.raises(CircuitoAberto):
+        disjuntor.antes_da_chamada()
+
+def test_sucesso_zera_as_falhas(relogio):
+    disjuntor = Disjuntor('sgt.teste')
+    _falhar(disjuntor, 2)
+    disjuntor.antes_da_chamada()
+    disjuntor.registrar(True)
+    _falhar(disjuntor, 2)
+    assert disjuntor.estado == FECHADO
+
+def test_cancelada_nao_conta(relogio):
+    disjuntor = Disjuntor('sgt.teste')
+    _falhar(disjuntor, 2)
+    for _ in range(5):
+        disjuntor.antes_da_chamada()
+        disjuntor.registrar(None)
+    assert disjuntor.estado == FECHADO
+    assert disjuntor.falhas_consecutivas == 2
+
+def test_meio_aberto_depois_do_tempo_com_sonda_limitada(relogio):
+    disjuntor = Disjuntor('sgt.teste')
+    _abrir(disjuntor)
+    relogio.agora += 29.9
+    with pytest.raises(CircuitoAberto):
+        disjuntor.antes_da_chamada()
+
+    relogio.agora += 0.2
+    assert not disjuntor.aberto()
+    assert disjuntor.antes_da_chamada() is not None
+    assert disjuntor.estado == MEIO_ABERTO
+    # Só CIRCUIT_BREAKER_SONDAS chamadas passam enquanto a sonda está em voo
+    with pytest.raises(CircuitoAberto):
+        disjuntor.antes_da_chamada()
+
+def test_sonda_com_sucesso_fecha(relogio):
+    disjuntor = Disjuntor('sgt.teste')
+    _abrir(disjuntor)
+    relogio.agora += 31
+    disjuntor.registrar(True, disjuntor.antes_da_chamada())
+    assert disjuntor.estado == FECHADO
+    assert disjuntor.falhas_consecutivas == 0
+    assert disjuntor.antes_da_chamada() is None
+
+def test_sonda_com_falha_reabre(relogio):
+    disjuntor = Disjuntor('sgt.teste')
+    _abrir(disjuntor)
+    relogio.agora += 31
+    disjuntor.registrar(False, disjuntor.antes_da_chamada())
+    assert disjuntor.estado == ABERTO
+    # Reabre com novo prazo, a contar da falha da sonda
+    relogio.agora += 29
+    with pytest.raises(CircuitoAberto):
+        disjuntor.antes_da_chamada()
+    relogio.agora += 2
+    disjuntor.antes_da_chamada()
+    assert disjuntor.estado == MEIO_ABERTO
+
+def test_sonda_cancelada_libera_outra(relogio):
+    disjuntor = Disjuntor('sgt.teste')
+    _abrir(disjuntor)
+    relogio.agora += 31
+    disjuntor.registrar(None, disjuntor.antes_da_chamada())
+    assert disjuntor.estado == MEIO_ABERTO
+    disjuntor.registrar(True, disjuntor.antes_da_chamada())
+    assert disjuntor.estado == FECHADO
+
+def test_varias_sondas(relogio, monkeypatch):
+    monkeypatch.setattr(config, 'CIRCUIT_BREAKER_SONDAS', 2)
+    disjuntor = Disjuntor('sgt.teste')
+    _abrir(disjuntor)
+    relogio.agora += 31
+    disjuntor.antes_da_chamada()
+    disjuntor.antes_da_chamada()
+    with pytest.raises(CircuitoAberto):
+        disjuntor.antes_da_chamada()
+
+def test_sondas_de_um_ciclo_nao_prendem_vagas_no_seguinte(relogio, monkeypatch):
+    monkeypatch.setattr(config, 'CIRCUIT_BREAKER_SONDAS', 3)
+    disjuntor = Disjuntor('sgt.teste')
+    _abrir(disjuntor)
+    relogio.agora += 31
+    sondas = [disjuntor.antes_da_chamada() for _ in range(3)]
+    # Uma sonda falha e reabre o circuito; as outras terminam já no aberto
+    disjuntor.registrar(False, sondas[0])
+    assert disjuntor.estado == ABERTO
+    disjuntor.registrar(False, sondas[1])
+    disjuntor.registrar(None, sondas[2])
+    assert disjuntor.estado == ABERTO
+
+    relogio.agora += 31
+    novas = [disjuntor.antes_da_chamada() for _ in range(3)]
+    assert disjuntor.estado == MEIO_ABERTO
+    with pytest.raises(CircuitoAberto):
+        disjuntor.antes_da_chamada()
+    disjuntor.registrar(True, novas[0])
+    assert disjuntor.estado == FECHADO
+    # As sondas restantes terminam com o circuito fechado, sem efeito no contador
+    disjuntor.registrar(True, novas[1])
+    disjuntor.registrar(None, novas[2])
+    assert disjuntor.sondas_em_voo == 0
+
+def test_sonda_atrasada_nao_libera_vaga_do_novo_ciclo(relogio):
+    disjuntor = Disjuntor('sgt.teste')
+    _abrir(disjuntor)
+    relogio.agora += 31
+    antiga = disjuntor.antes_da_chamada()
+    # Falha de outra chamada reabre o circuito com a sonda ainda em voo
+    disjuntor.registrar(False)
+    relogio.agora += 31
+    nova = disjuntor.antes_da_chamada()
+    disjuntor.registrar(None, antiga)
+    with pytest.raises(CircuitoAberto):
+        disjuntor.antes_da_chamada()
+    disjuntor.registrar(True, nova)
+    assert disjuntor.estado == FECHADO
+
+def test_chamada_normal_nao_libera_vaga_de_sonda(relogio):
+    disjuntor = Disjuntor('sgt.teste')
+    # Chamada autorizada com o circuito fechado, que termina no meio-aberto
+    normal = disjuntor.antes_da_chamada()
+    assert normal is None
+    _abrir(disjuntor)
+    relogio.agora += 31
+    sonda = disjuntor.antes_da_chamada()
+    disjuntor.registrar(None, normal)
+    with pytest.raises(CircuitoAberto):
+        disjuntor.antes_da_chamada()
+    disjuntor.registrar(True, sonda)
+    assert disjuntor.estado == FECHADO
+
+def test_disjuntor_por_host(relogio, monkeypatch):
+    monkeypatch.setattr(circuit_breaker, '_disjuntores', {})
+    monkeypatch.setattr(config, 'CIRCUIT_BREAKER_HABILITADO', True)
+    url_a = 'https://a.sgt.teste/SGT.WebService/Cargas.svc?wsdl'
+    url_b = 'https://b.sgt.teste/SGT.WebService/Cargas.svc?wsdl'
+    assert circuit_breaker.obter_disjuntor(url_a) is circuit_breaker.obter_disjuntor(
+        'https://a.sgt.teste/SGT.WebService/NFe.svc?wsdl')
+    _abrir(circuit_breaker.obter_disjuntor(url_a))
+    assert circuit_breaker.circuito_aberto(url_a)
+    assert not circuit_breaker.circuito_aberto(url_b)
+    monkeypatch.setattr(config, 'CIRCUIT_BREAKER_HABILITADO', False)
+    assert not circuit_breaker.circuito_aberto(url_a)
+
+def test_disjuntor_usa_a_mesma_chave_do_pool(relogio, monkeypatch):
+    monkeypatch.setattr(circuit_breaker, '_disjuntores', {})
+    url = 'https://SGT.teste/SGT.WebService/Cargas.svc?wsdl'
+    disjuntor = circuit_breaker.obter_disjuntor(url)
+    # Porta padrão explícita e maiúsculas caem no mesmo host
+    assert disjuntor is circuit_breaker.obter_disjuntor('https://sgt.teste:443/SGT.WebService/NFe.svc?wsdl')
+    assert disjuntor.host == http_pool.chave_host(url)
+    assert disjuntor.nome == 'sgt.teste:443'
@@ -0,0 +1,93 @@
+# tests/test_hedge.py
+import asyncio
+import httpx
+import pytest
+from src import circuit_breaker, config, http_pool, soap_client
+
+ENDERECO = 'https://sgt.teste/SGT.WebService/Cargas.svc'
+ALTERNATIVO = 'https://sgt2.teste/SGT.WebService/Cargas.svc'
+WSDL = ENDERECO + '?wsdl'
+
+class _TransporteFalso:
+    """
+    Substitui http_pool.post: cada endereço responde com (atraso, status)
+    ou (atraso, exceção) e as chamadas são registradas.
+    """
+
+    def __init__(self, respostas):
+        self.respostas = respostas
+        self.chamadas = []
+
+    async def post(self, url, conteudo, headers):
+        self.chamadas.append(url)
+        atraso, resultado = self.respostas[url]
+        await asyncio.sleep(atraso)
+        if isinstance(resultado, Exception):
+            raise resultado
+        return httpx.Response(resultado, content=url.encode('utf-8'))
+
+@pytest.fixture
+def hedge(monkeypatch):
+    monkeypatch.setattr(config, 'HEDGE_HABILITADO', True)
+    monkeypatch.setattr(config, 'HEDGE_ORCAMENTO_PERCENTUAL', 100.0)
+    monkeypatch.setattr(config, 'HEDGE_HOSTS_ALTERNATIVOS', {'sgt.teste': 'sgt2.teste'})
+    monkeypatch.setattr(config, 'CIRCUIT_BREAKER_HABILITADO', False)
+    monkeypatch.setattr(config, 'TIMEOUT_ADAPTATIVO_HABILITADO', False)
+    # Duplicata disparada após 10 ms sem resposta
+    monkeypatch.setattr(circuit_breaker, 'percentil_latencia', lambda url, operacao, p: 0.01)
+    monkeypatch.setattr(soap_client, '_orcamento_hedge', soap_client._OrcamentoHedge())
+
+    def instalar(respostas):
+        transporte = _TransporteFalso(respostas)
+        monkeypatch.setattr(http_pool, 'post', transporte.post)
+        return transporte
+    return instalar
+
+def _chamar():
+    return asyncio.run(soap_client._post_com_hedge(WSDL, 'BuscarCarga', ENDERECO, b'<x/>', {}))
+
+@pytest.mark.parametrize('original, duplicata, vencedor', [
+    # Original lenta e válida, duplicata rápida: vale a duplicata
+    ((0.2, 200), (0.0, 200), ALTERNATIVO),
+    # 503 rápido da duplicata não vence a resposta válida mais lenta da original
+    ((0.1, 200), (0.0, 503), ENDERECO),
+    # Nem um erro de transporte
+    ((0.1, 200), (0.0, httpx.ConnectError('recusada')), ENDERECO),
+    # Original com 502 depois do disparo: a duplicata válida vence
+    ((0.02, 502), (0.1, 200), ALTERNATIVO),
+    # Original com SOAP Fault (500) é uma resposta válida
+    ((0.02, 500), (0.1, 200), ENDERECO),
+])
+def test_vence_a_primeira_resposta_valida(hedge, original, duplicata, vencedor):
+    transporte = hedge({ENDERECO: original, ALTERNATIVO: duplicata})
+    resposta = _chamar()
+    assert resposta.content == vencedor.encode('utf-8')
+    assert resposta.status_code not in (502, 503, 504)
+    assert transporte.chamadas == [ENDERECO, ALTERNATIVO]
+
+def test_as_duas_falham_vale_a_original(hedge):
+    hedge({ENDERECO: (0.05, 503), ALTERNATIVO: (0.0, 504)})
+    assert _chamar().status_code == 503
+
+    hedge({ENDERECO: (0.05, httpx.ReadError('caiu')), ALTERNATIVO: (0.0, 502)})
+    with pytest.raises(httpx.ReadError):
+        _chamar()
+
+def test_resposta_rapida_sem_duplicata(hedge):
+    transporte = hedge({ENDERECO: (0.0, 200), ALTERNATIVO: (0.0, 200)})
+    assert _chamar().content == ENDERECO.encode('utf-8')
+    assert transporte.chamadas == [ENDERECO]
+
+def test_orcamento_limita_as_duplicatas(hedge, monkeypatch):
+    monkeypatch.setattr(config, 'HEDGE_ORCAMENTO_PERCENTUAL', 25.0)
+    transporte = hedge({ENDERECO: (0.03, 200), ALTERNATIVO: (0.0, 200)})
+    for _ in range(12):
+        _chamar()
+    # 25% de 12 chamadas: no máximo 3 duplicatas
+    assert transporte.chamadas.count(ALTERNATIVO) == 3
+    assert transporte.chamadas.count(ENDERECO) == 12
+
+def test_operacao_fora_do_hedge(hedge):
+    transporte = hedge({ENDERECO: (0.03, 200), ALTERNATIVO: (0.0, 200)})
+    asyncio.run(soap_client._post_com_hedge(WSDL, 'BuscarCargaPorCodigosIntegracao', ENDERECO, b'<x/>', {}))
+    assert transporte.chamadas == [ENDERECO]
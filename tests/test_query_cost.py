@@ -0,0 +1,123 @@
+# tests/test_query_cost.py
+import asyncio
+import pytest
+import strawberry
+from graphql import GraphQLObjectType, get_named_type, parse
+from src import config
+from src.query_cost import LimiteCustoConsulta, estimar_consulta
+from src.resolvers import Query
+
+@pytest.fixture(autouse=True)
+def custos(monkeypatch):
+    monkeypatch.setattr(config, 'CUSTO_POR_CHAMADA_UPSTREAM', 100)
+    monkeypatch.setattr(config, 'CUSTO_PEDIDOS_POR_CARGA', 50)
+    monkeypatch.setattr(config, 'CUSTO_ITENS_POR_PEDIDO', 10)
+    monkeypatch.setattr(config, 'CUSTO_NFE_POR_CARGA', 100)
+    monkeypatch.setattr(config, 'CUSTO_ITENS_POR_NFE', 20)
+    monkeypatch.setattr(config, 'NFE_INDICE_TAMANHO_PAGINA', 100)
+    monkeypatch.setattr(config, 'NFE_PAGINACAO_MAX_PAGINAS', 200)
+
+@pytest.fixture(scope='module')
+def schema():
+    return strawberry.Schema(query=Query, extensions=[LimiteCustoConsulta])
+
+def _estimar(schema, consulta: str, variaveis=None):
+    return estimar_consulta(schema._schema, parse(consulta), None, variaveis)
+
+_CARGA_COM_ITENS = """
+{
+  buscarCarga(protocolo: "1") {
+    numeroCarga
+    pedidos { codFilial itensPedido { codigoProduto } }
+  }
+}
+"""
+
+def test_listas_multiplicam_o_custo(schema):
+    # 1 carga + numeroCarga (1) + 50 pedidos + codFilial (50)
+    # + 500 itens + codigoProduto (500) + 1 chamada (100)
+    assert _estimar(schema, _CARGA_COM_ITENS) == {'buscarCarga': {'custo': 1202, 'chamadasUpstream': 1}}
+
+def test_aliases_contam_separadamente(schema):
+    consulta = """
+    {
+      a: buscarCarga(protocolo: "1") { numeroCarga }
+      b: buscarCarga(protocolo: "2") { numeroCarga }
+    }
+    """
+    assert _estimar(schema, consulta) == {
+        'a': {'custo': 102, 'chamadasUpstream': 1},
+        'b': {'custo': 102, 'chamadasUpstream': 1},
+    }
+
+def test_buscar_cargas_conta_protocolos_distintos_e_nfe_por_carga(schema):
+    consulta = """
+    {
+      buscarCargas(protocolos: ["1", "2", "2"]) {
+        carga { numeroCarga notasFiscais { chaveAcesso } }
+      }
+    }
+    """
+    # 2 resultados + 2 cargas + 2 numeroCarga + 200 NF-e + 200 chaveAcesso;
+    # 2 chamadas de carga + 1 página de NF-e por carga
+    assert _estimar(schema, consulta) == {'buscarCargas': {'custo': 806, 'chamadasUpstream': 4}}
+
+def test_todas_as_paginas_de_nfe(schema):
+    consulta = '{ buscarNotasFiscaisVinculadas(protocoloCarga: "1", limite: 30, todas: true) { chaveAcesso } }'
+    # max(30, 100) notas + chaveAcesso; ceil(100 / 30) = 4 páginas
+    assert _estimar(schema, consulta) == {'buscarNotasFiscaisVinculadas': {'custo': 600, 'chamadasUpstream': 4}}
+
+def test_fragmentos_variaveis_e_skip(schema):
+    consulta = """
+    query Carga($protocolo: String!, $semPedidos: Boolean!) {
+      buscarCarga(protocolo: $protocolo) {
+        ...Basico
+        pedidos @skip(if: $semPedidos) { codFilial }
+      }
+    }
+    fragment Basico on Carregamento { numeroCarga filial }
+    """
+    com_pedidos = _estimar(schema, consulta, {'protocolo': '1', 'semPedidos': False})
+    sem_pedidos = _estimar(schema, consulta, {'protocolo': '1', 'semPedidos': True})
+    assert com_pedidos['buscarCarga']['custo'] == 1 + 2 + 50 + 50 + 100
+    assert sem_pedidos['buscarCarga']['custo'] == 1 + 2 + 100
+
+def test_custo_vai_nas_extensions(schema):
+    resultado = asyncio.run(schema.execute('{ __typename }'))
+    assert resultado.errors is None
+    assert resultado.extensions == {'custo': {
+        'total': 0, 'maximo': config.CUSTO_MAXIMO, 'chamadasUpstream': 0, 'camposRaiz': {},
+    }}
+
+def test_consulta_acima_do_maximo_recusada_sem_executar(schema, monkeypatch):
+    monkeypatch.setattr(config, 'CUSTO_MAXIMO', 1000)
+    resultado = asyncio.run(schema.execute(_CARGA_COM_ITENS))
+    assert resultado.data is None
+    assert [e.message for e in resultado.errors] == [
+        "Consulta muito cara: custo estimado 1202, máximo 1000. "
+        "Selecione menos campos, use menos aliases ou divida a consulta."
+    ]
+    assert resultado.extensions['custo']['total'] == 1202
+
+def _todos_os_campos(tipo: GraphQLObjectType) -> str:
+    campos = []
+    for nome, campo in tipo.fields.items():
+        subtipo = get_named_type(campo.type)
+        campos.append(f'{nome} {{ {_todos_os_campos(subtipo)} }}' if isinstance(subtipo, GraphQLObjectType) else nome)
+    return ' '.join(campos)
+
+def test_aliases_de_cargas_completas_recusados_no_padrao(schema):
+    # CUSTO_MAXIMO padrão (sem override): dez aliases de uma carga completa passam do limite
+    carga = _todos_os_campos(schema._schema.type_map['Carregamento'])
+    uma = f'{{ buscarCarga(protocolo: "1") {{ {carga} }} }}'
+    assert _estimar(schema, uma)['buscarCarga']['custo'] <= config.CUSTO_MAXIMO
+
+    dez = '{ ' + ' '.join(f'c{i}: buscarCarga(protocolo: "{i}") {{ {carga} }}' for i in range(10)) + ' }'
+    resultado = asyncio.run(schema.execute(dez))
+    assert resultado.data is None
+    assert resultado.errors[0].message.startswith('Consulta muito cara')
+
+def test_lote_enxuto_cabe_no_padrao(schema):
+    protocolos = ', '.join(f'"{i}"' for i in range(500))
+    consulta = f'{{ buscarCargas(protocolos: [{protocolos}]) {{ protocolo erro carga {{ numeroCarga protocoloCarga }} }} }}'
+    assert _estimar(schema, consulta)['buscarCargas']['custo'] <= config.CUSTO_MAXIMO
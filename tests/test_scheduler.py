@@ -0,0 +1,180 @@
+# tests/test_scheduler.py
+import asyncio
+import time
+import pytest
+from src import config
+from src.scheduler import INTERATIVA, LOTE, NORMAL, Escalonador, FilaCheia, PrazoExcedido
+
+WSDL = 'https://sgt.teste/SGT.WebService/Cargas.svc?wsdl'
+
+@pytest.fixture(autouse=True)
+def limites(monkeypatch):
+    monkeypatch.setattr(config, 'ESCALONADOR_MAX_POR_HOST', 1)
+    monkeypatch.setattr(config, 'ESCALONADOR_MAX_POR_TOKEN', 100)
+    monkeypatch.setattr(config, 'ESCALONADOR_FILA_MAX_POR_TOKEN', 100)
+    monkeypatch.setattr(config, 'ESCALONADOR_PESOS', {INTERATIVA: 8.0, NORMAL: 4.0, LOTE: 1.0})
+    monkeypatch.setattr(config, 'ESCALONADOR_DURACAO_INICIAL', 0.0)
+
+async def _ocupar(escalonador: Escalonador, token: str = 'ocupante'):
+    """
+    Ocupa a vaga do host até o evento retornado ser liberado.
+    """
+    liberar = asyncio.Event()
+    iniciou = asyncio.Event()
+
+    async def fabrica():
+        iniciou.set()
+        await liberar.wait()
+
+    tarefa = asyncio.ensure_future(escalonador.executar(WSDL, token, NORMAL, None, fabrica))
+    await iniciou.wait()
+    return liberar, tarefa
+
+async def _ordem_de_atendimento(pedidos):
+    """
+    Enfileira os pedidos (token, prioridade) com o host ocupado e retorna
+    a ordem em que foram executados.
+    """
+    escalonador = Escalonador()
+    liberar, ocupante = await _ocupar(escalonador)
+    ordem = []
+
+    def fabrica(rotulo):
+        async def executar():
+            ordem.append(rotulo)
+        return executar
+
+    tarefas = [
+        asyncio.ensure_future(escalonador.executar(WSDL, token, prioridade, None, fabrica(f'{token}:{prioridade}:{i}')))
+        for i, (token, prioridade) in enumerate(pedidos)
+    ]
+    await asyncio.sleep(0)
+    assert escalonador.profundidade_fila() == len(pedidos)
+    liberar.set()
+    await asyncio.gather(ocupante, *tarefas)
+    assert escalonador.profundidade_fila() == 0
+    assert escalonador.em_execucao() == 0
+    return ordem
+
+def test_interativa_passa_na_frente_do_lote():
+    pedidos = [('a', LOTE)] * 4 + [('a', INTERATIVA)] * 4
+    ordem = asyncio.run(_ordem_de_atendimento(pedidos))
+    assert [r.split(':')[1] for r in ordem] == [INTERATIVA] * 4 + [LOTE] * 4
+
+def test_classes_dividem_na_proporcao_dos_pesos():
+    # Peso 4 x 1: a cada 5 atendimentos, 4 normais e 1 lote
+    pedidos = [('a', LOTE)] * 10 + [('a', NORMAL)] * 40
+    ordem = asyncio.run(_ordem_de_atendimento(pedidos))
+    primeiros = [r.split(':')[1] for r in ordem[:25]]
+    assert primeiros.count(NORMAL) == 20
+    assert primeiros.count(LOTE) == 5
+
+def test_tokens_se_revezam_na_mesma_classe():
+    pedidos = [('a', NORMAL)] * 6 + [('b', NORMAL)] * 2
+    ordem = asyncio.run(_ordem_de_atendimento(pedidos))
+    tokens = [r.split(':')[0] for r in ordem]
+    assert tokens[:4] == ['a', 'b', 'a', 'b']
+
+def test_limite_por_token_nao_bloqueia_outros_tokens(monkeypatch):
+    monkeypatch.setattr(config, 'ESCALONADOR_MAX_POR_HOST', 10)
+    monkeypatch.setattr(config, 'ESCALONADOR_MAX_POR_TOKEN', 1)
+
+    async def cenario():
+        escalonador = Escalonador()
+        liberar, ocupante = await _ocupar(escalonador, 'a')
+
+        async def rapido():
+            return 'ok'
+
+        fila_a = asyncio.ensure_future(escalonador.executar(WSDL, 'a', NORMAL, None, rapido))
+        await asyncio.sleep(0)
+        assert escalonador.profundidade_fila() == 1
+        assert await escalonador.executar(WSDL, 'b', NORMAL, None, rapido) == 'ok'
+        assert not fila_a.done()
+        liberar.set()
+        await asyncio.gather(ocupante, fila_a)
+        assert fila_a.result() == 'ok'
+
+    asyncio.run(cenario())
+
+def test_fila_cheia(monkeypatch):
+    monkeypatch.setattr(config, 'ESCALONADOR_FILA_MAX_POR_TOKEN', 2)
+
+    async def cenario():
+        escalonador = Escalonador()
+        liberar, ocupante = await _ocupar(escalonador)
+
+        async def rapido():
+            return None
+
+        na_fila = [asyncio.ensure_future(escalonador.executar(WSDL, 'a', NORMAL, None, rapido)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(FilaCheia):
+            await escalonador.executar(WSDL, 'a', NORMAL, None, rapido)
+        # A fila de outro token não é afetada
+        outro = asyncio.ensure_future(escalonador.executar(WSDL, 'b', NORMAL, None, rapido))
+        liberar.set()
+        await asyncio.gather(ocupante, outro, *na_fila)
+
+    asyncio.run(cenario())
+
+def test_prazo_inalcancavel_pela_estimativa(monkeypatch):
+    monkeypatch.setattr(config, 'ESCALONADOR_DURACAO_INICIAL', 5.0)
+
+    async def cenario():
+        escalonador = Escalonador()
+        liberar, ocupante = await _ocupar(escalonador)
+
+        async def nunca():
+            raise AssertionError("não deveria executar")
+
+        with pytest.raises(PrazoExcedido):
+            await escalonador.executar(WSDL, 'a', NORMAL, time.monotonic() + 1.0, nunca)
+        assert escalonador.profundidade_fila() == 0
+        liberar.set()
+        await ocupante
+
+    asyncio.run(cenario())
+
+def test_prazo_esgotado_na_fila_libera_o_lugar():
+    async def cenario():
+        escalonador = Escalonador()
+        liberar, ocupante = await _ocupar(escalonador)
+
+        async def nunca():
+            raise AssertionError("não deveria executar")
+
+        with pytest.raises(PrazoExcedido):
+            await escalonador.executar(WSDL, 'a', NORMAL, time.monotonic() + 0.05, nunca)
+        assert escalonador.profundidade_fila() == 0
+        liberar.set()
+        await ocupante
+        assert escalonador.em_execucao() == 0
+
+    asyncio.run(cenario())
+
+def test_cancelamento_na_fila_e_erro_na_execucao_liberam_vagas():
+    async def cenario():
+        escalonador = Escalonador()
+        liberar, ocupante = await _ocupar(escalonador)
+
+        async def rapido():
+            return None
+
+        cancelada = asyncio.ensure_future(escalonador.executar(WSDL, 'a', NORMAL, None, rapido))
+        await asyncio.sleep(0)
+        cancelada.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelada
+        assert escalonador.profundidade_fila() == 0
+        liberar.set()
+        await ocupante
+
+        async def falha():
+            raise RuntimeError("SGT fora")
+
+        with pytest.raises(RuntimeError):
+            await escalonador.executar(WSDL, 'a', NORMAL, None, falha)
+        assert escalonador.em_execucao() == 0
+
+    asyncio.run(cenario())
@@ -0,0 +1,44 @@
+# tests/test_soap_client.py
+import asyncio
+from src import soap_client
+
+WSDL = 'https://sgt.teste/SGT.WebService/Cargas.svc?wsdl'
+
+def test_cliente_ja_criado_nao_passa_por_thread(monkeypatch):
+    criacoes = []
+    threads = []
+    to_thread_original = asyncio.to_thread
+
+    def criar(wsdl_url):
+        criacoes.append(wsdl_url)
+        return object()
+
+    async def to_thread_contado(func, *args, **kwargs):
+        threads.append(func)
+        return await to_thread_original(func, *args, **kwargs)
+
+    monkeypatch.setattr(soap_client, 'get_zeep_async_client', criar)
+    monkeypatch.setattr(soap_client, '_clientes_async', type(soap_client._clientes_async)())
+    monkeypatch.setattr(asyncio, 'to_thread', to_thread_contado)
+
+    async def cenario():
+        primeiro = await soap_client.obter_zeep_async_client(WSDL)
+        segundo = await soap_client.obter_zeep_async_client(WSDL)
+        return primeiro, segundo
+
+    primeiro, segundo = asyncio.run(cenario())
+    assert primeiro is segundo
+    assert criacoes == [WSDL]
+    assert len(threads) == 1
+
+def test_clientes_limitados_ao_tamanho_do_cache(monkeypatch):
+    monkeypatch.setattr(soap_client, 'get_zeep_async_client', lambda wsdl_url: object())
+    monkeypatch.setattr(soap_client, '_clientes_async', type(soap_client._clientes_async)())
+
+    async def cenario():
+        for i in range(soap_client._MAX_CLIENTES_ASYNC + 3):
+            await soap_client.obter_zeep_async_client(f'{WSDL}&v={i}')
+
+    asyncio.run(cenario())
+    assert len(soap_client._clientes_async) == soap_client._MAX_CLIENTES_ASYNC
+    assert f'{WSDL}&v=0' not in soap_client._clientes_async
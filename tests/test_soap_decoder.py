@@ -0,0 +1,98 @@
+# tests/test_soap_decoder.py
+import pytest
+import requests
+from zeep.helpers import serialize_object
+from src.soap_decoder import NAO_DECODIFICADO, obter_decodificador
+from .conftest import resposta_soap
+
+def _pelo_zeep(cliente, operacao: str, conteudo: bytes):
+    # Mesmo caminho do fallback em soap_client._chamar_operacao
+    resposta = requests.Response()
+    resposta.status_code = 200
+    resposta._content = conteudo
+    resposta.headers['Content-Type'] = 'text/xml; charset=utf-8'
+    binding = cliente.service._binding
+    return serialize_object(binding.process_reply(cliente, binding.get(operacao), resposta))
+
+_CARGA = (
+    '<CargaIntegracao>'
+    '<DataInicioCarregamento>2024-05-01T08:00:00</DataInicioCarregamento>'
+    '<Destinatario><CPFCNPJ>12345678000199</CPFCNPJ>'
+    '<Endereco><Bairro>Centro</Bairro><Cidade><Descricao>São Paulo</Descricao><IBGE>3550308</IBGE>'
+    '<SiglaUF>SP</SiglaUF></Cidade><Logradouro>Rua A &amp; B &lt;fundos&gt;</Logradouro></Endereco>'
+    '<RazaoSocial>Açúcar &amp; Cia</RazaoSocial></Destinatario>'
+    '<Filial><CodigoIntegracao>F01</CodigoIntegracao></Filial>'
+    '<Motoristas><Motorista><CPF>111</CPF><Nome>João</Nome></Motorista>'
+    '<Motorista><CPF>222</CPF><Nome>Maria</Nome></Motorista></Motoristas>'
+    '<NumeroCarga>C-1</NumeroCarga>'
+    '<Observacao i:nil="true"/>'
+    '<OrdemEntrega>2</OrdemEntrega>'
+    '<PesoBruto>1234.500</PesoBruto>'
+    '<Produtos><Produto><CodigoProduto>P1</CodigoProduto><Quantidade>10</Quantidade>'
+    '<ValorUnitario>9.99</ValorUnitario></Produto></Produtos>'
+    '<ProtocoloCarga>42</ProtocoloCarga>'
+    '<ProtocoloPedido>7</ProtocoloPedido>'
+    '<Veiculo><Placa>ABC1D23</Placa></Veiculo>'
+    '</CargaIntegracao>'
+)
+
+@pytest.mark.parametrize('operacao, resultado', [
+    ('BuscarCarga', f'<CodigoMensagem>0</CodigoMensagem><Mensagem/><Objeto>{_CARGA}{_CARGA}</Objeto><Status>true</Status>'),
+    ('BuscarCarga', '<CodigoMensagem>300</CodigoMensagem><Mensagem>Carga não encontrada</Mensagem>'
+                    '<Objeto i:nil="true"/><Status>false</Status>'),
+    ('BuscarCarga', '<CodigoMensagem>0</CodigoMensagem><Objeto/><Status>true</Status>'),
+    ('BuscarCargaPorCodigosIntegracao', f'<CodigoMensagem>0</CodigoMensagem><Objeto><CargaIntegracao/></Objeto>'),
+    ('BuscarNotasFiscaisVinculadas',
+     '<CodigoMensagem>0</CodigoMensagem><Objeto><Itens>'
+     '<NotaFiscal><Chave>3524</Chave><Destinatario><CPFCNPJ>1</CPFCNPJ></Destinatario>'
+     '<PesoBruto>10.5</PesoBruto><Valor>100.00</Valor></NotaFiscal>'
+     '<NotaFiscal><Chave>3525</Chave></NotaFiscal>'
+     '</Itens><NumeroTotalDeRegistro>2</NumeroTotalDeRegistro></Objeto><Status>true</Status>'),
+    ('BuscarNotaFiscal',
+     '<CodigoMensagem>0</CodigoMensagem><Objeto><ChaveNFe>3524</ChaveNFe>'
+     '<XML>&lt;nfeProc versao="4.00"&gt;&lt;NFe&gt;&amp;amp;&lt;/NFe&gt;&lt;/nfeProc&gt;</XML></Objeto>'),
+    ('BuscarNotaFiscal', ''),
+])
+def test_decodificador_igual_ao_zeep(cliente, operacao, resultado):
+    conteudo = resposta_soap(operacao, resultado)
+    esperado = _pelo_zeep(cliente, operacao, conteudo)
+    assert obter_decodificador(cliente, operacao).decodificar(conteudo) == esperado
+
+@pytest.mark.parametrize('resultado', [
+    '<CodigoMensagem>abc</CodigoMensagem><Status>talvez</Status>',
+    '<Objeto><Itens><NotaFiscal><Valor>abc</Valor></NotaFiscal></Itens></Objeto>',
+])
+def test_valor_invalido_igual_ao_zeep(cliente, resultado):
+    # O Zeep converte int/boolean inválidos em None, mas deixa escapar o erro de decimal
+    conteudo = resposta_soap('BuscarNotasFiscaisVinculadas', resultado)
+    try:
+        esperado = _pelo_zeep(cliente, 'BuscarNotasFiscaisVinculadas', conteudo)
+    except Exception as e:
+        with pytest.raises(type(e)):
+            obter_decodificador(cliente, 'BuscarNotasFiscaisVinculadas').decodificar(conteudo)
+    else:
+        assert obter_decodificador(cliente, 'BuscarNotasFiscaisVinculadas').decodificar(conteudo) == esperado
+
+def test_decodificador_ignora_elementos_fora_do_schema(cliente):
+    conteudo = resposta_soap(
+        'BuscarCarga',
+        '<CodigoMensagem>0</CodigoMensagem><CampoNovo><X>1</X></CampoNovo><Status>true</Status>'
+    )
+    valor = obter_decodificador(cliente, 'BuscarCarga').decodificar(conteudo)
+    assert valor == {'CodigoMensagem': 0, 'Mensagem': None, 'Objeto': None, 'Status': True}
+
+def test_fault_nao_decodificado(cliente):
+    conteudo = (
+        b'<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body>'
+        b'<s:Fault><faultcode>s:Client</faultcode><faultstring>Token inv\xc3\xa1lido</faultstring></s:Fault>'
+        b'</s:Body></s:Envelope>'
+    )
+    assert obter_decodificador(cliente, 'BuscarCarga').decodificar(conteudo) is NAO_DECODIFICADO
+
+@pytest.mark.parametrize('conteudo', [
+    b'<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body><BuscarCargaResp',
+    b'<html><body>502 Bad Gateway</body></html>',
+    b'',
+])
+def test_resposta_invalida_nao_decodificada(cliente, conteudo):
+    assert obter_decodificador(cliente, 'BuscarCarga').decodificar(conteudo) is NAO_DECODIFICADO
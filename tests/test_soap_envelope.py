@@ -0,0 +1,66 @@
+# tests/test_soap_envelope.py
+import pytest
+from zeep.wsdl.utils import etree_to_string
+from src.soap_envelope import caminhos_argumentos, criar_header_token, obter_modelo_envelope
+
+def _pelo_zeep(cliente, operacao: str, token: str, argumentos: dict) -> bytes:
+    # Mesmo caminho do envelope sem modelo em soap_client._chamar_operacao
+    servico = cliente.service
+    envelope, _ = servico._binding._create(
+        operacao, (), dict(argumentos, _soapheaders=[criar_header_token(token)]),
+        client=cliente, options=servico._binding_options
+    )
+    return etree_to_string(envelope)
+
+def _pelo_modelo(cliente, operacao: str, token: str, argumentos: dict) -> bytes:
+    modelo = obter_modelo_envelope(cliente, operacao, caminhos_argumentos(argumentos))
+    assert modelo is not None
+    return modelo.montar(token, argumentos)
+
+_VALORES = [
+    'simples',
+    'A & B <c> "d" \'e\'',
+    '&amp; &lt; já escapado',
+    ']]> fim de CDATA',
+    'São Paulo – ação € 😀',
+    'linha 1\nlinha 2\ttab',
+    'retorno\r\ncarro',
+    '\ue0000\ue001 marcador no valor',
+    '',
+]
+
+@pytest.mark.parametrize('valor', _VALORES)
+def test_envelope_igual_ao_zeep(cliente, valor):
+    argumentos = {'codigosIntegracao': {'CodigoIntegracaoFilial': valor, 'NumeroCarga': valor + '1'}}
+    operacao = 'BuscarCargaPorCodigosIntegracao'
+    assert _pelo_modelo(cliente, operacao, valor, argumentos) == _pelo_zeep(cliente, operacao, valor, argumentos)
+
+@pytest.mark.parametrize('operacao, argumentos', [
+    ('BuscarCarga', {'protocolo': {'protocoloIntegracaoCarga': 123}}),
+    ('BuscarNotasFiscaisVinculadas', {'protocoloCarga': 1, 'inicio': 0, 'limite': 100}),
+    ('BuscarNotaFiscal', {'chaveNFe': '35240112345678000199550010000000011000000010'}),
+])
+def test_envelope_por_operacao(cliente, operacao, argumentos):
+    token = 'tok&<en>'
+    assert _pelo_modelo(cliente, operacao, token, argumentos) == _pelo_zeep(cliente, operacao, token, argumentos)
+
+def test_modelo_reutilizado_entre_valores(cliente):
+    caminhos = caminhos_argumentos({'protocolo': {'protocoloIntegracaoCarga': 1}})
+    assert obter_modelo_envelope(cliente, 'BuscarCarga', caminhos) is obter_modelo_envelope(cliente, 'BuscarCarga', caminhos)
+
+@pytest.mark.parametrize('valor', ['nulo\x00', 'controle\x01', 'form\x0cfeed', '￾'])
+def test_caracteres_invalidos_recusados_como_no_zeep(cliente, valor):
+    argumentos = {'chaveNFe': valor}
+    with pytest.raises(ValueError):
+        _pelo_zeep(cliente, 'BuscarNotaFiscal', 'token', argumentos)
+    with pytest.raises(ValueError):
+        _pelo_modelo(cliente, 'BuscarNotaFiscal', 'token', argumentos)
+
+@pytest.mark.parametrize('argumentos', [
+    {'protocolo': {'protocoloIntegracaoCarga': None}},
+    {'protocolo': {'protocoloIntegracaoCarga': True}},
+    {'protocolo': [1]},
+])
+def test_payload_sem_modelo(argumentos):
+    # Folhas que o Zeep transforma/omite não usam modelo
+    assert caminhos_argumentos(argumentos) is None